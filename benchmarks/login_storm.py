@@ -0,0 +1,137 @@
+"""Login-storm benchmark: default profile vs PERFORMANCE_PROFILE=production.
+
+Simulates an exam start: every student logs in and then opens a few pages.
+Runs against a throwaway SQLite database, so it never touches db.sqlite3.
+
+    python benchmarks/login_storm.py --students 40 --threads 8 --pages 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+_tmpdir = tempfile.mkdtemp(prefix='quiz-bench-')
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmpdir}/bench.sqlite3'
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quiz_site.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+PASSWORD = 'storm-Password-1'
+PAGES = ['/quizzes/', '/results/', '/profile/edit/', '/']
+
+PROFILES = {
+    'default': {},
+    'production': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'MIDDLEWARE': [
+            'quiz_site.quiz_app.middleware.CachedAuthenticationMiddleware'
+            if name == 'django.contrib.auth.middleware.AuthenticationMiddleware' else name
+            for name in settings.MIDDLEWARE
+        ],
+    },
+}
+
+
+def setup_students(count):
+    call_command('migrate', verbosity=0)
+    call_command('setup_initial_data', verbosity=0)
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'student{i}', password=password) for i in range(count)],
+        ignore_conflicts=True,
+    )
+
+
+def log_in(index, clients, errors):
+    client = Client()
+    response = client.post('/login/', {'username': f'student{index}', 'password': PASSWORD})
+    if response.status_code != 302:
+        errors.append(response.status_code)
+    else:
+        clients.append(client)
+
+
+def browse(client, pages):
+    for i in range(pages):
+        client.get(PAGES[i % len(PAGES)])
+
+
+def in_threads(func, items, threads):
+    """Run func(item) for every item on a pool of threads and return the wall time"""
+    pending = list(items)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    break
+                item = pending.pop()
+            func(item)
+        connections.close_all()
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def page_queries(pages):
+    client = Client()
+    client.post('/login/', {'username': 'student0', 'password': PASSWORD})
+    client.get(PAGES[0])
+    with CaptureQueriesContext(connection) as queries:
+        client.get(PAGES[0])
+    return len(queries)
+
+
+def run(profile, students, threads, pages):
+    cache.clear()
+    with override_settings(ALLOWED_HOSTS=['testserver'], **PROFILES[profile]):
+        queries = page_queries(pages)
+        clients, errors = [], []
+        login_time = in_threads(lambda index: log_in(index, clients, errors), range(students), threads)
+        browse_time = in_threads(lambda client: browse(client, pages), clients, threads)
+
+    views = len(clients) * pages
+    total = login_time + browse_time
+    print(
+        f'{profile:>10}: {students / login_time:6.1f} logins/s, '
+        f'{views / browse_time:7.1f} page views/s, '
+        f'{(students + views) / total:6.1f} req/s overall, '
+        f'{queries} queries per authenticated page, {len(errors)} errors'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pages', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_students(args.students)
+    for profile in PROFILES:
+        run(profile, args.students, args.threads, args.pages)
+
+
+if __name__ == '__main__':
+    main()
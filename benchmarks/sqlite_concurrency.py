@@ -0,0 +1,158 @@
+"""SQLite concurrency benchmark: Django's default SQLite settings vs SQLITE_PROFILE=tuned.
+
+Simulates the end of an exam: students submit quizzes from several worker
+processes while others keep browsing the quiz catalog. Each profile runs in its own
+process against a throwaway SQLite file, so it never touches db.sqlite3.
+
+    python benchmarks/sqlite_concurrency.py --students 40 --workers 8 --submissions 10 --readers 4
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PROFILES = ['default', 'tuned']
+
+
+def run_profile(args):
+    """Child process: the benchmark for the profile in SQLITE_PROFILE"""
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quiz_site.settings')
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import OperationalError, connections
+    from django.test import Client
+
+    from quiz_site.quiz_app.models import Quiz
+
+    # Worker processes, like gunicorn's, each with their own connection
+    context = multiprocessing.get_context('fork')
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    call_command('migrate', verbosity=0)
+    call_command('setup_initial_data', verbosity=0, stdout=io.StringIO())
+    User.objects.bulk_create([User(username=f'student{i}') for i in range(args.students)])
+    quiz = Quiz.objects.filter(quiz_type='fixed').first()
+    question_ids = [str(pk) for pk in quiz.questions.values_list('pk', flat=True)[:quiz.num_questions]]
+    session_ids = []
+    for user in User.objects.filter(username__startswith='student'):
+        client = Client()
+        client.force_login(user)
+        session_ids.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+    connections.close_all()
+
+    start_event = context.Event()
+    stop_event = context.Event()
+    results = context.Queue()
+
+    def client_for(session_id):
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session_id
+        return client
+
+    def submitter(assigned):
+        clients = [client_for(session_id) for session_id in assigned]
+        latencies, errors = [], []
+        start_event.wait()
+        for _ in range(args.submissions):
+            for client in clients:
+                data = {
+                    'question_ids': ','.join(question_ids),
+                    'submission_token': uuid.uuid4().hex,
+                    **{f'question_{qid}': 'A' for qid in question_ids},
+                }
+                started = time.perf_counter()
+                try:
+                    response = client.post(f'/quizzes/{quiz.pk}/start/', data)
+                except OperationalError as exc:
+                    errors.append(str(exc))
+                    continue
+                if response.status_code == 302:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors.append(f'HTTP {response.status_code}')
+        results.put(('submit', latencies, errors))
+
+    def reader():
+        client = client_for(session_ids[0])
+        views, errors = 0, []
+        start_event.wait()
+        while not stop_event.is_set():
+            try:
+                client.get('/quizzes/')
+                views += 1
+            except OperationalError as exc:
+                errors.append(str(exc))
+        results.put(('read', views, errors))
+
+    submitters = [context.Process(target=submitter, args=(session_ids[i::args.workers],)) for i in range(args.workers)]
+    readers = [context.Process(target=reader) for _ in range(args.readers)]
+    for process in submitters + readers:
+        process.start()
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    latencies, errors, views = [], [], 0
+    for _ in submitters:
+        _, worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors.extend(worker_errors)
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    for _ in readers:
+        _, worker_views, worker_errors = results.get()
+        views += worker_views
+        errors.extend(worker_errors)
+    for process in submitters + readers:
+        process.join()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0
+    print(
+        f'{os.environ["SQLITE_PROFILE"]:>8}: {len(latencies) / elapsed:6.1f} submissions/s, '
+        f'{views / elapsed:6.1f} catalog views/s, p95 submit {p95:6.1f} ms, '
+        f'{len(errors)} errors' + (f' (e.g. {errors[0]})' if errors else '')
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=8, help='processes submitting quizzes')
+    parser.add_argument('--submissions', type=int, default=10, help='submissions per student')
+    parser.add_argument('--readers', type=int, default=4, help='processes browsing the quiz catalog')
+    parser.add_argument('--dir', help='directory for the throwaway databases (default: the system temp dir); '
+                                      'put it on the disk you deploy to, since commit cost depends on fsync')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory(prefix='quiz-bench-', dir=args.dir) as tmpdir:
+            env = {
+                **os.environ,
+                'SQLITE_PROFILE': profile,
+                'DATABASE_URL': f'sqlite:///{tmpdir}/bench.sqlite3',
+                'RATE_LIMIT_QUIZ_SUBMIT': '0/m',
+            }
+            subprocess.run([sys.executable, __file__, '--profile', profile, *sys.argv[1:]], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
 #!/bin/bash
+set -e
 pip install -r requirements.txt
 python manage.py collectstatic --noinput
+python manage.py check_page_weight
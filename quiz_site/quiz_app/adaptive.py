@@ -0,0 +1,353 @@
+"""Adaptive quizzes: one question per request, chosen for the student's level.
+
+Every question carries a Rasch difficulty in logits, estimated from past
+attempts by ``calibrate_quiz``. An attempt is scored from the student's
+final ability, which is stored on it, not from the share of answers that
+were right: a strong student who is only served hard questions would get
+about half of them wrong. Choosing the next question never queries
+the database: ``get_item_bank`` keeps each quiz's questions in process
+memory, sorted by difficulty, and reloads them only when the quiz row's
+``content_version`` changes (after a calibration or a question edit). The
+row is loaded by the view anyway, so every process notices without a
+shared cache.
+
+A student's progress is kept in the session under ``adaptive_quiz:<quiz_id>``.
+"""
+import bisect
+import math
+import random
+import threading
+from array import array
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Question, Quiz, UserQuizAttempt
+from .submissions import create_attempt_once, new_submission_token
+
+CALIBRATION_CHUNK_SIZE = 2000
+# Right and wrong pseudo-responses at ability 0 that keep rarely answered
+# questions near difficulty 0
+CALIBRATION_PRIOR = 2
+# Passes over the attempts, alternating between abilities and difficulties
+CALIBRATION_PASSES = 3
+CALIBRATION_NEWTON_STEPS = 20
+# Pick randomly among this many best-matching questions so that students
+# of similar ability do not all see the same sequence
+EXPOSURE_CANDIDATES = 3
+ABILITY_GRID = [step / 4 for step in range(-16, 17)]
+
+ITEM_FIELDS = ['id', 'difficulty', 'text', 'option_a', 'option_b', 'option_c', 'option_d',
+               'correct_option', 'explanation']
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+
+class ItemBank:
+    """The questions of one quiz, sorted by difficulty"""
+
+    def __init__(self, version, items):
+        self.version = version
+        self.difficulties = array('d', (item['difficulty'] for item in items))
+        self.question_ids = [item['id'] for item in items]
+        self.items = {item['id']: item for item in items}
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def __contains__(self, question_id):
+        return question_id in self.items
+
+    def difficulty(self, question_id):
+        return self.items[question_id]['difficulty']
+
+    def next_item(self, ability, exclude=()):
+        """An unanswered question with difficulty close to ``ability``.
+
+        Under the Rasch model the question whose difficulty matches the
+        student's ability tells us the most about them. Walks outwards from
+        the ability with bisect, so the cost is O(log n + len(exclude)).
+        """
+        difficulties = self.difficulties
+        right = bisect.bisect_left(difficulties, ability)
+        left = right - 1
+        candidates = []
+        while len(candidates) < EXPOSURE_CANDIDATES and (left >= 0 or right < len(difficulties)):
+            if right >= len(difficulties) or (left >= 0 and ability - difficulties[left] <= difficulties[right] - ability):
+                question_id = self.question_ids[left]
+                left -= 1
+            else:
+                question_id = self.question_ids[right]
+                right += 1
+            if question_id not in exclude:
+                candidates.append(question_id)
+        return random.choice(candidates) if candidates else None
+
+
+def load_item_bank(quiz_id, version):
+    items = list(
+        Question.objects.filter(quiz_id=quiz_id).order_by('difficulty', 'pk').values(*ITEM_FIELDS)
+    )
+    return ItemBank(version, items)
+
+
+def get_item_bank(quiz):
+    """The in-memory item bank of a quiz, reloaded when its content version changes"""
+    version = quiz.content_version
+    bank = _banks.get(quiz.id)
+    if bank is None or bank.version != version:
+        with _banks_lock:
+            bank = _banks.get(quiz.id)
+            if bank is None or bank.version != version:
+                bank = _banks[quiz.id] = load_item_bank(quiz.id, version)
+    return bank
+
+
+def prior_log_weights():
+    """Standard normal log-prior over ABILITY_GRID (up to a constant)"""
+    return [-theta * theta / 2 for theta in ABILITY_GRID]
+
+
+def add_response(log_weights, difficulty, correct):
+    """Fold one Rasch response into the log-posterior over ABILITY_GRID"""
+    updated = []
+    for theta, log_weight in zip(ABILITY_GRID, log_weights):
+        p = 1 / (1 + math.exp(difficulty - theta))
+        updated.append(log_weight + math.log(p if correct else 1 - p))
+    return updated
+
+
+def expected_ability(log_weights):
+    """Expected a posteriori ability"""
+    peak = max(log_weights)
+    weights = [math.exp(log_weight - peak) for log_weight in log_weights]
+    return sum(theta * weight for theta, weight in zip(ABILITY_GRID, weights)) / sum(weights)
+
+
+def estimate_ability(user_answers, correct_answers, difficulties):
+    """EAP ability from an answer map; ``difficulties`` maps question ids (str) to difficulties"""
+    log_weights = prior_log_weights()
+    for qid, answer in user_answers.items():
+        if qid in difficulties:
+            log_weights = add_response(log_weights, difficulties[qid], answer is not None and answer == correct_answers.get(qid))
+    return expected_ability(log_weights)
+
+
+def ability_score(ability, difficulties):
+    """Percentage of the item bank a student of ``ability`` is expected to answer correctly"""
+    if not difficulties:
+        return 0
+    expected = sum(1 / (1 + math.exp(difficulty - ability)) for difficulty in difficulties)
+    return round(expected / len(difficulties) * 100, 2)
+
+
+def rescore(user_answers, correct_answers, difficulties):
+    """(ability, score) of an adaptive attempt replayed against the given answer key"""
+    if not user_answers:
+        return None, 0
+    ability = estimate_ability(user_answers, correct_answers, difficulties)
+    return ability, ability_score(ability, list(difficulties.values()))
+
+
+def session_key(quiz_id):
+    return f'adaptive_quiz:{quiz_id}'
+
+
+def get_state(session, quiz, bank):
+    """The student's progress through an adaptive quiz, starting one if needed"""
+    state = session.get(session_key(quiz.id))
+    if state is None:
+        state = {
+            'served': [],
+            'answers': {},
+            'ability': 0.0,
+            'log_weights': prior_log_weights(),
+            'current': bank.next_item(0.0),
+            'started_at': timezone.now().isoformat(),
+            'token': new_submission_token(),
+        }
+        if state['current'] is not None:
+            state['served'].append(state['current'])
+        save_state(session, quiz, state)
+    return state
+
+
+def save_state(session, quiz, state):
+    session[session_key(quiz.id)] = state
+
+
+def question_limit(quiz, bank):
+    return min(quiz.num_questions, len(bank))
+
+
+def seconds_left(quiz, state):
+    if quiz.time_limit <= 0:
+        return None
+    deadline = parse_datetime(state['started_at']) + timedelta(minutes=quiz.time_limit)
+    return max(0, int((deadline - timezone.now()).total_seconds()))
+
+
+def record_answer(quiz, state, bank, answer):
+    """Store the answer to the current question and choose the next one"""
+    question_id = state['current']
+    if question_id in bank:
+        state['answers'][str(question_id)] = answer
+        state['log_weights'] = add_response(
+            state['log_weights'], bank.difficulty(question_id), answer == bank.items[question_id]['correct_option'],
+        )
+        state['ability'] = expected_ability(state['log_weights'])
+    _advance(quiz, state, bank)
+
+
+def _advance(quiz, state, bank):
+    if len(state['answers']) >= question_limit(quiz, bank):
+        state['current'] = None
+    else:
+        state['current'] = bank.next_item(state['ability'], set(state['served']))
+        if state['current'] is not None:
+            state['served'].append(state['current'])
+
+
+def replace_missing_item(quiz, state, bank):
+    """Move on when the current question left the item bank mid-attempt (e.g. it was deleted).
+
+    Returns True when the state changed.
+    """
+    question_id = state['current']
+    if question_id is None or question_id in bank:
+        return False
+    state['served'].remove(question_id)
+    _advance(quiz, state, bank)
+    return True
+
+
+def finish(session, user, quiz, state, bank):
+    """Score the attempt from the final ability, store it and clear the session state.
+
+    An attempt without answers scores 0. Returns the attempt id.
+    """
+    user_answers = {}
+    correct_answers = {}
+    questions_data = {}
+    for question_id in state['served']:
+        item = bank.items.get(question_id)
+        if item is None:
+            continue
+        qid = str(question_id)
+        user_answer = state['answers'].get(qid)
+        user_answers[qid] = user_answer
+        correct_answers[qid] = item['correct_option']
+        questions_data[qid] = {
+            'text': item['text'],
+            'option_a': item['option_a'],
+            'option_b': item['option_b'],
+            'option_c': item['option_c'],
+            'option_d': item['option_d'],
+            'correct_option': item['correct_option'],
+            'explanation': item['explanation'],
+            'user_answer': user_answer,
+        }
+
+    if state['answers']:
+        ability = state['ability']
+        score = ability_score(ability, bank.difficulties)
+    else:
+        ability, score = None, 0
+    attempt_id, _ = create_attempt_once(
+        user,
+        state.get('token'),
+        quiz=quiz,
+        score=score,
+        ability=ability,
+        user_answers=user_answers,
+        correct_answers=correct_answers,
+        questions_data=questions_data,
+    )
+    session.pop(session_key(quiz.id), None)
+    return attempt_id
+
+
+def _bin_ability(ability):
+    """The ABILITY_GRID point nearest to ``ability``"""
+    return min(max(round(ability * 4) / 4, ABILITY_GRID[0]), ABILITY_GRID[-1])
+
+
+def _tally_responses(quiz_id, difficulties, chunk_size, heartbeat):
+    """Count answers per question and ability bin.
+
+    Returns ({qid: {ability: [answered, right]}}, whether any ability had to
+    be estimated from the answers under ``difficulties``).
+    """
+    responses = {qid: {} for qid in difficulties}
+    estimated = False
+    attempts = (
+        UserQuizAttempt.objects.filter(quiz_id=quiz_id)
+        .values_list('ability', 'user_answers', 'correct_answers')
+        .iterator(chunk_size=chunk_size)
+    )
+    for ability, user_answers, correct_answers in attempts:
+        if heartbeat:
+            heartbeat()
+        if ability is None:
+            ability = estimate_ability(user_answers, correct_answers, difficulties)
+            estimated = True
+        ability = _bin_ability(ability)
+        for qid, answer in user_answers.items():
+            if qid not in responses:
+                continue
+            counts = responses[qid].setdefault(ability, [0, 0])
+            counts[0] += 1
+            if answer is not None and answer == correct_answers.get(qid):
+                counts[1] += 1
+    return responses, estimated
+
+
+def _fit_difficulty(counts):
+    """Maximum a posteriori Rasch difficulty from {ability: [answered, right]}, by Newton's method"""
+    counts = dict(counts)
+    answered, right = counts.get(0.0, [0, 0])
+    counts[0.0] = [answered + 2 * CALIBRATION_PRIOR, right + CALIBRATION_PRIOR]
+    difficulty = 0.0
+    for _ in range(CALIBRATION_NEWTON_STEPS):
+        gradient = curvature = 0.0
+        for ability, (answered, right) in counts.items():
+            p = 1 / (1 + math.exp(difficulty - ability))
+            gradient += answered * p - right
+            curvature += answered * p * (1 - p)
+        step = max(-1.0, min(1.0, gradient / curvature))
+        difficulty += step
+        if abs(step) < 1e-6:
+            break
+    return difficulty
+
+
+def calibrate_quiz(quiz_id, chunk_size=CALIBRATION_CHUNK_SIZE, heartbeat=None):
+    """Re-estimate the difficulty of every question of a quiz from past attempts.
+
+    Each difficulty is fitted with the Rasch model conditional on the
+    ability of whoever answered, binned on ABILITY_GRID; counting right
+    answers alone would pull every difficulty towards 0 on each run, as
+    adaptive quizzes serve hard questions to strong students. Adaptive
+    attempts store the student's ability. Other attempts get one estimated
+    from their answers under the current difficulties, alternating with
+    the difficulty fit for up to CALIBRATION_PASSES passes over the
+    attempts. ``heartbeat`` is called once per attempt read. Returns the
+    number of questions updated.
+    """
+    questions = list(Question.objects.filter(quiz_id=quiz_id).only('id', 'difficulty', 'difficulty_responses'))
+    difficulties = {str(question.pk): question.difficulty for question in questions}
+    for _ in range(CALIBRATION_PASSES):
+        responses, estimated = _tally_responses(quiz_id, difficulties, chunk_size, heartbeat)
+        difficulties = {qid: _fit_difficulty(counts) for qid, counts in responses.items()}
+        if not estimated:
+            break
+
+    for question in questions:
+        qid = str(question.pk)
+        question.difficulty = round(difficulties[qid], 4)
+        question.difficulty_responses = sum(answered for answered, _ in responses[qid].values())
+    Question.objects.bulk_update(questions, ['difficulty', 'difficulty_responses'], batch_size=500)
+    Quiz.bump_content_version(quiz_id)
+    return len(questions)
@@ -1,5 +1,16 @@
 from django.contrib import admin
-from .models import UserProfile, Quiz, Question, UserQuizAttempt
+from .models import UserProfile, Quiz, Question, UserQuizAttempt, Job, RegradeRun, DailyQuizStats
+from .jobs import SECRET_PAYLOAD_KEYS, enqueue
+from .search import matching_object_ids
+
+class FullTextSearchMixin:
+    """Answer admin searches from the full-text index instead of LIKE scans"""
+    search_kind = None
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=matching_object_ids(search_term, self.search_kind)), False
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -7,16 +18,26 @@ class UserProfileAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
 
 @admin.register(Quiz)
-class QuizAdmin(admin.ModelAdmin):
-    list_display = ['name', 'quiz_type', 'num_questions', 'total_questions', 'time_limit', 'is_active', 'created_at']
+class QuizAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ['name', 'quiz_type', 'num_questions', 'total_questions', 'time_limit', 'max_attempts',
+                    'cooldown_minutes', 'is_active', 'created_at']
     list_filter = ['quiz_type', 'is_active', 'created_at']
     search_fields = ['name', 'description']
+    search_kind = 'quiz'
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ['quiz', 'text', 'correct_option', 'created_at']
+class QuestionAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ['quiz', 'text', 'correct_option', 'difficulty', 'created_at']
     list_filter = ['quiz', 'correct_option']
     search_fields = ['text']
+    readonly_fields = ['difficulty', 'difficulty_responses']
+    search_kind = 'question'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'correct_option' in form.changed_data and obj.quiz.attempts.exists():
+            enqueue('regrade_quiz', {'quiz_id': obj.quiz_id}, user=request.user)
+            self.message_user(request, 'The answer key changed, so past attempts are being re-graded in the background.')
 
 @admin.register(UserQuizAttempt)
 class UserQuizAttemptAdmin(admin.ModelAdmin):
@@ -24,3 +45,32 @@ class UserQuizAttemptAdmin(admin.ModelAdmin):
     list_filter = ['quiz', 'date_attempted']
     search_fields = ['user__username', 'quiz__name']
     date_hierarchy = 'date_attempted'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'status', 'progress', 'total', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['started_at', 'finished_at']
+    
+    def get_exclude(self, request, obj=None):
+        # Payloads of these kinds hold uploads that may contain passwords
+        if obj is not None and SECRET_PAYLOAD_KEYS.get(obj.kind):
+            return ['payload']
+        return super().get_exclude(request, obj)
+
+@admin.register(RegradeRun)
+class RegradeRunAdmin(admin.ModelAdmin):
+    list_display = ['quiz', 'status', 'attempts_scanned', 'attempts_changed', 'triggered_by', 'started_at', 'finished_at']
+    list_filter = ['status', 'quiz']
+
+@admin.register(DailyQuizStats)
+class DailyQuizStatsAdmin(admin.ModelAdmin):
+    list_display = ['quiz', 'day', 'attempts', 'score_min', 'score_max']
+    list_filter = ['quiz']
+    date_hierarchy = 'day'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
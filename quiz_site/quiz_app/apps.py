@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QuizAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz_site.quiz_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
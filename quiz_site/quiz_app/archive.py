@@ -0,0 +1,198 @@
+"""Archival of old quiz attempts into compressed JSONL segments.
+
+Each archived attempt is written as its own gzip member appended to a
+monthly segment file under ``settings.QUIZ_ARCHIVE_DIR``. Concatenated gzip
+members form a valid ``.jsonl.gz`` file, and because the byte offset and
+length of every member are stored on the attempt, a single attempt can be
+read back without decompressing the rest of the segment.
+
+The ``UserQuizAttempt`` row is kept as a summary: score, date and the
+answer maps stay in the database, only the bulky ``questions_data`` blob
+moves to disk. The archive directory must be persistent, so archiving
+refuses to run until ``QUIZ_ARCHIVE_DIR`` is set, and runs are serialized
+with a lock file so concurrent runs never interleave their appends.
+
+Members are appended and fsynced before the rows that point at them are
+committed. A run that dies in between leaves bytes no row refers to, so
+every run first truncates each segment back to the end of its last
+committed member and the attempts are archived again from there.
+"""
+import gzip
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import UserQuizAttempt
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = '.archive.lock'
+
+
+def get_archive_dir():
+    """The configured archive directory, or None when archiving is off"""
+    if not settings.QUIZ_ARCHIVE_DIR:
+        return None
+    return Path(settings.QUIZ_ARCHIVE_DIR)
+
+
+def writable_archive_dir():
+    directory = get_archive_dir()
+    if directory is None:
+        raise ImproperlyConfigured(
+            'Set QUIZ_ARCHIVE_DIR to a persistent, writable directory before archiving attempts.'
+        )
+    directory.mkdir(parents=True, exist_ok=True)
+    if not os.access(directory, os.W_OK):
+        raise ImproperlyConfigured(f'The archive directory {directory} is not writable.')
+    return directory
+
+
+@contextmanager
+def archive_lock(directory):
+    """Hold an exclusive lock on the archive directory for one run"""
+    with open(directory / LOCK_NAME, 'a') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def segment_name_for(attempt):
+    """Relative path of the monthly segment an attempt belongs to"""
+    date = attempt.date_attempted
+    return f"{date:%Y}/{date:%m}/attempts-{date:%Y-%m}.jsonl.gz"
+
+
+def _serialize(attempt):
+    record = {
+        'id': attempt.id,
+        'user_id': attempt.user_id,
+        'quiz_id': attempt.quiz_id,
+        'score': attempt.score,
+        'date_attempted': attempt.date_attempted,
+        'user_answers': attempt.user_answers,
+        'correct_answers': attempt.correct_answers,
+        'questions_data': attempt.questions_data,
+    }
+    line = json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n'
+    return gzip.compress(line.encode('utf-8'))
+
+
+def committed_end(segment):
+    """Bytes of a segment covered by committed attempts; anything after is an orphan"""
+    end = UserQuizAttempt.objects.filter(archive_segment=segment).aggregate(
+        end=Max(F('archive_offset') + F('archive_length')),
+    )['end']
+    return end or 0
+
+
+def _write_segment(directory, segment, attempts, start):
+    """Append attempts to a segment from byte ``start`` and return (attempt, offset, length) tuples"""
+    path = directory / segment
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = []
+    with open(path, 'a+b') as fh:
+        # Never extend a segment that lost data; new members go after what is left
+        offset = min(start, fh.seek(0, os.SEEK_END))
+        fh.truncate(offset)
+        for attempt in attempts:
+            member = _serialize(attempt)
+            fh.write(member)
+            written.append((attempt, offset, len(member)))
+            offset += len(member)
+        fh.flush()
+        os.fsync(fh.fileno())
+    return written
+
+
+def archive_attempts(cutoff, batch_size=500):
+    """Move the detail of attempts made before ``cutoff`` into archive segments.
+
+    Works in primary-key order, one batch per transaction, so the attempts
+    table is never locked for the whole run. Returns the number of attempts
+    archived.
+    """
+    directory = writable_archive_dir()
+    with archive_lock(directory):
+        return _archive_attempts(directory, cutoff, batch_size)
+
+
+def _archive_attempts(directory, cutoff, batch_size):
+    pending = UserQuizAttempt.objects.filter(
+        date_attempted__lt=cutoff, archived_at__isnull=True,
+    ).order_by('pk')
+
+    archived = 0
+    last_pk = 0
+    # End of the committed members of each segment written in this run
+    ends = {}
+    while True:
+        batch = list(pending.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        by_segment = {}
+        for attempt in batch:
+            by_segment.setdefault(segment_name_for(attempt), []).append(attempt)
+
+        now = timezone.now()
+        updated = []
+        for segment, attempts in by_segment.items():
+            if segment not in ends:
+                ends[segment] = committed_end(segment)
+            for attempt, offset, length in _write_segment(directory, segment, attempts, ends[segment]):
+                attempt.questions_data = {}
+                attempt.archived_at = now
+                attempt.archive_segment = segment
+                attempt.archive_offset = offset
+                attempt.archive_length = length
+                updated.append(attempt)
+                ends[segment] = offset + length
+
+        with transaction.atomic():
+            UserQuizAttempt.objects.bulk_update(
+                updated,
+                ['questions_data', 'archived_at', 'archive_segment', 'archive_offset', 'archive_length'],
+            )
+        archived += len(updated)
+
+    return archived
+
+
+def load_archived_record(attempt):
+    """Read the full archived record of an attempt from its segment"""
+    directory = get_archive_dir()
+    if directory is None:
+        raise FileNotFoundError('QUIZ_ARCHIVE_DIR is not set')
+    with open(directory / attempt.archive_segment, 'rb') as fh:
+        fh.seek(attempt.archive_offset)
+        member = fh.read(attempt.archive_length)
+    return json.loads(gzip.decompress(member))
+
+
+def load_archived_questions_data(attempt):
+    """The archived questions_data of an attempt, or None if its segment is missing or damaged"""
+    try:
+        return load_archived_record(attempt).get('questions_data', {})
+    except (OSError, EOFError, ValueError):
+        logger.warning('Archived detail of attempt %s is unavailable', attempt.pk, exc_info=True)
+        return None
@@ -0,0 +1,137 @@
+"""Static asset bundles and the page-weight budget.
+
+``settings.ASSET_BUNDLES`` maps a bundle (a static path) to the static files
+it is built from. ``BundledStaticFilesStorage`` writes each bundle,
+concatenated and minified, at the start of collectstatic's post-processing,
+so bundles are hashed, gzip- and brotli-compressed and served as immutable
+like every other static file. Templates link bundles with the
+``asset_bundle`` tag, which links the source files instead when DEBUG is on.
+
+``page_weights`` estimates what each full page of the app costs a first-time
+visitor: the gzipped template markup, the compressed size of the local
+assets it links and the number of requests, including third-party ones.
+Third-party assets are weighed with their size in ``EXTERNAL_ASSET_BYTES``;
+one without a configured size fails the check rather than counting as free.
+"""
+import functools
+import gzip
+import os
+import re
+from pathlib import Path
+
+import rcssmin
+import rjsmin
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.template.loader import get_template
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Licence headers (/*! ... */) of vendored files are kept
+MINIFIERS = {
+    '.css': functools.partial(rcssmin.cssmin, keep_bang_comments=True),
+    '.js': functools.partial(rjsmin.jsmin, keep_bang_comments=True),
+}
+SEPARATORS = {'.css': '\n', '.js': ';\n'}
+
+EXTENDS_PATTERN = re.compile(r"""{%\s*extends\s+['"]([^'"]+)['"]\s*%}""")
+INCLUDE_PATTERN = re.compile(r"""{%\s*include\s+['"]([^'"]+)['"]""")
+STATIC_PATTERN = re.compile(r"""{%\s*(?:static|asset_bundle)\s+['"]([^'"]+)['"]\s*%}""")
+EXTERNAL_PATTERN = re.compile(r"""<(?:link|script|img)\b[^>]*?\b(?:href|src)=["'](https?://[^"']+)["']""")
+TEMPLATE_TAG_PATTERN = re.compile(r'{%.*?%}|{#.*?#}', re.DOTALL)
+
+
+def build_bundle(name, files):
+    """Minified content of a bundle; ``files`` maps each source to a readable storage"""
+    extension = os.path.splitext(name)[1]
+    parts = []
+    for source in settings.ASSET_BUNDLES[name]:
+        if source not in files:
+            raise ValueError(f'Static file {source!r} of bundle {name!r} was not found')
+        storage, path = files[source]
+        with storage.open(path) as f:
+            parts.append(f.read().decode())
+    return MINIFIERS[extension](SEPARATORS[extension].join(parts))
+
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """WhiteNoise's compressed manifest storage that also builds ASSET_BUNDLES"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name in settings.ASSET_BUNDLES:
+                content = build_bundle(name, paths)
+                if self.exists(name):
+                    self.delete(name)
+                self.save(name, ContentFile(content.encode()))
+                paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+
+def template_sources(name):
+    """Sources of a template, its includes and the templates it extends"""
+    sources = []
+    pending = [name]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        source = get_template(current).template.source
+        sources.append(source)
+        pending.extend(EXTENDS_PATTERN.findall(source))
+        pending.extend(INCLUDE_PATTERN.findall(source))
+    return sources
+
+
+def page_templates():
+    """App templates that render a whole HTML document"""
+    root = Path(apps.get_app_config('quiz_app').path) / 'templates'
+    names = sorted(path.relative_to(root).as_posix() for path in root.rglob('*.html'))
+    return [name for name in names if any('<html' in source for source in template_sources(name))]
+
+
+def transfer_size(storage, name):
+    """Bytes sent for a static file: its brotli or gzip variant when there is one"""
+    path = storage.path(storage.stored_name(name))
+    for suffix in ('.br', '.gz', ''):
+        if os.path.exists(path + suffix):
+            return os.path.getsize(path + suffix)
+    raise FileNotFoundError(path)
+
+
+def page_weight(name, storage):
+    sources = template_sources(name)
+    markup = TEMPLATE_TAG_PATTERN.sub('', '\n'.join(sources)).encode()
+    local = list(dict.fromkeys(asset for source in sources for asset in STATIC_PATTERN.findall(source)))
+    external = list(dict.fromkeys(url for source in sources for url in EXTERNAL_PATTERN.findall(source)))
+    markup_bytes = len(gzip.compress(markup))
+    asset_bytes = sum(transfer_size(storage, asset) for asset in local)
+    asset_bytes += sum(settings.EXTERNAL_ASSET_BYTES.get(url, 0) for url in external)
+    return {
+        'template': name,
+        'markup_bytes': markup_bytes,
+        'asset_bytes': asset_bytes,
+        'total_bytes': markup_bytes + asset_bytes,
+        'requests': 1 + len(local) + len(external),
+        'unweighed': [url for url in external if url not in settings.EXTERNAL_ASSET_BYTES],
+    }
+
+
+def page_budget(name):
+    return {**settings.PAGE_BUDGETS['default'], **settings.PAGE_BUDGETS.get(name, {})}
+
+
+def page_weights(storage):
+    """(report, budget, over budget) for every page template"""
+    results = []
+    for name in page_templates():
+        report = page_weight(name, storage)
+        budget = page_budget(name)
+        over = (
+            report['total_bytes'] > budget['kilobytes'] * 1024 or report['requests'] > budget['requests']
+            or bool(report['unweighed'])
+        )
+        results.append((report, budget, over))
+    return results
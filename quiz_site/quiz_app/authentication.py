@@ -0,0 +1,96 @@
+"""Fast paths for authentication under load.
+
+* ``get_cached_user`` (and ``aget_cached_user`` for ``request.auser``)
+  resolves the user from the cache instead of reading ``auth_user`` on
+  every request. The cache must be shared by all workers, or invalidations
+  would only reach the worker that made them.
+* ``hashing_slot`` bounds how many password hashes a process computes at
+  once, so a login storm queues up instead of starving every worker thread.
+* ``purge_expired_sessions`` deletes expired session rows in small batches.
+"""
+import threading
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+_hashing_semaphore = threading.BoundedSemaphore(settings.LOGIN_HASHING_CONCURRENCY)
+
+
+def user_cache_key(user_pk):
+    return f'auth_user:{user_pk}'
+
+
+def invalidate_cached_user(user_pk):
+    cache.delete(user_cache_key(user_pk))
+
+
+def get_cached_user(request):
+    """Drop-in replacement for django.contrib.auth.get_user backed by the cache"""
+    session = request.session
+    user_pk = session.get(SESSION_KEY)
+    backend_path = session.get(BACKEND_SESSION_KEY)
+    if user_pk is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return get_user(request)
+
+    key = user_cache_key(user_pk)
+    user = cache.get(key)
+    if user is None:
+        user = get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    session_hash = session.get(HASH_SESSION_KEY)
+    if not user.is_active or not session_hash or not constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    ):
+        # Let Django do the full verification (fallback keys, session flush)
+        invalidate_cached_user(user_pk)
+        return get_user(request)
+
+    user.backend = backend_path
+    return user
+
+
+async def aget_cached_user(request):
+    """Async counterpart of get_cached_user, memoized on the request like Django's auser"""
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_cached_user)(request)
+    return request._acached_user
+
+
+@contextmanager
+def hashing_slot(timeout=None):
+    """Wait up to ``timeout`` seconds for a password hashing slot.
+
+    Yields True when a slot was acquired and False when the wait timed out,
+    in which case the caller should ask the client to retry.
+    """
+    if timeout is None:
+        timeout = settings.LOGIN_QUEUE_TIMEOUT
+    acquired = _hashing_semaphore.acquire(timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _hashing_semaphore.release()
+
+
+def purge_expired_sessions(batch_size=5000):
+    """Delete expired database sessions one batch per transaction"""
+    expired = Session.objects.filter(expire_date__lt=timezone.now())
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            Session.objects.filter(session_key__in=keys).delete()
+        deleted += len(keys)
@@ -0,0 +1,153 @@
+"""Compact JSON quiz papers for the client-side quiz player.
+
+A paper is the quiz's drawn questions as arrays
+(``[id, text, option_a, option_b, option_c, option_d]``) and never includes
+the answer key. The player submits one character per question, in paper
+order, so every paper carries its question ids, signed, in its ``paper``
+field and the submission sends them back. Nothing about a paper has to be
+remembered on the server, so any process can grade it:
+
+* Fixed quizzes have one paper per ``Quiz.content_version``. It is built
+  once per process, kept compressed in the cache and served under a
+  versioned URL that browsers and the CDN may cache forever. The version is
+  keyed with SECRET_KEY, so the URL cannot be worked out from the quiz id;
+  only the start page hands it out. Papers of older versions stay gradable.
+* Random quizzes are drawn per start. Their signature is tied to the
+  student and the submission token and expires with the quiz.
+"""
+import gzip
+import json
+
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used when brotli is not installed
+    brotli = None
+
+PAPER_CACHE_TIMEOUT = 24 * 60 * 60
+# A drawn paper can be submitted until the quiz timed out plus this grace
+DRAW_GRACE_SECONDS = 30 * 60
+UNANSWERED = '-'
+
+
+def paper_cache_key(quiz_id, content_version):
+    return f'quiz_paper:{quiz_id}:{content_version}'
+
+
+def fixed_signer(quiz_id):
+    return signing.Signer(salt=f'quiz_app.fixed_paper:{quiz_id}')
+
+
+def draw_signer(user, token):
+    return signing.TimestampSigner(salt=f'quiz_app.draw:{user.pk}:{token}')
+
+
+def draw_max_age(quiz):
+    """Seconds a drawn paper of the quiz can be submitted"""
+    if quiz.time_limit > 0:
+        return quiz.time_limit * 60 + DRAW_GRACE_SECONDS
+    return PAPER_CACHE_TIMEOUT
+
+
+def paper_body(quiz, questions, signed_ids):
+    return json.dumps({
+        'quiz': quiz.id,
+        'paper': signed_ids,
+        'name': quiz.name,
+        'time_limit': quiz.time_limit,
+        'questions': [
+            [question.id, question.text, question.option_a, question.option_b, question.option_c, question.option_d]
+            for question in questions
+        ],
+    }, separators=(',', ':')).encode()
+
+
+def _compressed(body):
+    encoded = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=11)
+    return encoded
+
+
+def fixed_paper(quiz):
+    """The current paper of a fixed quiz: {'version', 'question_ids', 'encoded'}"""
+    key = paper_cache_key(quiz.id, quiz.content_version)
+    paper = cache.get(key)
+    if paper is None:
+        questions = list(quiz.questions.order_by('pk')[:quiz.num_questions])
+        question_ids = [question.id for question in questions]
+        version = salted_hmac('quiz_app.fixed_paper', f'{quiz.id}:{quiz.content_version}',
+                              algorithm='sha256').hexdigest()[:16]
+        signed_ids = fixed_signer(quiz.id).sign_object(question_ids, compress=True)
+        paper = {
+            'version': version,
+            'question_ids': question_ids,
+            'encoded': _compressed(paper_body(quiz, questions, signed_ids)),
+        }
+        cache.set(key, paper, PAPER_CACHE_TIMEOUT)
+    return paper
+
+
+def draw_paper(quiz, user, token):
+    """Draw a random quiz for one start, signing its order for the submission"""
+    questions = list(quiz.get_questions())
+    signed_ids = draw_signer(user, token).sign_object([question.id for question in questions], compress=True)
+    return _compressed(paper_body(quiz, questions, signed_ids))
+
+
+def paper_question_ids(quiz, user, paper, token):
+    """Question ids, in paper order, of the paper a submission answers (or None)"""
+    try:
+        if quiz.quiz_type == 'random':
+            question_ids = draw_signer(user, token).unsign_object(paper, max_age=draw_max_age(quiz))
+        else:
+            question_ids = fixed_signer(quiz.id).unsign_object(paper)
+    except signing.BadSignature:
+        return None
+    if not isinstance(question_ids, list) or not all(isinstance(qid, int) for qid in question_ids):
+        return None
+    return question_ids
+
+
+def parse_accept_encoding(header):
+    """{coding: q-value} of an Accept-Encoding header; malformed q-values count as 0"""
+    qualities = {}
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        coding = coding.lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+                if not 0 <= quality <= 1:
+                    quality = 0.0
+        if coding == 'x-gzip':
+            coding = 'gzip'
+        qualities[coding] = max(quality, qualities.get(coding, 0.0))
+    return qualities
+
+
+def pick_encoding(request, encoded):
+    """The best Content-Encoding the client accepts.
+
+    The highest q-value wins; codings with q=0 are refused, ``*`` stands for
+    codings not listed, and ties go to br, then gzip, then identity.
+    """
+    qualities = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+    best, best_quality = 'identity', qualities.get('identity', 0.0)
+    for encoding in ('br', 'gzip'):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if encoding in encoded and quality > 0 and (
+            quality > best_quality or (quality == best_quality and best == 'identity')
+        ):
+            best, best_quality = encoding, quality
+    return best
@@ -0,0 +1,285 @@
+"""Near-duplicate question detection with MinHash signatures and LSH banding.
+
+Each question is reduced to a set of shingles: character 5-grams of its
+normalized stem plus one token per normalized option, so reworded stems
+still overlap and shuffled options are identical. A 64-value MinHash
+signature estimates the Jaccard similarity of two such sets.
+
+Signatures are split into 16 bands of 4 values; each band is hashed into a
+bucket and stored in ``QuestionSignatureBand``. Questions sharing any
+bucket are candidates, and candidates are confirmed by comparing their
+signatures, so the scan never compares all pairs and streams the band
+table instead of loading the bank into memory. Buckets with more than
+``MAX_BUCKET_SIZE`` members (low-information items such as True/False
+questions with stock options) are not compared pairwise: only identical
+signatures in them are grouped, and the bucket is reported.
+"""
+import hashlib
+import re
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, groupby
+
+import django
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Question, QuestionSignature, QuestionSignatureBand
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+DUPLICATE_THRESHOLD = 0.8
+SIGNATURE_BATCH_SIZE = 1000
+MAX_BUCKET_SIZE = 200
+
+SIGNATURE_FORMAT = f'<{NUM_PERM}I'
+BAND_FORMAT = f'<{ROWS}I'
+_unpack_signature = struct.Struct(SIGNATURE_FORMAT).unpack
+
+QUESTION_FIELDS = ['id', 'quiz_id', 'text', 'option_a', 'option_b', 'option_c', 'option_d']
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def question_content(question):
+    """Normalized (stem, options) of a question"""
+    options = sorted(normalize(option) for option in
+                     [question.option_a, question.option_b, question.option_c, question.option_d])
+    return normalize(question.text), [option for option in options if option]
+
+
+def content_hash(stem, options):
+    return hashlib.blake2b('\n'.join([stem] + options).encode(), digest_size=16).hexdigest()
+
+
+def shingles(stem, options):
+    if len(stem) <= SHINGLE_SIZE:
+        grams = {stem} if stem else set()
+    else:
+        grams = {stem[i:i + SHINGLE_SIZE] for i in range(len(stem) - SHINGLE_SIZE + 1)}
+    return grams | {f'option:{option}' for option in options}
+
+
+def minhash(tokens):
+    """MinHash signature of a set of strings.
+
+    One SHAKE-128 digest per token supplies all NUM_PERM 32-bit hash values
+    at once, which is several times faster in Python than evaluating NUM_PERM
+    separate hash permutations.
+    """
+    rows = [_unpack_signature(hashlib.shake_128(token.encode()).digest(NUM_PERM * 4)) for token in tokens]
+    if not rows:
+        return [0] * NUM_PERM
+    return [min(column) for column in zip(*rows)]
+
+
+def band_buckets(signature):
+    """One signed 64-bit bucket id per band of the signature"""
+    buckets = []
+    for band in range(BANDS):
+        values = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(BAND_FORMAT, *values), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def similarity(packed_a, packed_b):
+    """Estimated Jaccard similarity of two packed signatures"""
+    a = _unpack_signature(packed_a)
+    b = _unpack_signature(packed_b)
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def compute_signature(content):
+    """(packed signature, band buckets) for a (stem, options) pair"""
+    signature = minhash(shingles(*content))
+    return struct.pack(SIGNATURE_FORMAT, *signature), band_buckets(signature)
+
+
+def _save_signatures(entries):
+    """Replace the stored signatures of (question_id, hash, packed, buckets) entries"""
+    question_ids = [question_id for question_id, _, _, _ in entries]
+    with transaction.atomic():
+        QuestionSignatureBand.objects.filter(signature_id__in=question_ids).delete()
+        QuestionSignature.objects.filter(question_id__in=question_ids).delete()
+        QuestionSignature.objects.bulk_create([
+            QuestionSignature(question_id=question_id, content_hash=digest, minhash=packed)
+            for question_id, digest, packed, _ in entries
+        ])
+        QuestionSignatureBand.objects.bulk_create([
+            QuestionSignatureBand(signature_id=question_id, band=band, bucket=bucket)
+            for question_id, _, _, buckets in entries
+            for band, bucket in enumerate(buckets)
+        ])
+
+
+def update_signature(question):
+    """Refresh the signature of one question if its text or options changed"""
+    content = question_content(question)
+    digest = content_hash(*content)
+    if QuestionSignature.objects.filter(question_id=question.pk, content_hash=digest).exists():
+        return False
+    packed, buckets = compute_signature(content)
+    _save_signatures([(question.pk, digest, packed, buckets)])
+    return True
+
+
+def _init_worker():
+    django.setup()
+
+
+def rebuild_signatures(batch_size=SIGNATURE_BATCH_SIZE, workers=1, progress=None):
+    """Bring every stored signature up to date, walking questions in pk order.
+
+    Only new or edited questions are re-hashed. ``progress`` is called with
+    (questions_checked, questions_total). Returns the number of signatures
+    written.
+    """
+    total = Question.objects.count()
+    questions = Question.objects.order_by('pk').only(*QUESTION_FIELDS)
+    pool = None
+    if workers > 1:
+        # Child processes must open their own database connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+    checked = written = 0
+    last_pk = 0
+    try:
+        while True:
+            batch = list(questions.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            stored = dict(QuestionSignature.objects.filter(
+                question_id__in=[question.pk for question in batch],
+            ).values_list('question_id', 'content_hash'))
+            stale = []
+            for question in batch:
+                content = question_content(question)
+                digest = content_hash(*content)
+                if stored.get(question.pk) != digest:
+                    stale.append((question.pk, digest, content))
+
+            if stale:
+                contents = [content for _, _, content in stale]
+                if pool is None:
+                    signatures = [compute_signature(content) for content in contents]
+                else:
+                    signatures = pool.map(compute_signature, contents,
+                                          chunksize=max(1, len(contents) // (workers * 4)))
+                _save_signatures([
+                    (question_id, digest, packed, buckets)
+                    for (question_id, digest, _), (packed, buckets) in zip(stale, signatures)
+                ])
+                written += len(stale)
+            if progress:
+                progress(checked, total)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return written
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def _group_identical(groups, members, remaining_rows):
+    """Union questions with identical signatures in an oversized bucket, in linear time.
+
+    Returns the bucket size.
+    """
+    first_with_signature = {}
+    size = 0
+    rest = ((question_id, bytes(packed)) for _, _, question_id, packed in remaining_rows)
+    for question_id, packed in chain(members, rest):
+        size += 1
+        first = first_with_signature.setdefault(packed, question_id)
+        if first != question_id:
+            groups.union(question_id, first)
+    return size
+
+
+def find_duplicates(quiz_id=None, threshold=DUPLICATE_THRESHOLD, oversized=None, heartbeat=None):
+    """Group questions whose estimated similarity is at least ``threshold``.
+
+    Returns a list of groups, largest first; each group is a list of
+    (question_id, similarity_to_first_member) pairs. With ``quiz_id`` only
+    questions of that quiz are compared. ``(band, bucket, size)`` of every
+    bucket over MAX_BUCKET_SIZE is appended to the ``oversized`` list.
+    ``heartbeat`` is called once per bucket.
+    """
+    shared_bucket = QuestionSignatureBand.objects.filter(
+        band=OuterRef('band'), bucket=OuterRef('bucket'),
+    ).exclude(signature_id=OuterRef('signature_id'))
+    bands = QuestionSignatureBand.objects.all()
+    if quiz_id is not None:
+        shared_bucket = shared_bucket.filter(signature__question__quiz_id=quiz_id)
+        bands = bands.filter(signature__question__quiz_id=quiz_id)
+    rows = (
+        bands.filter(Exists(shared_bucket))
+        .order_by('band', 'bucket', 'signature_id')
+        .values_list('band', 'bucket', 'signature_id', 'signature__minhash')
+        .iterator(chunk_size=2000)
+    )
+
+    groups = _DisjointSet()
+    for (band, bucket), bucket_rows in groupby(rows, key=lambda row: (row[0], row[1])):
+        if heartbeat:
+            heartbeat()
+        members = []
+        for _, _, question_id, packed in bucket_rows:
+            members.append((question_id, bytes(packed)))
+            if len(members) > MAX_BUCKET_SIZE:
+                break
+        if len(members) > MAX_BUCKET_SIZE:
+            size = _group_identical(groups, members, bucket_rows)
+            if oversized is not None:
+                oversized.append((band, bucket, size))
+            continue
+        for i, (question_id, packed) in enumerate(members):
+            for other_id, other_packed in members[i + 1:]:
+                if groups.find(question_id) == groups.find(other_id):
+                    continue
+                if packed == other_packed or similarity(packed, other_packed) >= threshold:
+                    groups.union(question_id, other_id)
+
+    clusters = {}
+    for question_id in list(groups.parent):
+        clusters.setdefault(groups.find(question_id), []).append(question_id)
+    clusters = [sorted(members) for members in clusters.values() if len(members) > 1]
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+
+    signatures = {}
+    member_ids = [question_id for members in clusters for question_id in members]
+    for start in range(0, len(member_ids), SIGNATURE_BATCH_SIZE):
+        signatures.update(
+            (question_id, bytes(packed)) for question_id, packed in QuestionSignature.objects.filter(
+                question_id__in=member_ids[start:start + SIGNATURE_BATCH_SIZE],
+            ).values_list('question_id', 'minhash')
+        )
+    return [
+        [(question_id, round(similarity(signatures[members[0]], signatures[question_id]), 2))
+         for question_id in members]
+        for members in clusters
+    ]
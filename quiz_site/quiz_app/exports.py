@@ -0,0 +1,107 @@
+"""Streaming CSV/JSONL export of quiz attempts.
+
+Rows are read with ``QuerySet.iterator()`` and turned into output chunks
+lazily, so memory use stays flat no matter how many attempts are exported.
+"""
+import csv
+import json
+import zlib
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+CSV_HEADER = ['attempt_id', 'username', 'quiz', 'score', 'correct_count', 'total_questions', 'date_attempted']
+BUFFER_SIZE = 64 * 1024
+
+
+class Echo:
+    """File-like object whose write() just hands the value back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(attempts, chunk_size=2000):
+    """Yield one dict per attempt without loading model instances or questions_data"""
+    rows = attempts.values_list(
+        'id', 'user__username', 'quiz__name', 'score', 'date_attempted',
+        'user_answers', 'correct_answers',
+    ).iterator(chunk_size=chunk_size)
+    for attempt_id, username, quiz_name, score, date_attempted, user_answers, correct_answers in rows:
+        correct_count = sum(
+            1 for qid, answer in user_answers.items() if answer == correct_answers.get(qid)
+        )
+        yield {
+            'attempt_id': attempt_id,
+            'username': username,
+            'quiz': quiz_name,
+            'score': score,
+            'correct_count': correct_count,
+            'total_questions': len(user_answers),
+            # One spelling for both formats: ISO 8601 with microseconds and offset
+            'date_attempted': date_attempted.isoformat(),
+            'user_answers': user_answers,
+            'correct_answers': correct_answers,
+        }
+
+
+def iter_csv(rows, include_answers=False):
+    writer = csv.writer(Echo())
+    header = CSV_HEADER + (['answers'] if include_answers else [])
+    yield writer.writerow(header)
+    for row in rows:
+        values = [row[field] for field in CSV_HEADER]
+        if include_answers:
+            values.append(json.dumps(
+                {qid: [answer, row['correct_answers'].get(qid)] for qid, answer in row['user_answers'].items()},
+                separators=(',', ':'),
+            ))
+        yield writer.writerow(values)
+
+
+def iter_jsonl(rows, include_answers=False):
+    for row in rows:
+        record = {field: row[field] for field in CSV_HEADER}
+        if include_answers:
+            record['answers'] = {
+                qid: {'answer': answer, 'correct': row['correct_answers'].get(qid)}
+                for qid, answer in row['user_answers'].items()
+            }
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """Encode text chunks and regroup them into blocks of roughly ``size`` bytes"""
+    buffer = []
+    buffered_bytes = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        buffered_bytes += len(data)
+        if buffered_bytes >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered_bytes = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(blocks):
+    """Compress a stream of byte blocks into a single gzip stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(attempts, fmt='csv', include_answers=False, compress=False, chunk_size=2000):
+    """Return an iterator of byte blocks for the given attempts queryset"""
+    rows = export_rows(attempts, chunk_size=chunk_size)
+    if fmt == 'jsonl':
+        chunks = iter_jsonl(rows, include_answers)
+    else:
+        chunks = iter_csv(rows, include_answers)
+    blocks = buffered(chunks)
+    if compress:
+        blocks = gzipped(blocks)
+    return blocks
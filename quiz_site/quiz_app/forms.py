@@ -1,9 +1,42 @@
+from datetime import date, timedelta
+
 from django import forms
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.forms import inlineformset_factory
+from django.utils import timezone
+from .duplicates import DUPLICATE_THRESHOLD
+from .identities import find_taken_identities
 from .models import Quiz, Question
+from .rollups import PERIODS
+
+class IdentityCheckMixin:
+    """Validate username/email uniqueness case-insensitively in one query"""
+    
+    def check_identity(self, exclude_pk=None):
+        username = self.cleaned_data.get('username')
+        email = self.cleaned_data.get('email')
+        taken_usernames, taken_emails = find_taken_identities(
+            [username] if username else [], [email] if email else [], exclude_pk=exclude_pk,
+        )
+        if username and username.lower() in taken_usernames:
+            self.add_error('username', "This username is already taken.")
+        if email and email.lower() in taken_emails:
+            self.add_error('email', "This email is already registered.")
+    
+    def validate_unique(self):
+        # check_identity already covers the username, so the model's own
+        # case-sensitive query for it is skipped. The database indexes catch
+        # anything that races past the check.
+        self.check_identity(exclude_pk=self.instance.pk)
+        exclude = self._get_validation_exclusions()
+        exclude.add('username')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
 
-class UserProfileForm(forms.ModelForm):
+class UserProfileForm(IdentityCheckMixin, forms.ModelForm):
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name']
@@ -17,20 +50,8 @@ class UserProfileForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.user_instance = kwargs.get('instance')
         super().__init__(*args, **kwargs)
-    
-    def clean_email(self):
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exclude(pk=self.user_instance.pk).exists():
-            raise forms.ValidationError("This email is already registered.")
-        return email
-    
-    def clean_username(self):
-        username = self.cleaned_data.get('username')
-        if User.objects.filter(username=username).exclude(pk=self.user_instance.pk).exists():
-            raise forms.ValidationError("This username is already taken.")
-        return username
 
-class UserRegistrationForm(forms.ModelForm):
+class UserRegistrationForm(IdentityCheckMixin, forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput(attrs={
         'class': 'form-control',
         'placeholder': 'Password'
@@ -59,17 +80,30 @@ class UserRegistrationForm(forms.ModelForm):
             raise forms.ValidationError("Passwords do not match.")
         
         return cleaned_data
+
+class RosterUploadForm(forms.Form):
+    roster = forms.FileField(
+        help_text='CSV with a header row: username, email, first_name, last_name, password',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
     
-    def clean_email(self):
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise forms.ValidationError("This email is already registered.")
-        return email
+    def clean_roster(self):
+        roster = self.cleaned_data['roster']
+        try:
+            text = roster.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The roster must be a UTF-8 encoded CSV file.")
+        header = text.split('\n', 1)[0].lower()
+        if 'username' not in header:
+            raise forms.ValidationError("The roster must have a header row with at least a \"username\" column.")
+        self.roster_text = text
+        return roster
 
 class QuizForm(forms.ModelForm):
     class Meta:
         model = Quiz
-        fields = ['name', 'description', 'time_limit', 'num_questions', 'total_questions', 'quiz_type', 'is_active']
+        fields = ['name', 'description', 'time_limit', 'num_questions', 'total_questions', 'quiz_type',
+                  'max_attempts', 'cooldown_minutes', 'is_active']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Quiz Name'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Quiz Description'}),
@@ -77,6 +111,8 @@ class QuizForm(forms.ModelForm):
             'num_questions': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Questions to show'}),
             'total_questions': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Total available questions'}),
             'quiz_type': forms.Select(attrs={'class': 'form-select'}),
+            'max_attempts': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '0 for unlimited'}),
+            'cooldown_minutes': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '0 for none'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
@@ -105,3 +141,50 @@ def get_question_formset(extra_forms=5):
     )
 
 QuestionFormSet = get_question_formset(5)
+
+class DuplicateScanForm(forms.Form):
+    quiz = forms.ModelChoiceField(
+        queryset=Quiz.objects.order_by('name'),
+        required=False,
+        empty_label='All quizzes',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    threshold = forms.FloatField(
+        min_value=0.5,
+        max_value=1.0,
+        initial=DUPLICATE_THRESHOLD,
+        help_text='Minimum estimated similarity between 0.5 and 1.0',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.05'}),
+    )
+
+class TrendForm(forms.Form):
+    quiz = forms.ModelChoiceField(
+        queryset=Quiz.objects.order_by('name'),
+        required=False,
+        empty_label='All quizzes',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    period = forms.ChoiceField(
+        choices=[(period, period.title()) for period in PERIODS],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    by_quiz = forms.BooleanField(
+        required=False,
+        label='One series per quiz',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        end = cleaned_data.get('end') or timezone.localdate()
+        # The last 30 days by default, but never before date.min
+        start = cleaned_data.get('start') or end - min(timedelta(days=29), end - date.min)
+        if start > end:
+            raise forms.ValidationError('The start date must not be after the end date.')
+        cleaned_data['start'] = start
+        cleaned_data['end'] = end
+        cleaned_data['period'] = cleaned_data.get('period') or 'day'
+        return cleaned_data
@@ -0,0 +1,155 @@
+"""Scoring of quiz attempts and bulk re-grading after answer key fixes."""
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .adaptive import rescore
+from .models import Question, RegradeChange, RegradeRun, UserQuizAttempt
+from .signals import attempts_regraded
+
+REGRADE_CHUNK_SIZE = 1000
+
+
+def grade(user_answers, correct_answers):
+    """Return (correct_count, total_questions, score) for an answer map"""
+    correct_count = sum(1 for qid, answer in user_answers.items()
+                        if answer == correct_answers.get(qid))
+    total_questions = len(user_answers)
+    score = (correct_count / total_questions * 100) if total_questions > 0 else 0
+    return correct_count, total_questions, round(score, 2)
+
+
+def get_answer_key(quiz_id):
+    return {
+        str(pk): option
+        for pk, option in Question.objects.filter(quiz_id=quiz_id).values_list('pk', 'correct_option')
+    }
+
+
+def get_difficulties(quiz_id):
+    return {
+        str(pk): difficulty
+        for pk, difficulty in Question.objects.filter(quiz_id=quiz_id).values_list('pk', 'difficulty')
+    }
+
+
+def regrade_range(run_id, quiz_id, answer_key, start_pk, end_pk, chunk_size=REGRADE_CHUNK_SIZE):
+    """Re-grade attempts with start_pk <= pk <= end_pk, one transaction per chunk.
+
+    Returns (attempts_scanned, attempts_changed).
+    """
+    attempts = (
+        UserQuizAttempt.objects.filter(quiz_id=quiz_id, pk__lte=end_pk)
+        .order_by('pk')
+        .only('id', 'score', 'ability', 'user_answers', 'correct_answers')
+    )
+    difficulties = None
+    scanned = changed = 0
+    last_pk = start_pk - 1
+    while True:
+        batch = list(attempts.filter(pk__gt=last_pk)[:chunk_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        scanned += len(batch)
+
+        updated = []
+        audit = []
+        for attempt in batch:
+            changed_questions = [
+                qid for qid, option in attempt.correct_answers.items()
+                if qid in answer_key and answer_key[qid] != option
+            ]
+            if not changed_questions:
+                continue
+            correct_answers = dict(attempt.correct_answers)
+            for qid in changed_questions:
+                correct_answers[qid] = answer_key[qid]
+            if attempt.ability is None:
+                _, _, score = grade(attempt.user_answers, correct_answers)
+            else:
+                # Adaptive attempts are scored from the ability their answers imply
+                if difficulties is None:
+                    difficulties = get_difficulties(quiz_id)
+                attempt.ability, score = rescore(attempt.user_answers, correct_answers, difficulties)
+            audit.append(RegradeChange(
+                run_id=run_id,
+                attempt_id=attempt.pk,
+                old_score=attempt.score,
+                new_score=score,
+                changed_questions=changed_questions,
+            ))
+            attempt.correct_answers = correct_answers
+            attempt.score = score
+            updated.append(attempt)
+
+        if updated:
+            with transaction.atomic():
+                UserQuizAttempt.objects.bulk_update(updated, ['correct_answers', 'score', 'ability'])
+                RegradeChange.objects.bulk_create(audit)
+            changed += len(updated)
+
+    return scanned, changed
+
+
+def _init_worker():
+    django.setup()
+
+
+def _split_range(start_pk, end_pk, parts):
+    step = max(1, (end_pk - start_pk + parts) // parts)
+    return [(lo, min(lo + step - 1, end_pk)) for lo in range(start_pk, end_pk + 1, step)]
+
+
+def regrade_quiz(quiz, triggered_by=None, chunk_size=REGRADE_CHUNK_SIZE, workers=1, progress=None):
+    """Bring the scores of every past attempt of a quiz in line with its current key.
+
+    Large quizzes can be split by primary-key range across ``workers``
+    processes. ``progress`` is called with (ranges_done, ranges_total).
+    """
+    answer_key = get_answer_key(quiz.pk)
+    run = RegradeRun.objects.create(quiz=quiz, triggered_by=triggered_by, answer_key=answer_key)
+
+    bounds = UserQuizAttempt.objects.filter(quiz=quiz).aggregate(lo=Min('pk'), hi=Max('pk'))
+    scanned = changed = 0
+    try:
+        if bounds['lo'] is not None:
+            ranges = _split_range(bounds['lo'], bounds['hi'], max(1, workers) * 4)
+            if workers > 1 and len(ranges) > 1:
+                # Child processes must open their own database connections
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                    futures = [
+                        pool.submit(regrade_range, run.pk, quiz.pk, answer_key, lo, hi, chunk_size)
+                        for lo, hi in ranges
+                    ]
+                    for done, future in enumerate(futures, start=1):
+                        range_scanned, range_changed = future.result()
+                        scanned += range_scanned
+                        changed += range_changed
+                        if progress:
+                            progress(done, len(ranges))
+            else:
+                for done, (lo, hi) in enumerate(ranges, start=1):
+                    range_scanned, range_changed = regrade_range(run.pk, quiz.pk, answer_key, lo, hi, chunk_size)
+                    scanned += range_scanned
+                    changed += range_changed
+                    if progress:
+                        progress(done, len(ranges))
+    except Exception:
+        RegradeRun.objects.filter(pk=run.pk).update(
+            status='failed', attempts_scanned=scanned, attempts_changed=changed, finished_at=timezone.now(),
+        )
+        raise
+
+    run.status = 'done'
+    run.attempts_scanned = scanned
+    run.attempts_changed = changed
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'attempts_scanned', 'attempts_changed', 'finished_at'])
+
+    attempts_regraded.send(sender=quiz.__class__, quiz_id=quiz.pk, run=run)
+    return run
@@ -0,0 +1,89 @@
+"""Case-insensitive username and email lookups.
+
+Backed by the LOWER() indexes on auth_user from migration 0005, and shared
+by the account forms and the roster import. Accounts created before those
+indexes may clash by case; ``identity_clashes`` lists them and the
+``resolve_identity_clashes`` command fixes them.
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+def find_taken_identities(usernames=(), emails=(), exclude_pk=None):
+    """Return the lower-cased usernames and emails already in use.
+
+    A single query served by the case-insensitive indexes on auth_user.
+    """
+    usernames = {username.lower() for username in usernames if username}
+    emails = {email.lower() for email in emails if email}
+    conditions = Q()
+    if usernames:
+        conditions |= Q(username_lower__in=usernames)
+    if emails:
+        conditions |= Q(email_lower__in=emails) & ~Q(email='')
+    if not conditions:
+        return set(), set()
+    
+    users = User.objects.annotate(username_lower=Lower('username'), email_lower=Lower('email')).filter(conditions)
+    if exclude_pk is not None:
+        users = users.exclude(pk=exclude_pk)
+    
+    taken_usernames, taken_emails = set(), set()
+    for username_lower, email_lower in users.values_list('username_lower', 'email_lower'):
+        if username_lower in usernames:
+            taken_usernames.add(username_lower)
+        if email_lower in emails:
+            taken_emails.add(email_lower)
+    return taken_usernames, taken_emails
+
+def identity_clashes(users):
+    """Accounts whose usernames or emails are equal ignoring case.
+
+    ``users`` is a User queryset (migrations pass their historical model).
+    Returns a list of (field, [(pk, value), ...]) groups, each ordered by pk.
+    """
+    groups = {'username': defaultdict(list), 'email': defaultdict(list)}
+    for pk, username, email in users.order_by('pk').values_list('pk', 'username', 'email'):
+        groups['username'][username.lower()].append((pk, username))
+        if email:
+            groups['email'][email.lower()].append((pk, email))
+    return [
+        (field, accounts)
+        for field, by_value in groups.items()
+        for accounts in by_value.values()
+        if len(accounts) > 1
+    ]
+
+def resolve_identity_clashes(users):
+    """Make usernames and emails unique ignoring case.
+
+    Within each group of clashing accounts the oldest (lowest id) is left
+    alone. The others get their id appended to the username (``Ann`` ->
+    ``ann_7``) and their email cleared. Returns a description of every change.
+    """
+    usernames = set()
+    emails = set()
+    changes = []
+    for user in users.order_by('pk').only('pk', 'username', 'email'):
+        fields = []
+        if user.username.lower() in usernames:
+            suffix = f'_{user.pk}'
+            candidate = user.username[:150 - len(suffix)] + suffix
+            while candidate.lower() in usernames or users.filter(username__iexact=candidate).exists():
+                suffix += '_'
+                candidate = user.username[:150 - len(suffix)] + suffix
+            changes.append(f'user {user.pk}: username {user.username!r} -> {candidate!r}')
+            user.username = candidate
+            fields.append('username')
+        if user.email and user.email.lower() in emails:
+            changes.append(f'user {user.pk} ({user.username}): cleared email {user.email!r}, already used by another account')
+            user.email = ''
+            fields.append('email')
+        if fields:
+            user.save(update_fields=fields)
+        usernames.add(user.username.lower())
+        if user.email:
+            emails.add(user.email.lower())
+    return changes
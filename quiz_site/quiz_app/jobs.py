@@ -0,0 +1,255 @@
+"""A small database-backed job queue for heavy admin operations.
+
+Views enqueue a ``Job`` row and return immediately; the ``run_jobs``
+management command claims queued jobs and runs the matching handler.
+Handlers do their work in short, chunked transactions and report progress
+on the job row as they go. Every progress report doubles as a heartbeat: a
+running job whose heartbeat is older than ``JOB_LEASE_SECONDS`` belonged to
+a worker that died, and is queued again (or failed after
+``JOB_MAX_ATTEMPTS`` claims). Handlers whose work has no natural progress
+steps pass ``keep_alive(job)`` into their loops instead.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, Quiz, Question, UserQuizAttempt
+
+DELETE_CHUNK_SIZE = 500
+JOB_MAX_ATTEMPTS = 3
+
+JOB_HANDLERS = {}
+# Payload keys removed as soon as a job of the kind stops running, whatever
+# the outcome (e.g. uploaded files that contain passwords)
+SECRET_PAYLOAD_KEYS = {}
+
+
+def job_handler(kind, secret_keys=()):
+    """Register a function as the handler for jobs of the given kind"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        SECRET_PAYLOAD_KEYS[kind] = tuple(secret_keys)
+        return func
+    return decorator
+
+
+def scrub_payload(job):
+    """Drop the secret keys of a job's kind from its payload, in memory and in the database"""
+    keys = [key for key in SECRET_PAYLOAD_KEYS.get(job.kind, ()) if key in job.payload]
+    if keys:
+        payload = Job.objects.filter(pk=job.pk).values_list('payload', flat=True).first() or {}
+        job.payload = {key: value for key, value in payload.items() if key not in keys}
+        Job.objects.filter(pk=job.pk).update(payload=job.payload)
+
+
+def enqueue(kind, payload=None, user=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, payload=payload or {}, created_by=user)
+
+
+def keep_alive(job):
+    """A callable for long loops that refreshes the job's heartbeat every tenth of a lease"""
+    interval = timedelta(seconds=settings.JOB_LEASE_SECONDS / 10)
+
+    def beat(*args):
+        if job.heartbeat_at is None or timezone.now() - job.heartbeat_at >= interval:
+            job.update_progress()
+    return beat
+
+
+def reclaim_stale_jobs():
+    """Queue running jobs whose worker stopped sending heartbeats again.
+
+    Jobs that were already claimed JOB_MAX_ATTEMPTS times are failed instead,
+    so a job that keeps killing its worker does not loop forever. Returns the
+    number of jobs reclaimed.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    stale = Job.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    abandoned = list(stale.filter(attempts__gte=JOB_MAX_ATTEMPTS))
+    failed = stale.filter(pk__in=[job.pk for job in abandoned]).update(
+        status='failed', error='The worker running this job stopped responding.', finished_at=now,
+    )
+    for job in abandoned:
+        scrub_payload(job)
+    requeued = stale.update(status='queued', message='Queued again after its worker stopped responding')
+    return failed + requeued
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to 'running' and return it.
+
+    The claim is a conditional UPDATE, so several workers can poll the same
+    table without picking up the same job.
+    """
+    reclaim_stale_jobs()
+    while True:
+        pk = (
+            Job.objects.filter(status='queued')
+            .order_by('created_at', 'pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if pk is None:
+            return None
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=pk, status='queued').update(
+            status='running', started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        handler(job)
+    except Exception:
+        Job.objects.filter(pk=job.pk).update(
+            status='failed', error=traceback.format_exc(), finished_at=timezone.now(),
+        )
+        return False
+    finally:
+        scrub_payload(job)
+    Job.objects.filter(pk=job.pk).update(
+        status='done', progress=job.progress, finished_at=timezone.now(),
+    )
+    return True
+
+
+def delete_in_chunks(queryset, job=None, chunk_size=DELETE_CHUNK_SIZE):
+    """Delete the rows of a queryset a chunk at a time, one transaction per chunk"""
+    model = queryset.model
+    deleted = 0
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            model.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+        if job is not None:
+            job.update_progress(progress=job.progress + len(pks))
+
+
+def user_deletion_steps(user_id):
+    """(label, queryset) pairs deleted, in order, before the user row itself"""
+    return [
+        ('attempts', UserQuizAttempt.objects.filter(user_id=user_id)),
+        ('attempts on their quizzes', UserQuizAttempt.objects.filter(quiz__created_by_id=user_id).exclude(user_id=user_id)),
+        ('questions', Question.objects.filter(quiz__created_by_id=user_id)),
+        ('quizzes', Quiz.objects.filter(created_by_id=user_id)),
+    ]
+
+
+def user_deletion_size(user_id):
+    """Rows deleted along with a user, the user row included"""
+    return sum(queryset.count() for _, queryset in user_deletion_steps(user_id)) + 1
+
+
+@job_handler('delete_user')
+def delete_user(job):
+    """Delete a user and everything that cascades from it in small chunks"""
+    user_id = job.payload['user_id']
+    steps = user_deletion_steps(user_id)
+    job.update_progress(progress=0, total=user_deletion_size(user_id))
+
+    for label, queryset in steps:
+        job.update_progress(message=f"Deleting {label}")
+        delete_in_chunks(queryset, job)
+
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).delete()
+    job.update_progress(progress=job.progress + 1, message=f"Deleted user {job.payload.get('username', user_id)}")
+
+
+@job_handler('regrade_quiz')
+def regrade_quiz_job(job):
+    """Re-grade past attempts of a quiz against its current answer key"""
+    from .grading import regrade_quiz
+
+    quiz = Quiz.objects.get(pk=job.payload['quiz_id'])
+
+    def progress(done, total):
+        job.update_progress(progress=done, total=total)
+
+    run = regrade_quiz(
+        quiz,
+        triggered_by=job.created_by,
+        workers=job.payload.get('workers', 1),
+        progress=progress,
+    )
+    job.update_progress(message=f"Re-graded {run.attempts_changed} of {run.attempts_scanned} attempts")
+
+
+@job_handler('cleanup_sessions')
+def cleanup_sessions_job(job):
+    """Delete expired database sessions in batches"""
+    from .authentication import purge_expired_sessions
+
+    deleted = purge_expired_sessions(batch_size=job.payload.get('batch_size', 5000))
+    job.update_progress(progress=deleted, total=deleted, message=f"Deleted {deleted} expired sessions")
+
+
+@job_handler('import_roster', secret_keys=['csv'])
+def import_roster_job(job):
+    """Create student accounts from an uploaded roster CSV"""
+    from .roster import import_roster
+
+    def progress(done, total):
+        job.update_progress(progress=done, total=total)
+
+    result = import_roster(job.payload['csv'], progress=progress)
+    # run_job drops the uploaded CSV (it may contain passwords); keep the outcome
+    Job.objects.filter(pk=job.pk).update(payload={
+        **job.payload,
+        'skipped': [list(skip) for skip in result.skipped[:500]],
+    })
+    job.update_progress(message=f"Created {result.created} users, skipped {len(result.skipped)} rows")
+
+
+@job_handler('find_duplicate_questions')
+def find_duplicate_questions_job(job):
+    """Refresh question signatures and group near-duplicate questions"""
+    from .duplicates import DUPLICATE_THRESHOLD, find_duplicates, rebuild_signatures
+
+    def progress(done, total):
+        job.update_progress(progress=done, total=total)
+
+    job.update_progress(message='Updating question signatures')
+    rebuild_signatures(progress=progress)
+    job.update_progress(message='Comparing candidate questions')
+    threshold = job.payload.get('threshold', DUPLICATE_THRESHOLD)
+    oversized = []
+    groups = find_duplicates(
+        quiz_id=job.payload.get('quiz_id'), threshold=threshold, oversized=oversized, heartbeat=keep_alive(job),
+    )
+    Job.objects.filter(pk=job.pk).update(payload={
+        **job.payload,
+        'groups': [[list(member) for member in group] for group in groups[:500]],
+        'oversized_buckets': len(oversized),
+    })
+    message = f"Found {len(groups)} groups of near-duplicate questions"
+    if oversized:
+        message += f"; {len(oversized)} oversized buckets only matched identical questions"
+    job.update_progress(message=message)
+
+
+@job_handler('calibrate_quiz')
+def calibrate_quiz_job(job):
+    """Re-estimate question difficulties of a quiz from its past attempts"""
+    from .adaptive import calibrate_quiz
+
+    updated = calibrate_quiz(job.payload['quiz_id'], heartbeat=keep_alive(job))
+    job.update_progress(progress=updated, total=updated, message=f"Calibrated {updated} questions")
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from quiz_site.quiz_app.archive import archive_attempts
+
+class Command(BaseCommand):
+    help = 'Move the detail of old quiz attempts into compressed archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.QUIZ_ARCHIVE_AFTER_DAYS,
+            help='Archive attempts older than this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        try:
+            count = archive_attempts(cutoff, batch_size=options['batch_size'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {count} attempts made before {cutoff:%Y-%m-%d}.'
+        ))
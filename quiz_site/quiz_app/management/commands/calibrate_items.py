@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_site.quiz_app.adaptive import CALIBRATION_CHUNK_SIZE, calibrate_quiz
+from quiz_site.quiz_app.models import Quiz
+
+class Command(BaseCommand):
+    help = 'Re-estimate question difficulties from past attempts (all adaptive quizzes by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int)
+        parser.add_argument('--chunk-size', type=int, default=CALIBRATION_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['quiz_ids']:
+            quizzes = Quiz.objects.filter(pk__in=options['quiz_ids'])
+            missing = set(options['quiz_ids']) - set(quizzes.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f"Quiz {', '.join(map(str, sorted(missing)))} does not exist.")
+        else:
+            quizzes = Quiz.objects.filter(quiz_type='adaptive')
+
+        for quiz in quizzes:
+            updated = calibrate_quiz(quiz.pk, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'Calibrated {updated} questions of "{quiz.name}".'))
@@ -0,0 +1,36 @@
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_site.quiz_app.assets import page_weights
+
+class Command(BaseCommand):
+    help = 'Report the weight and request count of every page and fail when one exceeds PAGE_BUDGETS'
+
+    def handle(self, *args, **options):
+        try:
+            results = page_weights(staticfiles_storage)
+        except (ValueError, FileNotFoundError) as exc:
+            raise CommandError(f'{exc}. Run collectstatic first.')
+
+        self.stdout.write(f'{"Template":<40} {"Markup":>8} {"Assets":>8} {"Total":>8} {"Budget":>8} {"Requests":>9}')
+        failures = []
+        for report, budget, over in results:
+            line = (
+                f'{report["template"]:<40} {report["markup_bytes"] / 1024:>7.1f}K {report["asset_bytes"] / 1024:>7.1f}K '
+                f'{report["total_bytes"] / 1024:>7.1f}K {budget["kilobytes"]:>7}K '
+                f'{report["requests"]:>4}/{budget["requests"]:<4}'
+            )
+            if over:
+                failures.append(report['template'])
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        unweighed = sorted({url for report, _, _ in results for url in report['unweighed']})
+        if unweighed:
+            self.stdout.write(self.style.ERROR(
+                'Third-party assets without a size in EXTERNAL_ASSET_BYTES: ' + ', '.join(unweighed)
+            ))
+        if failures:
+            raise CommandError(f'{len(failures)} page(s) over budget: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} pages are within budget.'))
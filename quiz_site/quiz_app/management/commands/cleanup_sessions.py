@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from quiz_site.quiz_app.authentication import purge_expired_sessions
+
+class Command(BaseCommand):
+    help = 'Delete expired database sessions in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions.'))
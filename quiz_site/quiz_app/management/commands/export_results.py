@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from quiz_site.quiz_app.exports import EXPORT_FORMATS, stream_export
+from quiz_site.quiz_app.models import UserQuizAttempt
+
+class Command(BaseCommand):
+    help = 'Stream quiz attempts to a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write to (defaults to stdout)')
+        parser.add_argument('--user', type=int, help='Only export attempts by this user id')
+        parser.add_argument('--quiz', type=int, help='Only export attempts for this quiz id')
+        parser.add_argument('--answers', action='store_true', help='Include per-question answers')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output on the fly')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        attempts = UserQuizAttempt.objects.all()
+        if options['user']:
+            attempts = attempts.filter(user_id=options['user'])
+        if options['quiz']:
+            attempts = attempts.filter(quiz_id=options['quiz'])
+
+        blocks = stream_export(
+            attempts,
+            fmt=options['format'],
+            include_answers=options['answers'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                for block in blocks:
+                    fh.write(block)
+            self.stderr.write(self.style.SUCCESS(f"Export written to {options['output']}"))
+        else:
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from quiz_site.quiz_app.duplicates import (
+    DUPLICATE_THRESHOLD, MAX_BUCKET_SIZE, SIGNATURE_BATCH_SIZE, find_duplicates, rebuild_signatures,
+)
+from quiz_site.quiz_app.models import Question
+
+class Command(BaseCommand):
+    help = 'Report groups of near-duplicate questions using MinHash/LSH signatures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only compare questions of this quiz')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DUPLICATE_THRESHOLD,
+            help='Minimum estimated similarity (0-1) to report two questions as duplicates',
+        )
+        parser.add_argument('--batch-size', type=int, default=SIGNATURE_BATCH_SIZE)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes used to compute missing signatures',
+        )
+        parser.add_argument(
+            '--skip-signatures',
+            action='store_true',
+            help='Use the stored signatures as they are instead of refreshing them first',
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_signatures']:
+            written = rebuild_signatures(batch_size=options['batch_size'], workers=options['workers'])
+            self.stdout.write(f'Updated {written} question signatures.')
+
+        oversized = []
+        groups = find_duplicates(quiz_id=options['quiz'], threshold=options['threshold'], oversized=oversized)
+        for number, group in enumerate(groups, start=1):
+            questions = Question.objects.select_related('quiz').in_bulk([question_id for question_id, _ in group])
+            self.stdout.write(f'\nGroup {number} ({len(group)} questions)')
+            for question_id, score in group:
+                question = questions.get(question_id)
+                if question is not None:
+                    self.stdout.write(f'  #{question_id} [{question.quiz.name}] {score:.2f}  {question.text[:70]}')
+
+        for band, bucket, size in oversized:
+            self.stdout.write(self.style.WARNING(
+                f'Band {band} bucket {bucket} holds {size} questions (more than {MAX_BUCKET_SIZE}); '
+                f'only identical questions in it were grouped.'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'\nFound {len(groups)} groups of near-duplicate questions.'))
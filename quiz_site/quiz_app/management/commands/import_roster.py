@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_site.quiz_app.roster import ROSTER_BATCH_SIZE, import_roster
+
+class Command(BaseCommand):
+    help = 'Create student accounts from a roster CSV (username,email,first_name,last_name,password)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the roster CSV file')
+        parser.add_argument('--batch-size', type=int, default=ROSTER_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (defaults to CPU count)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as fh:
+                text = fh.read()
+            result = import_roster(text, batch_size=options['batch_size'], workers=options['workers'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for line, username, reason in result.skipped:
+            self.stdout.write(self.style.WARNING(f'Line {line} ({username or "-"}): {reason}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} users, skipped {len(result.skipped)} rows.'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_site.quiz_app.models import Quiz
+from quiz_site.quiz_app.rollups import REBUILD_BATCH_SIZE, rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily score rollups used by trend reports from the quiz attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only rebuild the rollups of this quiz')
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        quiz_id = options['quiz']
+        if quiz_id is not None and not Quiz.objects.filter(pk=quiz_id).exists():
+            raise CommandError(f'Quiz {quiz_id} does not exist.')
+
+        written = rebuild_rollups(quiz_id=quiz_id, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily rollup rows.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from quiz_site.quiz_app.search import rebuild_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents for all quizzes and questions'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} search documents.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_site.quiz_app.grading import REGRADE_CHUNK_SIZE, regrade_quiz
+from quiz_site.quiz_app.models import Quiz
+
+class Command(BaseCommand):
+    help = "Re-grade every past attempt of a quiz against its current answer key"
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--chunk-size', type=int, default=REGRADE_CHUNK_SIZE)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes to split the attempts across (use 1 on SQLite)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            quiz = Quiz.objects.get(pk=options['quiz_id'])
+        except Quiz.DoesNotExist:
+            raise CommandError(f"Quiz {options['quiz_id']} does not exist.")
+
+        run = regrade_quiz(quiz, chunk_size=options['chunk_size'], workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Re-graded "{quiz.name}": {run.attempts_changed} of {run.attempts_scanned} attempts changed.'
+        ))
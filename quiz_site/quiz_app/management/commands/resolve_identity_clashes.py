@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from quiz_site.quiz_app.identities import identity_clashes, resolve_identity_clashes
+
+class Command(BaseCommand):
+    help = 'List accounts whose usernames or emails differ only by case, and with --apply rename them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apply', action='store_true',
+            help='Append the id to later clashing usernames and clear their shared emails',
+        )
+
+    def handle(self, *args, **options):
+        clashes = identity_clashes(User.objects.all())
+        if not clashes:
+            self.stdout.write(self.style.SUCCESS('No usernames or emails clash by case.'))
+            return
+        for field, accounts in clashes:
+            self.stdout.write(f"{field}: " + ', '.join(f'user {pk} ({value!r})' for pk, value in accounts))
+        if not options['apply']:
+            self.stdout.write(self.style.WARNING(
+                'Nothing changed. Tell the affected users, then run again with --apply: the oldest account '
+                'of each group is kept and the others are renamed or lose their email.'
+            ))
+            return
+        for change in resolve_identity_clashes(User.objects.all()):
+            self.stdout.write(f'  {change}')
+        self.stdout.write(self.style.SUCCESS('Resolved case-insensitive username/email clashes.'))
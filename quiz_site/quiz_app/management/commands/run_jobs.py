@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from quiz_site.quiz_app.jobs import claim_next_job, run_job
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (user deletions, imports, re-grading, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Exit after this many jobs (0 = no limit)')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Running {job}...')
+            if run_job(job):
+                self.stdout.write(self.style.SUCCESS(f'Job #{job.pk} finished.'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job #{job.pk} failed.'))
+
+            processed += 1
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
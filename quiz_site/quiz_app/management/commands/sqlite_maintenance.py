@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from quiz_site.quiz_app.sqlite import maintain
+
+class Command(BaseCommand):
+    help = 'Checkpoint the SQLite write-ahead log and refresh query planner statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--vacuum', action='store_true', help='Also rebuild the database file (locks it while running)')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if connections[using].vendor != 'sqlite':
+            self.stdout.write(f'Database "{using}" is not SQLite; nothing to do.')
+            return
+
+        result = maintain(using, vacuum=options['vacuum'])
+        if result['frames'] < 0:
+            self.stdout.write(self.style.SUCCESS('Database is not in WAL mode; statistics optimized.'))
+            return
+        if result['busy']:
+            self.stdout.write(self.style.WARNING(
+                f'Checkpoint copied {result["checkpointed"]} of {result["frames"]} WAL frames; '
+                'a connection was busy, run again later.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'WAL {result["wal_before"] / 1024:.0f} KB -> {result["wal_after"] / 1024:.0f} KB; statistics optimized.'
+        ))
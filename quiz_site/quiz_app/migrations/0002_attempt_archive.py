@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='archive_length',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='archive_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='archive_segment',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='userquizattempt',
+            name='date_attempted',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
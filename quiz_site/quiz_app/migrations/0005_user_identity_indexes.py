@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:39
+
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def check_identity_clashes(apps, schema_editor):
+    """Refuse to build the indexes while accounts clash by case.
+
+    Renaming accounts here would lock their owners out without telling
+    them, so the clashes are listed for an admin to resolve with
+    ``manage.py resolve_identity_clashes`` before migrating again.
+    """
+    User = apps.get_model('auth', 'User')
+    users = User.objects.using(schema_editor.connection.alias).order_by('pk')
+    groups = {'username': defaultdict(list), 'email': defaultdict(list)}
+    for pk, username, email in users.values_list('pk', 'username', 'email'):
+        groups['username'][username.lower()].append((pk, username))
+        if email:
+            groups['email'][email.lower()].append((pk, email))
+    lines = [
+        f"  {field}: " + ', '.join(f'user {pk} ({value!r})' for pk, value in accounts)
+        for field, by_value in groups.items()
+        for accounts in by_value.values()
+        if len(accounts) > 1
+    ]
+    if lines:
+        raise RuntimeError(
+            'Usernames or emails of these accounts differ only by case:\n' + '\n'.join(lines)
+            + '\nRun "python manage.py resolve_identity_clashes" to resolve them, then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+    """Case-insensitive unique indexes on auth_user for the form checks.
+
+    Blank emails are allowed more than once, so the email index is partial.
+    Fails while accounts already clash by case (see check_identity_clashes).
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('quiz_app', '0004_regrade'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_identity_clashes, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX quiz_app_user_username_ci ON auth_user (LOWER(username))",
+            reverse_sql="DROP INDEX quiz_app_user_username_ci",
+        ),
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX quiz_app_user_email_ci ON auth_user (LOWER(email)) WHERE email <> ''",
+            reverse_sql="DROP INDEX quiz_app_user_email_ci",
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+TABLE = 'quiz_app_searchdocument'
+FTS = 'quiz_app_searchdocument_fts'
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {FTS} USING fts5(title, body, content='{TABLE}', content_rowid='id', tokenize='porter unicode61')",
+    f"""CREATE TRIGGER {FTS}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS}(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER {FTS}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS}({FTS}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER {FTS}_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {FTS}({FTS}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {FTS}(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS {FTS}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS}_au",
+    f"DROP TABLE IF EXISTS {FTS}",
+]
+POSTGRES_FORWARD = [
+    f"""ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED""",
+    f"CREATE INDEX {TABLE}_vector_gin ON {TABLE} USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    f"DROP INDEX IF EXISTS {TABLE}_vector_gin",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        try:
+            for sql in SQLITE_FORWARD:
+                schema_editor.execute(sql)
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE queries
+            for sql in SQLITE_REVERSE:
+                schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in POSTGRES_REVERSE:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_REVERSE:
+            schema_editor.execute(sql)
+
+
+def index_existing_content(apps, schema_editor):
+    Quiz = apps.get_model('quiz_app', 'Quiz')
+    Question = apps.get_model('quiz_app', 'Question')
+    SearchDocument = apps.get_model('quiz_app', 'SearchDocument')
+    db = schema_editor.connection.alias
+    SearchDocument.objects.using(db).bulk_create(
+        [SearchDocument(kind='quiz', quiz_id=quiz.id, title=quiz.name, body=quiz.description or '')
+         for quiz in Quiz.objects.using(db).all()],
+        batch_size=500,
+    )
+    SearchDocument.objects.using(db).bulk_create(
+        [SearchDocument(
+            kind='question', quiz_id=question.quiz_id, question_id=question.id, title=question.text,
+            body='\n'.join(option for option in [question.option_a, question.option_b, question.option_c, question.option_d] if option),
+        ) for question in Question.objects.using(db).all()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0005_user_identity_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('quiz', 'Quiz'), ('question', 'Question')], max_length=10)),
+                ('title', models.TextField()),
+                ('body', models.TextField(blank=True, default='')),
+                ('question', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='quiz_app.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='quiz_app.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('kind', 'quiz')), fields=('quiz',), name='unique_quiz_search_document')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(index_existing_content, migrations.RunPython.noop),
+    ]
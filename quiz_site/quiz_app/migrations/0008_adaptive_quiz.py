@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0007_question_signatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='difficulty',
+            field=models.FloatField(default=0.0, help_text='Rasch difficulty in logits, set by calibration'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='difficulty_responses',
+            field=models.IntegerField(default=0, help_text='Answers the difficulty was calibrated from'),
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='quiz_type',
+            field=models.CharField(choices=[('fixed', 'Fixed'), ('random', 'Random'), ('adaptive', 'Adaptive')], default='fixed', max_length=10),
+        ),
+    ]
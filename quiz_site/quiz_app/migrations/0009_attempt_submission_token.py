@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0008_adaptive_quiz'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='submission_token',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='userquizattempt',
+            constraint=models.UniqueConstraint(fields=('user', 'submission_token'), name='unique_attempt_submission_token'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0009_attempt_submission_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='cooldown_minutes',
+            field=models.PositiveIntegerField(default=0, help_text='Minutes a student waits between attempts'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='max_attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Attempts allowed per student (0 for unlimited)'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0010_quiz_attempt_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyQuizStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_squares', models.FloatField(default=0)),
+                ('score_min', models.FloatField(default=0)),
+                ('score_max', models.FloatField(default=0)),
+                ('bucket_0', models.PositiveIntegerField(default=0)),
+                ('bucket_1', models.PositiveIntegerField(default=0)),
+                ('bucket_2', models.PositiveIntegerField(default=0)),
+                ('bucket_3', models.PositiveIntegerField(default=0)),
+                ('bucket_4', models.PositiveIntegerField(default=0)),
+                ('bucket_5', models.PositiveIntegerField(default=0)),
+                ('bucket_6', models.PositiveIntegerField(default=0)),
+                ('bucket_7', models.PositiveIntegerField(default=0)),
+                ('bucket_8', models.PositiveIntegerField(default=0)),
+                ('bucket_9', models.PositiveIntegerField(default=0)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='quiz_app.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily quiz stats',
+                'indexes': [models.Index(fields=['day'], name='quiz_app_daily_stats_day')],
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'day'), name='unique_daily_quiz_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0013_quiz_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='ability',
+            field=models.FloatField(blank=True, help_text='Final Rasch ability in logits of an adaptive attempt', null=True),
+        ),
+    ]
@@ -18,6 +18,7 @@ class Quiz(models.Model):
     QUIZ_TYPE_CHOICES = [
         ('fixed', 'Fixed'),
         ('random', 'Random'),
+        ('adaptive', 'Adaptive'),
     ]
     
     name = models.CharField(max_length=200)
@@ -26,9 +27,14 @@ class Quiz(models.Model):
     num_questions = models.IntegerField(help_text="Number of questions to show to user")
     total_questions = models.IntegerField(help_text="Total questions available in the quiz")
     quiz_type = models.CharField(max_length=10, choices=QUIZ_TYPE_CHOICES, default='fixed')
+    max_attempts = models.PositiveIntegerField(default=0, help_text="Attempts allowed per student (0 for unlimited)")
+    cooldown_minutes = models.PositiveIntegerField(default=0, help_text="Minutes a student waits between attempts")
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_quizzes')
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # Bumped whenever the quiz's questions change, so that per-process
+    # caches of them can tell they are stale from the quiz row alone
+    content_version = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name_plural = "Quizzes"
@@ -36,6 +42,20 @@ class Quiz(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # content_version only moves through bump_content_version, so saving
+        # an instance loaded before a bump never rolls it back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'content_version'
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def bump_content_version(cls, quiz_id):
+        cls.objects.filter(pk=quiz_id).update(content_version=models.F('content_version') + 1)
+    
     def get_questions(self):
         """Get questions for this quiz based on quiz type"""
         questions = self.questions.all()
@@ -59,6 +79,8 @@ class Question(models.Model):
     option_d = models.CharField(max_length=500)
     correct_option = models.CharField(max_length=1, choices=OPTION_CHOICES)
     explanation = models.TextField(blank=True, null=True)
+    difficulty = models.FloatField(default=0.0, help_text="Rasch difficulty in logits, set by calibration")
+    difficulty_responses = models.IntegerField(default=0, help_text="Answers the difficulty was calibrated from")
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -78,17 +100,45 @@ class UserQuizAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
     score = models.FloatField()
-    date_attempted = models.DateTimeField(default=timezone.now)
+    date_attempted = models.DateTimeField(default=timezone.now, db_index=True)
     user_answers = models.JSONField(default=dict)
     correct_answers = models.JSONField(default=dict)
     questions_data = models.JSONField(default=dict)
+    archived_at = models.DateTimeField(null=True, blank=True)
+    archive_segment = models.CharField(max_length=255, blank=True, default='')
+    archive_offset = models.BigIntegerField(null=True, blank=True)
+    archive_length = models.IntegerField(null=True, blank=True)
+    submission_token = models.CharField(max_length=32, null=True, blank=True, editable=False)
+    ability = models.FloatField(null=True, blank=True, help_text="Final Rasch ability in logits of an adaptive attempt")
     
     class Meta:
         ordering = ['-date_attempted']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'submission_token'], name='unique_attempt_submission_token'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.quiz.name} - {self.score}%"
     
+    @property
+    def is_archived(self):
+        return self.archived_at is not None
+    
+    def get_questions_data(self):
+        """Return per-question detail, loading it from the archive if needed"""
+        if not self.is_archived:
+            return self.questions_data
+        if not hasattr(self, '_archived_questions_data'):
+            from .archive import load_archived_questions_data
+            self._archived_questions_data = load_archived_questions_data(self)
+        return self._archived_questions_data or {}
+    
+    @property
+    def details_unavailable(self):
+        """True when archived per-question detail could not be read back"""
+        self.get_questions_data()
+        return getattr(self, '_archived_questions_data', {}) is None
+    
     def get_total_questions(self):
         return len(self.user_answers)
     
@@ -98,3 +148,174 @@ class UserQuizAttempt(models.Model):
             if answer == self.correct_answers.get(qid):
                 correct += 1
         return correct
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; a running job whose
+    # heartbeat is older than JOB_LEASE_SECONDS is reclaimed
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+    
+    @property
+    def percent_complete(self):
+        if self.status == 'done':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, int(self.progress * 100 / self.total))
+    
+    def update_progress(self, progress=None, total=None, message=None):
+        """Persist progress without touching the rest of the row"""
+        fields = {}
+        if progress is not None:
+            self.progress = fields['progress'] = progress
+        if total is not None:
+            self.total = fields['total'] = total
+        if message is not None:
+            self.message = fields['message'] = message[:255]
+        self.heartbeat_at = fields['heartbeat_at'] = timezone.now()
+        Job.objects.filter(pk=self.pk).update(**fields)
+
+class RegradeRun(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='regrade_runs')
+    triggered_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='regrade_runs')
+    answer_key = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    attempts_scanned = models.IntegerField(default=0)
+    attempts_changed = models.IntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Regrade of {self.quiz.name} ({self.started_at:%Y-%m-%d %H:%M})"
+
+class RegradeChange(models.Model):
+    run = models.ForeignKey(RegradeRun, on_delete=models.CASCADE, related_name='changes')
+    attempt = models.ForeignKey(UserQuizAttempt, on_delete=models.CASCADE, related_name='regrade_changes')
+    old_score = models.FloatField()
+    new_score = models.FloatField()
+    changed_questions = models.JSONField(default=list)
+    
+    def __str__(self):
+        return f"Attempt {self.attempt_id}: {self.old_score}% -> {self.new_score}%"
+
+class SearchDocument(models.Model):
+    """Denormalized text of a quiz or question, indexed for full-text search.
+
+    The full-text index itself is database specific (a GIN-indexed tsvector
+    column on PostgreSQL, an FTS5 table on SQLite) and is created by the
+    migration that adds this model. Rows are kept in sync by signals.
+    """
+    KIND_CHOICES = [
+        ('quiz', 'Quiz'),
+        ('question', 'Question'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='search_documents')
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, null=True, blank=True, related_name='search_document')
+    title = models.TextField()
+    body = models.TextField(blank=True, default='')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz'], condition=models.Q(kind='quiz'), name='unique_quiz_search_document'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind}: {self.title[:50]}"
+
+class QuestionSignature(models.Model):
+    """MinHash signature of a question's normalized text and options.
+
+    ``content_hash`` lets saves skip questions whose text did not change.
+    The signature's LSH bands are stored in QuestionSignatureBand.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    content_hash = models.CharField(max_length=32)
+    minhash = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Signature of question {self.question_id}"
+
+class QuestionSignatureBand(models.Model):
+    signature = models.ForeignKey(QuestionSignature, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='quiz_app_signature_bucket'),
+        ]
+    
+    def __str__(self):
+        return f"Question {self.signature_id} band {self.band}"
+
+class DailyQuizStats(models.Model):
+    """Score aggregates of one quiz's attempts on one day, maintained by rollups.py.
+
+    ``bucket_<n>`` counts scores from 10n up to (not including) 10n + 10;
+    ``bucket_9`` also counts perfect scores.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    attempts = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_squares = models.FloatField(default=0)
+    score_min = models.FloatField(default=0)
+    score_max = models.FloatField(default=0)
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "Daily quiz stats"
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'day'], name='unique_daily_quiz_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='quiz_app_daily_stats_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quiz} on {self.day}"
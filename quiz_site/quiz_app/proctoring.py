@@ -0,0 +1,238 @@
+"""Live proctoring feed for running quizzes.
+
+``publish`` appends quiz events (a student started, a student submitted) to
+a numbered per-quiz log in the shared cache. Proctor pages follow the log
+over Server-Sent Events without reading the session: the proctor page
+hands out a signed ``proctor_token`` for its quiz and user, and the event
+stream (and, under WSGI, every reconnect) checks that the user is still
+active staff through the cached user (``authentication.user_cache_key``),
+which user saves invalidate. A long ASGI stream repeats the check every
+KEEPALIVE_SECONDS, so revoking staff ends it.
+
+Inside a process, ``bus`` runs one polling task per watched quiz and fans
+new events out to every connected proctor, so cache reads do not grow with
+the number of watchers. A publish from the same process wakes that task
+immediately; events from other processes arrive on the next poll.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from .authentication import user_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Most events sent to a proctor when they connect
+REPLAY_LIMIT = 5000
+KEEPALIVE_SECONDS = 15
+TOKEN_SALT = 'quiz_app.proctoring'
+
+
+def proctor_token(user, quiz_id):
+    """A signed permission for ``user`` to follow the quiz's events"""
+    return signing.dumps({'quiz': quiz_id, 'user': user.pk}, salt=TOKEN_SALT, compress=True)
+
+
+def may_proctor(user_id):
+    """True if the user is still active staff, read from the user cache when possible"""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return False
+        cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user.is_active and (user.is_staff or user.is_superuser)
+
+
+def check_proctor_token(token, quiz_id):
+    """The id of the user ``token`` was issued to for this quiz within
+    PROCTOR_TOKEN_MAX_AGE, or None if it was not or they are no longer staff"""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROCTOR_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('quiz') != quiz_id or not may_proctor(data.get('user')):
+        return None
+    return data['user']
+
+
+def sequence_key(quiz_id):
+    return f'proctor:{quiz_id}:seq'
+
+
+def event_key(quiz_id, seq):
+    return f'proctor:{quiz_id}:event:{seq}'
+
+
+def publish(quiz_id, kind, user, **data):
+    """Record an event for the quiz's proctors. Failures never reach the student."""
+    try:
+        cache.add(sequence_key(quiz_id), 0, None)
+        seq = cache.incr(sequence_key(quiz_id))
+        event = {
+            'seq': seq,
+            'kind': kind,
+            'user_id': user.pk,
+            'username': user.get_username(),
+            'at': timezone.now().isoformat(),
+            **data,
+        }
+        cache.set(event_key(quiz_id, seq), event, settings.PROCTOR_EVENT_TIMEOUT)
+    except Exception:
+        logger.exception('Could not publish %s event for quiz %s', kind, quiz_id)
+        return None
+    bus.notify(quiz_id)
+    return event
+
+
+def latest_seq(quiz_id):
+    return cache.get(sequence_key(quiz_id)) or 0
+
+
+def read_events(quiz_id, after=0):
+    """(latest_seq, events with seq > after), oldest first"""
+    latest = latest_seq(quiz_id)
+    if latest < after:
+        # The log was reset (cache flushed); start over
+        after = 0
+    keys = [event_key(quiz_id, seq) for seq in range(max(after, latest - REPLAY_LIMIT) + 1, latest + 1)]
+    events = []
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        found = cache.get_many(chunk)
+        events.extend(found[key] for key in chunk if key in found)
+    return latest, events
+
+
+# Cache reads block; keep them off the event loop without queueing behind sync views
+_latest_seq = sync_to_async(latest_seq, thread_sensitive=False)
+_read_events = sync_to_async(read_events, thread_sensitive=False)
+_may_proctor = sync_to_async(may_proctor)
+
+
+def format_event(event):
+    return f"id: {event['seq']}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+
+
+class QuizFeed:
+    """Polls one quiz's event log and hands new events to local subscribers"""
+
+    def __init__(self, quiz_id):
+        self.quiz_id = quiz_id
+        self.queues = set()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def run(self):
+        last_seq = await _latest_seq(self.quiz_id)
+        while self.queues:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), settings.PROCTOR_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            last_seq, events = await _read_events(self.quiz_id, last_seq)
+            for queue in self.queues:
+                for event in events:
+                    queue.put_nowait(event)
+
+
+class EventBus:
+    """In-process fan-out from the cache log to SSE connections on the event loop"""
+
+    def __init__(self):
+        self._feeds = {}
+        self._loop = None
+
+    def subscribe(self, quiz_id):
+        self._loop = asyncio.get_running_loop()
+        feed = self._feeds.get(quiz_id)
+        if feed is None:
+            feed = self._feeds[quiz_id] = QuizFeed(quiz_id)
+        queue = asyncio.Queue()
+        feed.queues.add(queue)
+        if feed.task is None or feed.task.done():
+            feed.task = asyncio.create_task(feed.run())
+        return queue
+
+    def unsubscribe(self, quiz_id, queue):
+        feed = self._feeds.get(quiz_id)
+        if feed is None:
+            return
+        feed.queues.discard(queue)
+        if not feed.queues:
+            del self._feeds[quiz_id]
+            feed.wakeup.set()
+
+    def notify(self, quiz_id):
+        """Wake the quiz's feed; safe to call from any thread"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake, quiz_id)
+
+    def _wake(self, quiz_id):
+        feed = self._feeds.get(quiz_id)
+        if feed is not None:
+            feed.wakeup.set()
+
+
+bus = EventBus()
+
+
+async def live_events(quiz_id, user_id, after=0):
+    """Server-Sent Events for a quiz: recent history, then live updates.
+
+    Ends once ``user_id`` may no longer proctor.
+    """
+    queue = bus.subscribe(quiz_id)
+    loop = asyncio.get_running_loop()
+    checked_at = loop.time()
+    try:
+        yield 'retry: 3000\n\n'
+        sent = after
+        _, events = await _read_events(quiz_id, sent)
+        for event in events:
+            sent = event['seq']
+            yield format_event(event)
+
+        while True:
+            if loop.time() - checked_at >= KEEPALIVE_SECONDS:
+                if not await _may_proctor(user_id):
+                    return
+                checked_at = loop.time()
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event['seq'] <= sent:
+                continue
+            if event['seq'] > sent + 1:
+                # Published while this connection was replaying history
+                _, events = await _read_events(quiz_id, sent)
+            else:
+                events = [event]
+            for event in events:
+                sent = event['seq']
+                yield format_event(event)
+    finally:
+        bus.unsubscribe(quiz_id, queue)
+
+
+def recent_events(quiz_id, after=0):
+    """A finite SSE body for servers that cannot hold a stream open (WSGI).
+
+    The browser's EventSource reconnects after ``retry`` milliseconds with
+    Last-Event-ID. Reconnects carry the proctor token instead of touching the
+    session, so polling with a warm user cache reads the cache only.
+    """
+    _, events = read_events(quiz_id, after)
+    return f'retry: {int(settings.PROCTOR_POLL_SECONDS * 1000)}\n\n' + ''.join(format_event(event) for event in events)
@@ -0,0 +1,228 @@
+"""Daily score rollups for trend reporting.
+
+``DailyQuizStats`` keeps one row per quiz per day (in TIME_ZONE): the number
+of attempts, the sum and sum of squares of their scores, the lowest and
+highest score and a ten-bucket score histogram. A new attempt updates its
+row with a single UPDATE of F() expressions, so concurrent submissions
+never lose an increment, and a deleted one is subtracted the same way. A
+lowest or highest score cannot be subtracted, so deleting the attempt that
+held it, editing an attempt and re-grading a quiz rebuild the rows they
+touch from the attempts table.
+
+Trend queries only read rollup rows, so their cost depends on the number of
+days and quizzes asked for, not on the number of attempts.
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncDate
+from django.utils import timezone
+
+from .models import DailyQuizStats, UserQuizAttempt
+
+HISTOGRAM_BUCKETS = 10
+BUCKET_FIELDS = [f'bucket_{index}' for index in range(HISTOGRAM_BUCKETS)]
+STAT_FIELDS = ['attempts', 'score_sum', 'score_squares', 'score_min', 'score_max'] + BUCKET_FIELDS
+PERIODS = ['day', 'week', 'month']
+REBUILD_BATCH_SIZE = 1000
+# Attempt fields whose change moves an attempt between rollup rows
+ROLLUP_FIELDS = {'quiz', 'quiz_id', 'score', 'date_attempted'}
+
+
+def bucket_index(score):
+    return min(HISTOGRAM_BUCKETS - 1, max(0, int(score // 10)))
+
+
+def bucket_filter(index):
+    if index == 0:
+        return Q(score__lt=10)
+    if index == HISTOGRAM_BUCKETS - 1:
+        return Q(score__gte=index * 10)
+    return Q(score__gte=index * 10, score__lt=(index + 1) * 10)
+
+
+def _aggregates():
+    return {
+        'attempts': Count('pk'),
+        'score_sum': Sum('score'),
+        'score_squares': Sum(F('score') * F('score')),
+        'score_min': Min('score'),
+        'score_max': Max('score'),
+        **{field: Count('pk', filter=bucket_filter(index)) for index, field in enumerate(BUCKET_FIELDS)},
+    }
+
+
+def rollup_day(attempt):
+    """(quiz id, day) of the rollup row an attempt is counted in"""
+    return attempt.quiz_id, timezone.localdate(attempt.date_attempted)
+
+
+def stored_rollup_day(attempt_id):
+    """rollup_day of an attempt as it is saved in the database, or None"""
+    row = UserQuizAttempt.objects.filter(pk=attempt_id).values_list('quiz_id', 'date_attempted').first()
+    return (row[0], timezone.localdate(row[1])) if row else None
+
+
+def affects_rollups(update_fields):
+    return update_fields is None or bool(ROLLUP_FIELDS & set(update_fields))
+
+
+def add_attempt(attempt):
+    """Fold a new attempt into its quiz's row for the day"""
+    day = timezone.localdate(attempt.date_attempted)
+    score = attempt.score
+    bucket = BUCKET_FIELDS[bucket_index(score)]
+    rows = DailyQuizStats.objects.filter(quiz_id=attempt.quiz_id, day=day)
+    changes = {
+        'attempts': F('attempts') + 1,
+        'score_sum': F('score_sum') + score,
+        'score_squares': F('score_squares') + score * score,
+        'score_min': Least('score_min', Value(score)),
+        'score_max': Greatest('score_max', Value(score)),
+        bucket: F(bucket) + 1,
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyQuizStats.objects.create(
+                quiz_id=attempt.quiz_id, day=day, attempts=1, score_sum=score, score_squares=score * score,
+                score_min=score, score_max=score, **{bucket: 1},
+            )
+    except IntegrityError:
+        # Another submission created the row first
+        rows.update(**changes)
+
+
+def remove_attempt(attempt):
+    """Take a deleted attempt out of its quiz's row for the day"""
+    quiz_id, day = rollup_day(attempt)
+    score = attempt.score
+    bucket = BUCKET_FIELDS[bucket_index(score)]
+    # Strictly between the lowest and highest score, so both stay put and at
+    # least two attempts remain
+    subtracted = DailyQuizStats.objects.filter(
+        quiz_id=quiz_id, day=day, score_min__lt=score, score_max__gt=score,
+    ).update(
+        attempts=F('attempts') - 1,
+        score_sum=F('score_sum') - score,
+        score_squares=F('score_squares') - score * score,
+        **{bucket: F(bucket) - 1},
+    )
+    if not subtracted:
+        rebuild_day(quiz_id, day)
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rebuild_day(quiz_id, day):
+    """Recompute one quiz's row for one day from its attempts"""
+    start, end = day_range(day)
+    stats = UserQuizAttempt.objects.filter(
+        quiz_id=quiz_id, date_attempted__gte=start, date_attempted__lt=end,
+    ).order_by().aggregate(**_aggregates())
+    if stats['attempts']:
+        DailyQuizStats.objects.update_or_create(quiz_id=quiz_id, day=day, defaults=stats)
+    else:
+        DailyQuizStats.objects.filter(quiz_id=quiz_id, day=day).delete()
+
+
+def rebuild_rollups(quiz_id=None, batch_size=REBUILD_BATCH_SIZE):
+    """Replace the rollups of one quiz (or all quizzes) with a fresh GROUP BY over the attempts.
+
+    Returns the number of rollup rows written.
+    """
+    attempts = UserQuizAttempt.objects.order_by()
+    existing = DailyQuizStats.objects.all()
+    if quiz_id is not None:
+        attempts = attempts.filter(quiz_id=quiz_id)
+        existing = existing.filter(quiz_id=quiz_id)
+    rows = (
+        attempts.annotate(day=TruncDate('date_attempted'))
+        .values('quiz_id', 'day')
+        .annotate(**_aggregates())
+        .iterator(chunk_size=batch_size)
+    )
+
+    written = 0
+    with transaction.atomic():
+        existing.delete()
+        batch = []
+        for row in rows:
+            batch.append(DailyQuizStats(**row))
+            if len(batch) >= batch_size:
+                DailyQuizStats.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        DailyQuizStats.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _point(start, stats):
+    count = stats['attempts']
+    average = stats['score_sum'] / count
+    variance = max(0.0, stats['score_squares'] / count - average * average)
+    return {
+        'period': start.isoformat(),
+        'attempts': count,
+        'average': round(average, 2),
+        'stddev': round(math.sqrt(variance), 2),
+        'min': stats['score_min'],
+        'max': stats['score_max'],
+        'histogram': stats['histogram'],
+    }
+
+
+def score_trend(start, end, period='day', quiz_ids=None, by_quiz=False):
+    """Score statistics per period between two dates (inclusive), from the rollups.
+
+    Returns a list of series: {'quiz_id', 'points'}, with one series per
+    quiz when ``by_quiz`` is set and a single combined series (quiz_id
+    None) otherwise. Periods without attempts are left out.
+    """
+    rows = DailyQuizStats.objects.filter(day__gte=start, day__lte=end)
+    if quiz_ids:
+        rows = rows.filter(quiz_id__in=quiz_ids)
+
+    series = {}
+    for quiz_id, day, *values in rows.values_list('quiz_id', 'day', *STAT_FIELDS).iterator():
+        row = dict(zip(STAT_FIELDS, values))
+        points = series.setdefault(quiz_id if by_quiz else None, {})
+        key = period_start(day, period)
+        stats = points.get(key)
+        if stats is None:
+            points[key] = {
+                'attempts': row['attempts'],
+                'score_sum': row['score_sum'],
+                'score_squares': row['score_squares'],
+                'score_min': row['score_min'],
+                'score_max': row['score_max'],
+                'histogram': [row[field] for field in BUCKET_FIELDS],
+            }
+            continue
+        stats['attempts'] += row['attempts']
+        stats['score_sum'] += row['score_sum']
+        stats['score_squares'] += row['score_squares']
+        stats['score_min'] = min(stats['score_min'], row['score_min'])
+        stats['score_max'] = max(stats['score_max'], row['score_max'])
+        for index, field in enumerate(BUCKET_FIELDS):
+            stats['histogram'][index] += row[field]
+
+    return [
+        {'quiz_id': quiz_id, 'points': [_point(key, points[key]) for key in sorted(points)]}
+        for quiz_id, points in sorted(series.items(), key=lambda item: (item[0] is not None, item[0] or 0))
+    ]
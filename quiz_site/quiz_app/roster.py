@@ -0,0 +1,158 @@
+"""Bulk import of student rosters from CSV.
+
+Expected columns: username, email, first_name, last_name, password.
+Only ``username`` is required; rows without a password get an unusable
+one and must reset it before logging in.
+
+Passwords are hashed in a process pool, uniqueness is checked
+case-insensitively with one set-based query per batch, and
+``User``/``UserProfile`` rows are inserted with ``bulk_create``.
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections, transaction
+
+from .identities import find_taken_identities
+from .models import UserProfile
+
+ROSTER_FIELDS = ['username', 'email', 'first_name', 'last_name', 'password']
+ROSTER_BATCH_SIZE = 1000
+
+username_validator = UnicodeUsernameValidator()
+
+
+class RosterResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = []
+
+    def skip(self, line, username, reason):
+        self.skipped.append((line, username, reason))
+
+
+def read_roster(text):
+    """Parse roster CSV text into (line_number, row) pairs with normalized keys"""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or 'username' not in [name.strip().lower() for name in reader.fieldnames]:
+        raise ValueError('The roster must have a header row with at least a "username" column.')
+    for row in reader:
+        yield reader.line_num, {
+            (key or '').strip().lower(): (value or '').strip()
+            for key, value in row.items()
+            if (key or '').strip().lower() in ROSTER_FIELDS
+        }
+
+
+def _validate(row):
+    username = row.get('username', '')
+    if not username:
+        return 'missing username'
+    if len(username) > 150:
+        return 'username is longer than 150 characters'
+    try:
+        username_validator(username)
+        if row.get('email'):
+            validate_email(row['email'])
+    except ValidationError as exc:
+        return '; '.join(exc.messages)
+    return None
+
+
+def _init_worker():
+    django.setup()
+
+
+def _import_batch(batch, result, hash_passwords):
+    taken_usernames, taken_emails = find_taken_identities(
+        [row['username'] for _, row in batch],
+        [row['email'] for _, row in batch if row.get('email')],
+    )
+
+    accepted = []
+    for line, row in batch:
+        if row['username'].lower() in taken_usernames:
+            result.skip(line, row['username'], 'username already exists')
+        elif row.get('email') and row['email'].lower() in taken_emails:
+            result.skip(line, row['username'], 'email already registered')
+        else:
+            accepted.append(row)
+    if not accepted:
+        return
+
+    hashes = hash_passwords([row.get('password') or None for row in accepted])
+    users = [
+        User(
+            username=row['username'],
+            email=row.get('email', ''),
+            first_name=row.get('first_name', '')[:150],
+            last_name=row.get('last_name', '')[:150],
+            password=password_hash,
+        )
+        for row, password_hash in zip(accepted, hashes)
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            pks = dict(User.objects.filter(
+                username__in=[user.username for user in users]
+            ).values_list('username', 'pk'))
+            for user in users:
+                user.pk = pks[user.username]
+        UserProfile.objects.bulk_create([UserProfile(user_id=user.pk) for user in users])
+    result.created += len(users)
+
+
+def import_roster(text, batch_size=ROSTER_BATCH_SIZE, workers=None, progress=None):
+    """Create users from roster CSV text and return a RosterResult.
+
+    ``progress`` is called with (rows_processed, rows_total) after each batch.
+    """
+    result = RosterResult()
+    rows = []
+    seen_usernames = set()
+    seen_emails = set()
+    for line, row in read_roster(text):
+        error = _validate(row)
+        if not error and row['username'].lower() in seen_usernames:
+            error = 'duplicate username in file'
+        if not error and row.get('email') and row['email'].lower() in seen_emails:
+            error = 'duplicate email in file'
+        if error:
+            result.skip(line, row.get('username', ''), error)
+            continue
+        seen_usernames.add(row['username'].lower())
+        if row.get('email'):
+            seen_emails.add(row['email'].lower())
+        rows.append((line, row))
+
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1 and len(rows) > 1:
+        # Child processes must open their own database connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+    def hash_passwords(passwords):
+        if pool is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+    try:
+        for start in range(0, len(rows), batch_size):
+            _import_batch(rows[start:start + batch_size], result, hash_passwords)
+            if progress:
+                progress(min(start + batch_size, len(rows)), len(rows))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return result
@@ -0,0 +1,66 @@
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_PIN_SESSION_KEY = '_primary_pinned_until'
+
+_read_alias = ContextVar('quiz_read_alias', default=None)
+
+
+def replica_configured():
+    """Return True when a read replica database alias is available"""
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    """Send reads to the replica only inside views marked with @use_replica.
+
+    Everything else, including all writes and migrations, stays on the
+    primary 'default' database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+def pin_to_primary(request):
+    """Keep this session's reads on the primary for a short while after a write"""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 30)
+    request.session[PRIMARY_PIN_SESSION_KEY] = time.time() + seconds
+
+
+def is_pinned_to_primary(request):
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    return session.get(PRIMARY_PIN_SESSION_KEY, 0) > time.time()
+
+
+def use_replica(view_func):
+    """Route the ORM reads made by a reporting view to the read replica.
+
+    Falls back to the primary when no replica is configured or when the
+    current session has just written and must read its own writes.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not replica_configured() or is_pinned_to_primary(request):
+            return view_func(request, *args, **kwargs)
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return _wrapped_view
@@ -0,0 +1,232 @@
+"""Ranked full-text search over quizzes and questions.
+
+``SearchDocument`` rows hold the searchable text. Matching and ranking run
+on the database's own full-text engine:
+
+* PostgreSQL: ``websearch_to_tsquery`` against the GIN-indexed, generated
+  ``search_vector`` column, ranked with ``ts_rank``.
+* SQLite: an FTS5 external-content table kept current by triggers, ranked
+  with ``bm25``.
+* Anything else (or SQLite built without FTS5): ``icontains`` fallback.
+"""
+import re
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Question, Quiz, SearchDocument
+
+DOCUMENTS_TABLE = SearchDocument._meta.db_table
+FTS_TABLE = f'{DOCUMENTS_TABLE}_fts'
+QUIZ_TABLE = Quiz._meta.db_table
+
+_fts_available = {}
+
+
+def quiz_document_fields(quiz):
+    return {'title': quiz.name, 'body': quiz.description or ''}
+
+
+def question_document_fields(question):
+    options = [question.option_a, question.option_b, question.option_c, question.option_d]
+    return {'title': question.text, 'body': '\n'.join(option for option in options if option)}
+
+
+def sync_quiz(quiz):
+    SearchDocument.objects.update_or_create(
+        kind='quiz', quiz=quiz, defaults=quiz_document_fields(quiz),
+    )
+
+
+def sync_question(question):
+    SearchDocument.objects.update_or_create(
+        question=question, defaults={'kind': 'question', 'quiz_id': question.quiz_id, **question_document_fields(question)},
+    )
+
+
+def rebuild_index(batch_size=1000):
+    """Recreate every search document from the quiz and question tables"""
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        SearchDocument.objects.bulk_create(
+            (SearchDocument(kind='quiz', quiz=quiz, **quiz_document_fields(quiz))
+             for quiz in Quiz.objects.only('id', 'name', 'description').iterator()),
+            batch_size=batch_size,
+        )
+        questions = Question.objects.only(
+            'id', 'quiz_id', 'text', 'option_a', 'option_b', 'option_c', 'option_d',
+        ).iterator(chunk_size=batch_size)
+        SearchDocument.objects.bulk_create(
+            (SearchDocument(kind='question', quiz_id=question.quiz_id, question=question,
+                            **question_document_fields(question))
+             for question in questions),
+            batch_size=batch_size,
+        )
+    return SearchDocument.objects.count()
+
+
+def fts_query(query):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _backend(connection):
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        if connection.alias not in _fts_available:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _fts_available[connection.alias] = cursor.fetchone() is not None
+        if _fts_available[connection.alias]:
+            return 'sqlite'
+    return None
+
+
+class SearchResults:
+    """Lazy, sliceable search results usable with django.core.paginator.Paginator.
+
+    With ``group_by_quiz`` the results are Quiz objects, ranked by their best
+    matching document; otherwise they are SearchDocument objects.
+    """
+
+    def __init__(self, query, kinds=None, active_only=False, group_by_quiz=False):
+        self.query = query.strip()
+        self.kinds = list(kinds) if kinds else None
+        self.active_only = active_only
+        self.group_by_quiz = group_by_quiz
+        self._count = None
+        self.alias = SearchDocument.objects.db
+        self.connection = connections[self.alias]
+        self.backend = _backend(self.connection)
+
+    def _matches_nothing(self):
+        """True for queries FTS5 cannot express (no word characters at all)"""
+        return not self.query or (self.backend == 'sqlite' and not fts_query(self.query))
+
+    def _filters(self):
+        clauses, params = [], []
+        if self.kinds:
+            clauses.append('d.kind IN (%s)' % ', '.join(['%s'] * len(self.kinds)))
+            params.extend(self.kinds)
+        if self.active_only:
+            clauses.append('q.is_active = %s')
+            params.append(True)
+        return clauses, params
+
+    def _match_sql(self):
+        """FROM/WHERE clause, its params, and the SQL expression for the rank.
+
+        Lower rank sorts first, so PostgreSQL's ts_rank is negated.
+        """
+        clauses, params = self._filters()
+        if self.backend == 'postgresql':
+            from_sql = (
+                f'FROM {DOCUMENTS_TABLE} d JOIN {QUIZ_TABLE} q ON q.id = d.quiz_id, '
+                f"websearch_to_tsquery('english', %s) query"
+            )
+            where = ['d.search_vector @@ query'] + clauses
+            return from_sql, [self.query] + params, where, '-ts_rank(d.search_vector, query)'
+        from_sql = (
+            f'FROM {FTS_TABLE} JOIN {DOCUMENTS_TABLE} d ON d.id = {FTS_TABLE}.rowid '
+            f'JOIN {QUIZ_TABLE} q ON q.id = d.quiz_id'
+        )
+        where = [f'{FTS_TABLE} MATCH %s'] + clauses
+        return from_sql, [fts_query(self.query)] + params, where, f'bm25({FTS_TABLE}, 2.0, 1.0)'
+
+    def _fallback_queryset(self):
+        documents = SearchDocument.objects.all()
+        for word in self.query.split():
+            documents = documents.filter(Q(title__icontains=word) | Q(body__icontains=word))
+        if self.kinds:
+            documents = documents.filter(kind__in=self.kinds)
+        if self.active_only:
+            documents = documents.filter(quiz__is_active=True)
+        return documents
+
+    def documents(self):
+        """Lazy, unranked queryset of every matching SearchDocument, usable as a subquery"""
+        if self._matches_nothing():
+            return SearchDocument.objects.using(self.alias).none()
+        if self.backend is None:
+            return self._fallback_queryset()
+        from_sql, params, where, _ = self._match_sql()
+        return SearchDocument.objects.using(self.alias).filter(
+            pk__in=RawSQL(f"SELECT d.id {from_sql} WHERE {' AND '.join(where)}", params),
+        )
+
+    def count(self):
+        if self._count is None:
+            if self._matches_nothing():
+                self._count = 0
+            elif self.backend is None:
+                documents = self._fallback_queryset()
+                if self.group_by_quiz:
+                    self._count = documents.values('quiz_id').distinct().count()
+                else:
+                    self._count = documents.count()
+            else:
+                from_sql, params, where, _ = self._match_sql()
+                column = 'DISTINCT d.quiz_id' if self.group_by_quiz else '*'
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT({column}) {from_sql} WHERE {' AND '.join(where)}", params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _ranked_ids(self, offset, limit):
+        if self.backend is None:
+            documents = self._fallback_queryset().order_by('kind', 'id')
+            if self.group_by_quiz:
+                return list(
+                    documents.values_list('quiz_id', flat=True).order_by('quiz_id').distinct()[offset:offset + limit]
+                )
+            return list(documents.values_list('id', flat=True)[offset:offset + limit])
+
+        from_sql, params, where, rank = self._match_sql()
+        if self.group_by_quiz:
+            # FTS5 only allows bm25() in the row context of a MATCH, so rank
+            # documents in a materialized CTE (a plain subquery gets flattened)
+            # and aggregate outside it
+            sql = (
+                f"WITH ranked AS MATERIALIZED ("
+                f"SELECT d.quiz_id AS quiz_id, {rank} AS score {from_sql} WHERE {' AND '.join(where)}"
+                f") SELECT quiz_id, MIN(score) AS best FROM ranked "
+                f"GROUP BY quiz_id ORDER BY best, quiz_id LIMIT %s OFFSET %s"
+            )
+        else:
+            sql = (
+                f"SELECT d.id, {rank} AS score {from_sql} WHERE {' AND '.join(where)} "
+                f"ORDER BY score, d.id LIMIT %s OFFSET %s"
+            )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        if self._matches_nothing() or stop <= start:
+            return []
+        ids = self._ranked_ids(start, stop - start)
+        if self.group_by_quiz:
+            objects = Quiz.objects.using(self.alias).in_bulk(ids)
+        else:
+            objects = SearchDocument.objects.using(self.alias).select_related('quiz', 'question').in_bulk(ids)
+        return [objects[pk] for pk in ids if pk in objects]
+
+
+def search(query, kinds=None, active_only=False, group_by_quiz=False):
+    return SearchResults(query, kinds=kinds, active_only=active_only, group_by_quiz=group_by_quiz)
+
+
+def matching_object_ids(query, kind):
+    """IDs of every quiz or question matching the query, as a lazy subquery for pk__in"""
+    field = 'quiz_id' if kind == 'quiz' else 'question_id'
+    return search(query, kinds=[kind]).documents().values(field)
@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .authentication import invalidate_cached_user
+from .duplicates import update_signature
+from .models import Question, Quiz, UserQuizAttempt
+from .rollups import add_attempt, affects_rollups, rebuild_day, rebuild_rollups, remove_attempt, rollup_day, stored_rollup_day
+from .search import sync_question, sync_quiz
+from .throttling import forget_usage
+
+# Sent after past attempts of a quiz were re-graded with bulk_update (which
+# bypasses post_save). Arguments: quiz_id, run.
+attempts_regraded = Signal()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def clear_cached_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Quiz)
+def index_quiz(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_quiz(instance)
+
+
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_question(instance)
+
+
+@receiver(post_save, sender=Question)
+def sign_question(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_signature(instance)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_quiz_content_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Quiz.bump_content_version(instance.quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+def bump_edited_quiz_version(sender, instance, created, raw=False, **kwargs):
+    # The name and limits are part of the quiz paper
+    if not raw and not created:
+        Quiz.bump_content_version(instance.pk)
+
+
+@receiver(post_delete, sender=UserQuizAttempt)
+def recount_attempts(sender, instance, **kwargs):
+    forget_usage(instance.user_id, instance.quiz_id)
+
+
+@receiver(pre_save, sender=UserQuizAttempt)
+def remember_rollup_day(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or not affects_rollups(update_fields):
+        return
+    instance._stored_rollup_day = stored_rollup_day(instance.pk)
+
+
+@receiver(post_save, sender=UserQuizAttempt)
+def roll_up_attempt(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        add_attempt(instance)
+    elif affects_rollups(update_fields):
+        # Rebuild the row the attempt left as well as the one it is now in
+        for quiz_id, day in {rollup_day(instance), getattr(instance, '_stored_rollup_day', None)} - {None}:
+            rebuild_day(quiz_id, day)
+
+
+@receiver(post_delete, sender=UserQuizAttempt)
+def roll_up_deleted_attempt(sender, instance, **kwargs):
+    remove_attempt(instance)
+
+
+@receiver(attempts_regraded)
+def roll_up_regraded_quiz(sender, quiz_id, **kwargs):
+    rebuild_rollups(quiz_id=quiz_id)
@@ -0,0 +1,87 @@
+"""Idempotent quiz submissions.
+
+Every rendered quiz carries a random submission token. The first POST
+with a token creates the attempt, which stores the token; repeats (double
+clicks, browser retries) find it in the cache, or failing that through the
+unique (user, submission_token) index, and are redirected to the existing
+result without grading or writing anything.
+"""
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from . import proctoring
+from .models import UserQuizAttempt
+from .throttling import record_attempt
+
+TOKEN_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+def new_submission_token():
+    return uuid.uuid4().hex
+
+
+def clean_submission_token(value):
+    """The token if it is well formed, otherwise None"""
+    if value and TOKEN_PATTERN.fullmatch(value):
+        return value
+    return None
+
+
+def submission_cache_key(user_id, token):
+    return f'quiz_submission:{user_id}:{token}'
+
+
+def find_submission(user, token):
+    """ID of the attempt already created for this token, or None.
+
+    Looks in the cache first and falls back to the (user, submission_token)
+    index, so a repeat is recognized after the cache entry expired or on a
+    process that never saw the first submission.
+    """
+    if not token:
+        return None
+    attempt_id = cache.get(submission_cache_key(user.pk, token))
+    if attempt_id is None:
+        attempt_id = (
+            UserQuizAttempt.objects.filter(user=user, submission_token=token)
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if attempt_id is not None:
+            remember_submission(user, token, attempt_id)
+    return attempt_id
+
+
+def remember_submission(user, token, attempt_id):
+    if token:
+        cache.set(submission_cache_key(user.pk, token), attempt_id, settings.SUBMISSION_CACHE_TIMEOUT)
+
+
+def create_attempt_once(user, token, **fields):
+    """Create the attempt for a submission unless the token was already used.
+
+    Returns (attempt_id, created).
+    """
+    try:
+        with transaction.atomic():
+            attempt = UserQuizAttempt.objects.create(user=user, submission_token=token, **fields)
+    except IntegrityError:
+        if not token:
+            raise
+        attempt_id = (
+            UserQuizAttempt.objects.filter(user=user, submission_token=token)
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if attempt_id is None:
+            raise
+        remember_submission(user, token, attempt_id)
+        return attempt_id, False
+    remember_submission(user, token, attempt.pk)
+    record_attempt(attempt)
+    proctoring.publish(attempt.quiz_id, 'submitted', user, score=attempt.score, attempt_id=attempt.pk)
+    return attempt.pk, True
@@ -0,0 +1,19 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+TAGS = {
+    '.css': '<link rel="stylesheet" href="{}">',
+    '.js': '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def asset_bundle(name):
+    """Link a bundle from ASSET_BUNDLES, or its source files when DEBUG is on"""
+    files = settings.ASSET_BUNDLES[name] if settings.DEBUG else [name]
+    tag = TAGS[name[name.rindex('.'):]]
+    return format_html_join('\n', tag, ((static(path),) for path in files))
@@ -1,3 +1,1209 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import runpy
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import OperationalError, connection, transaction
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .authentication import get_cached_user, user_cache_key
+from .forms import TrendForm, UserProfileForm, UserRegistrationForm
+from . import adaptive, archive, bundles, proctoring, rollups, throttling
+from .duplicates import find_duplicates
+from .grading import _split_range, regrade_quiz
+from .jobs import JOB_MAX_ATTEMPTS, claim_next_job, enqueue, keep_alive, run_job
+from .models import DailyQuizStats, Job, Question, Quiz, RegradeChange, UserQuizAttempt
+from .routers import PRIMARY_PIN_SESSION_KEY, REPLICA_ALIAS, PrimaryReplicaRouter, pin_to_primary, use_replica
+from .search import search
+from .submissions import new_submission_token
+
+
+def make_quiz(creator, quiz_type='fixed', questions=3, **fields):
+    quiz = Quiz.objects.create(
+        name=f'{quiz_type.title()} quiz', description='', time_limit=0, num_questions=questions,
+        total_questions=questions, quiz_type=quiz_type, created_by=creator, **fields,
+    )
+    for number in range(questions):
+        Question.objects.create(
+            quiz=quiz, text=f'Question {number}', option_a='a', option_b='b', option_c='c', option_d='d',
+            correct_option='A', difficulty=number - 1,
+        )
+    return quiz
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        patcher = mock.patch('quiz_site.quiz_app.routers.replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read_alias(self, request):
+        return use_replica(lambda request: self.router.db_for_read(Quiz))(request)
+
+    def test_reads_use_the_replica_only_inside_marked_views(self):
+        self.assertIsNone(self.router.db_for_read(Quiz))
+        self.assertEqual(self.read_alias(mock.Mock(session={})), REPLICA_ALIAS)
+        self.assertIsNone(self.router.db_for_read(Quiz))
+        self.assertEqual(self.router.db_for_write(Quiz), 'default')
+
+    def test_pin_keeps_reads_on_the_primary_until_it_expires(self):
+        request = mock.Mock(session={})
+        with mock.patch('quiz_site.quiz_app.routers.time.time', return_value=1000):
+            pin_to_primary(request)
+            self.assertIsNone(self.read_alias(request))
+        with mock.patch('quiz_site.quiz_app.routers.time.time', return_value=1000 + settings.REPLICA_PIN_SECONDS + 1):
+            self.assertEqual(self.read_alias(request), REPLICA_ALIAS)
+
+    def test_staff_writes_pin_the_session(self):
+        admin = User.objects.create_user('admin', is_staff=True)
+        self.client.force_login(admin)
+        user = User.objects.create_user('student')
+        self.client.post(reverse('admin_delete_user', args=[user.pk]))
+        self.assertIn(PRIMARY_PIN_SESSION_KEY, self.client.session)
+
+
+class SqliteProfileTests(SimpleTestCase):
+    # Queries go to scratch databases through a ConnectionHandler of their own
+    databases = {'default'}
+
+    def load_settings(self, profile):
+        environ = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+        environ['SQLITE_PROFILE'] = profile
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return runpy.run_path(importlib.import_module(settings.SETTINGS_MODULE).__file__)
+
+    def connections(self, profile):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = dict(self.load_settings(profile)['DATABASES']['default'], NAME=Path(directory.name) / 'db.sqlite3')
+        impatient = dict(database, OPTIONS={**database.get('OPTIONS', {}), 'timeout': 0.1})
+        handler = ConnectionHandler({'default': database, 'other': impatient})
+        self.addCleanup(handler.close_all)
+        return handler
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_default_profile_keeps_django_settings(self):
+        database = self.load_settings('default')['DATABASES']['default']
+        self.assertNotIn('OPTIONS', database)
+        handler = self.connections('default')
+        self.assertEqual(self.pragma(handler['default'], 'journal_mode'), 'delete')
+        self.assertIsNone(handler['default'].transaction_mode)
+
+    def test_tuned_profile_applies_the_pragmas(self):
+        connection = self.connections('tuned')['default']
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(connection, 'cache_size'), -20000)
+        self.assertEqual(self.pragma(connection, 'temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma(connection, 'journal_size_limit'), 67108864)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 20000)
+
+    def test_tuned_profile_takes_the_write_lock_when_a_transaction_starts(self):
+        handler = self.connections('tuned')
+        with mock.patch('django.db.transaction.connections', handler):
+            with transaction.atomic():
+                # Nothing was written yet, but another writer already has to wait
+                with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                    with transaction.atomic(using='other'):
+                        pass
+        self.assertEqual(handler['default'].transaction_mode, 'IMMEDIATE')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(QUIZ_ARCHIVE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        teacher = User.objects.create_user('teacher')
+        quiz = make_quiz(teacher)
+        self.attempts = [
+            UserQuizAttempt.objects.create(
+                user=teacher, quiz=quiz, score=number, user_answers={'1': 'A'}, correct_answers={'1': 'A'},
+                questions_data={'1': {'text': f'Question {number}', 'user_answer': 'A'}},
+                date_attempted=timezone.now() - timedelta(days=400),
+            )
+            for number in range(3)
+        ]
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def segment_sizes(self):
+        return {path.name: path.stat().st_size for path in self.directory.rglob('*.jsonl.gz')}
+
+    def test_archived_detail_reads_back(self):
+        self.assertEqual(archive.archive_attempts(self.cutoff, batch_size=2), 3)
+        attempt = UserQuizAttempt.objects.get(pk=self.attempts[1].pk)
+        self.assertTrue(attempt.is_archived)
+        self.assertEqual(UserQuizAttempt.objects.filter(pk=attempt.pk).values_list('questions_data', flat=True)[0], {})
+        self.assertEqual(attempt.get_questions_data(), {'1': {'text': 'Question 1', 'user_answer': 'A'}})
+        self.assertFalse(attempt.details_unavailable)
+
+    def test_missing_or_damaged_segment_marks_details_unavailable(self):
+        archive.archive_attempts(self.cutoff)
+        first, second = UserQuizAttempt.objects.filter(pk__in=[self.attempts[0].pk, self.attempts[1].pk]).order_by('pk')
+        path = self.directory / first.archive_segment
+        with self.assertLogs('quiz_site.quiz_app.archive', 'WARNING'):
+            path.write_bytes(b'not gzip' * 100)
+            self.assertTrue(first.details_unavailable)
+            path.unlink()
+            self.assertTrue(second.details_unavailable)
+            self.assertEqual(second.get_questions_data(), {})
+
+    def test_rerun_skips_archived_attempts(self):
+        archive.archive_attempts(self.cutoff)
+        sizes = self.segment_sizes()
+        self.assertEqual(archive.archive_attempts(self.cutoff), 0)
+        self.assertEqual(self.segment_sizes(), sizes)
+
+    def test_rerun_after_a_crash_replaces_orphaned_members(self):
+        with mock.patch.object(UserQuizAttempt.objects, 'bulk_update', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                archive.archive_attempts(self.cutoff)
+        orphaned = self.segment_sizes()
+
+        self.assertEqual(archive.archive_attempts(self.cutoff), 3)
+        self.assertEqual(self.segment_sizes(), orphaned)
+        for attempt in UserQuizAttempt.objects.all():
+            self.assertEqual(attempt.get_questions_data()['1']['text'], f'Question {int(attempt.score)}')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user('admin', is_staff=True)
+        self.client.force_login(admin)
+        quiz = make_quiz(admin)
+        self.attempt = UserQuizAttempt.objects.create(
+            user=admin, quiz=quiz, score=50, user_answers={'1': 'A', '2': 'B'}, correct_answers={'1': 'A', '2': 'C'},
+        )
+
+    def export(self, **params):
+        response = self.client.get(reverse('admin_export_results'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, body = self.export(format='csv', answers='1')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['correct_count'], '1')
+        self.assertEqual(rows[0]['total_questions'], '2')
+        self.assertEqual(json.loads(rows[0]['answers']), {'1': ['A', 'A'], '2': ['B', 'C']})
+
+    def test_jsonl(self):
+        response, body = self.export(format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([record['attempt_id'] for record in records], [self.attempt.pk])
+        self.assertNotIn('answers', records[0])
+
+    def test_formats_agree_on_dates(self):
+        _, csv_body = self.export(format='csv')
+        _, jsonl_body = self.export(format='jsonl')
+        csv_date = next(csv.DictReader(io.StringIO(csv_body.decode())))['date_attempted']
+        self.assertEqual(json.loads(jsonl_body)['date_attempted'], csv_date)
+        self.assertEqual(csv_date, self.attempt.date_attempted.isoformat())
+
+    def test_gzip_stream_decodes(self):
+        response, body = self.export(format='jsonl', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.jsonl.gz"'))
+        _, plain = self.export(format='jsonl')
+        self.assertEqual(gzip.decompress(body), plain)
+
+
+class RegradeTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.quiz = make_quiz(self.teacher, questions=2)
+        self.questions = list(self.quiz.questions.order_by('pk'))
+        key = {str(question.pk): 'A' for question in self.questions}
+        first, second = (str(question.pk) for question in self.questions)
+        self.affected = UserQuizAttempt.objects.create(
+            user=self.teacher, quiz=self.quiz, score=50, user_answers={first: 'A', second: 'B'}, correct_answers=key,
+        )
+        self.unaffected = UserQuizAttempt.objects.create(
+            user=self.teacher, quiz=self.quiz, score=100, user_answers={first: 'A'}, correct_answers={first: 'A'},
+        )
+
+    def test_changed_key_rescores_only_affected_attempts(self):
+        Question.objects.filter(pk=self.questions[1].pk).update(correct_option='B')
+        run = regrade_quiz(self.quiz)
+
+        self.assertEqual(UserQuizAttempt.objects.get(pk=self.affected.pk).score, 100)
+        self.assertEqual(UserQuizAttempt.objects.get(pk=self.unaffected.pk).score, 100)
+        self.assertEqual((run.status, run.attempts_scanned, run.attempts_changed), ('done', 2, 1))
+        self.assertEqual(run.answer_key[str(self.questions[1].pk)], 'B')
+        change = RegradeChange.objects.get(run=run)
+        self.assertEqual((change.attempt_id, change.old_score, change.new_score), (self.affected.pk, 50, 100))
+        self.assertEqual(change.changed_questions, [str(self.questions[1].pk)])
+
+    def test_unchanged_key_is_a_no_op(self):
+        with mock.patch.object(UserQuizAttempt.objects, 'bulk_update') as bulk_update:
+            run = regrade_quiz(self.quiz)
+        bulk_update.assert_not_called()
+        self.assertEqual((run.attempts_scanned, run.attempts_changed), (2, 0))
+        self.assertFalse(RegradeChange.objects.exists())
+
+    def test_regrading_refreshes_rollups(self):
+        Question.objects.filter(pk=self.questions[1].pk).update(correct_option='B')
+        regrade_quiz(self.quiz)
+        self.assertEqual(DailyQuizStats.objects.get(quiz=self.quiz).score_sum, 200)
+
+    def test_split_range_covers_every_pk_once(self):
+        for start, end, parts in [(1, 1, 4), (1, 10, 4), (5, 12, 3), (1, 100, 7), (3, 5, 8)]:
+            ranges = _split_range(start, end, parts)
+            self.assertLessEqual(len(ranges), parts)
+            self.assertEqual(ranges[0][0], start)
+            self.assertEqual(ranges[-1][1], end)
+            for (_, hi), (lo, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(lo, hi + 1)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student', password='old-Password-1')
+        self.client.force_login(self.user)
+
+    def resolve(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        return get_cached_user(request)
+
+    def test_cached_user_is_served_without_queries(self):
+        self.assertEqual(self.resolve(), self.user)
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.session.keys()  # the session row is read before the user is resolved
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_user(request), self.user)
+
+    def test_password_change_logs_the_session_out(self):
+        self.resolve()
+        self.user.set_password('new-Password-1')
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertFalse(self.resolve().is_authenticated)
+
+    def test_session_hash_mismatch_is_rejected(self):
+        self.resolve()
+        session = self.client.session
+        session[HASH_SESSION_KEY] = 'not the hash'
+        session.save()
+        self.assertFalse(self.resolve().is_authenticated)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_inactive_users_are_rejected(self):
+        self.resolve()
+        # A stale cached copy that was deactivated elsewhere
+        cached = cache.get(user_cache_key(self.user.pk))
+        cached.is_active = False
+        cache.set(user_cache_key(self.user.pk), cached)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self.resolve().is_authenticated)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.resolve()
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.resolve().is_authenticated)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+
+    def quiz(self, name, questions=(), is_active=True):
+        quiz = Quiz.objects.create(
+            name=name, description='', time_limit=0, num_questions=len(questions), total_questions=len(questions),
+            created_by=self.teacher, is_active=is_active,
+        )
+        for text in questions:
+            Question.objects.create(
+                quiz=quiz, text=text, option_a='yes', option_b='no', option_c='maybe', option_d='never',
+                correct_option='A',
+            )
+        return quiz
+
+    def test_runs_on_the_full_text_engine(self):
+        self.assertIn(search('anything').backend, ('sqlite', 'postgresql'))
+
+    def test_title_matches_rank_first(self):
+        body_match = self.quiz('Plants', ['Which gas do leaves take in? Think of photosynthesis in plant cells today'])
+        title_match = self.quiz('Photosynthesis')
+        results = search('photosynthesis', kinds=['quiz', 'question'])
+        self.assertEqual(results.count(), 2)
+        self.assertEqual([document.quiz_id for document in results[0:2]], [title_match.pk, body_match.pk])
+
+    def test_words_match_as_prefixes(self):
+        quiz = self.quiz('Networking', ['What does a router forward?'])
+        self.assertEqual([document.question.quiz_id for document in search('rout', kinds=['question'])[0:5]], [quiz.pk])
+
+    def test_group_by_quiz_returns_each_quiz_once(self):
+        quiz = self.quiz('Cells', ['What is a mitochondrion?', 'Where are mitochondrion genes kept?'])
+        results = search('mitochondrion', group_by_quiz=True)
+        self.assertEqual(results.count(), 1)
+        self.assertEqual(results[0:5], [quiz])
+
+    def test_active_only_skips_inactive_quizzes(self):
+        active = self.quiz('Volcano facts')
+        self.quiz('Volcano drafts', is_active=False)
+        self.assertEqual(search('volcano', active_only=True, group_by_quiz=True)[0:5], [active])
+        self.assertEqual(search('volcano', group_by_quiz=True).count(), 2)
+
+    def test_edits_are_indexed(self):
+        quiz = self.quiz('Algebra', ['Solve for x'])
+        quiz.name = 'Geometry'
+        quiz.save()
+        question = quiz.questions.get()
+        question.text = 'Measure the hypotenuse'
+        question.save()
+        self.assertEqual(search('algebra').count(), 0)
+        self.assertEqual(search('geometry', kinds=['quiz'])[0].quiz_id, quiz.pk)
+        self.assertEqual(search('solve').count(), 0)
+        self.assertEqual(search('hypotenuse', kinds=['question'])[0].question_id, question.pk)
+
+    def test_pages_cover_every_result_once(self):
+        for number in range(5):
+            self.quiz(f'Chemistry {number}')
+        paginator = Paginator(search('chemistry', kinds=['quiz']), 2)
+        self.assertEqual(paginator.num_pages, 3)
+        seen = [document.pk for page in paginator.page_range for document in paginator.page(page)]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_punctuation_only_queries_match_nothing(self):
+        self.quiz('Anything')
+        for query in ['***', '"', '-', '  ']:
+            results = search(query)
+            self.assertEqual(results[0:5], [])
+            self.assertEqual(results.count(), 0)
+            self.assertFalse(results.documents().exists())
+
+
+class DuplicateTests(TestCase):
+    STEM = 'Which organelle of a eukaryotic cell produces most of the energy the cell uses through respiration'
+
+    def setUp(self):
+        self.quiz = make_quiz(User.objects.create_user('teacher'), questions=0)
+
+    def question(self, text, options=('Nucleus', 'Mitochondrion', 'Ribosome', 'Golgi body')):
+        return Question.objects.create(
+            quiz=self.quiz, text=text, option_a=options[0], option_b=options[1], option_c=options[2],
+            option_d=options[3], correct_option='B',
+        )
+
+    def grouped_ids(self, **kwargs):
+        return [sorted(question_id for question_id, _ in group) for group in find_duplicates(**kwargs)]
+
+    def test_near_identical_wording_is_grouped(self):
+        original = self.question(self.STEM + '?')
+        # Punctuation, case and option order are normalized away; one word differs
+        reworded = self.question(self.STEM.upper().replace('MOST', 'ALMOST ALL'),
+                                 options=('Golgi body', 'ribosome', 'Mitochondrion', 'nucleus'))
+        self.assertEqual(self.grouped_ids(), [[original.pk, reworded.pk]])
+        self.assertGreaterEqual(find_duplicates()[0][1][1], 0.8)
+
+    def test_unrelated_questions_are_not_grouped(self):
+        self.question(self.STEM)
+        self.question('What is the capital city of Australia and when did it become the capital',
+                      options=('Sydney', 'Canberra', 'Melbourne', 'Perth'))
+        self.question('Solve for x when two x plus three equals eleven', options=('2', '3', '4', '5'))
+        self.assertEqual(find_duplicates(), [])
+
+    def test_editing_a_question_moves_it_out_of_its_group(self):
+        first = self.question(self.STEM)
+        second = self.question(self.STEM)
+        third = self.question(self.STEM)
+        self.assertEqual(self.grouped_ids(), [[first.pk, second.pk, third.pk]])
+
+        second.text = 'Name the largest planet in the solar system by mass and by volume'
+        second.option_a, second.option_b, second.option_c, second.option_d = 'Mars', 'Jupiter', 'Saturn', 'Venus'
+        second.save()
+        self.assertEqual(self.grouped_ids(), [[first.pk, third.pk]])
+
+    def test_quiz_filter_ignores_other_quizzes(self):
+        own = self.question(self.STEM)
+        other_quiz = make_quiz(self.quiz.created_by, questions=0)
+        other = Question.objects.create(quiz=other_quiz, text=self.STEM, option_a='Nucleus', option_b='Mitochondrion',
+                                option_c='Ribosome', option_d='Golgi body', correct_option='B')
+        self.assertEqual(find_duplicates(quiz_id=self.quiz.pk), [])
+        self.assertEqual(self.grouped_ids(), [[own.pk, other.pk]])
+
+    def test_oversized_buckets_only_group_identical_questions(self):
+        identical = [self.question(self.STEM) for _ in range(3)]
+        near = self.question(self.STEM.replace('most', 'almost all'))
+        oversized = []
+        with mock.patch('quiz_site.quiz_app.duplicates.MAX_BUCKET_SIZE', 2):
+            groups = self.grouped_ids(oversized=oversized)
+        self.assertTrue(oversized)
+        self.assertTrue(all(size > 2 for _, _, size in oversized))
+        self.assertIn(sorted(question.pk for question in identical), groups)
+        self.assertNotIn(near.pk, [question_id for group in groups for question_id in group])
+
+
+class IdentityClashMigrationTests(TestCase):
+    def setUp(self):
+        # Clashing rows can only exist from before the indexes; the DDL is
+        # rolled back with the test transaction
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX quiz_app_user_username_ci')
+            cursor.execute('DROP INDEX quiz_app_user_email_ci')
+
+    def check(self):
+        migration = importlib.import_module('quiz_site.quiz_app.migrations.0005_user_identity_indexes')
+        # Only the connection of the schema editor is used
+        migration.check_identity_clashes(apps, mock.Mock(connection=connection))
+
+    def resolve(self, *args):
+        output = io.StringIO()
+        call_command('resolve_identity_clashes', *args, stdout=output)
+        return output.getvalue()
+
+    def test_migration_lists_clashing_accounts_without_changing_them(self):
+        first = User.objects.create(username='Ann', email='ann@example.com')
+        second = User.objects.create(username='ann', email='ANN@example.com')
+        with self.assertRaisesMessage(RuntimeError, f"username: user {first.pk} ('Ann'), user {second.pk} ('ann')"):
+            self.check()
+        self.assertEqual(User.objects.get(pk=second.pk).username, 'ann')
+
+    def test_command_lists_clashes_until_applied(self):
+        User.objects.create(username='Ann')
+        second = User.objects.create(username='ann')
+        self.assertIn('Nothing changed', self.resolve())
+        self.assertEqual(User.objects.get(pk=second.pk).username, 'ann')
+
+    def test_later_accounts_are_renamed_and_lose_shared_emails(self):
+        first = User.objects.create(username='Ann', email='Ann@example.com')
+        second = User.objects.create(username='ann', email='ann@EXAMPLE.com')
+        taken = User.objects.create(username='ANN_2', email='')
+        output = self.resolve('--apply')
+        self.assertIn(f"user {second.pk}: username 'ann'", output)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.username, first.email), ('Ann', 'Ann@example.com'))
+        self.assertEqual(second.email, '')
+        self.assertNotEqual(second.username.lower(), 'ann')
+        usernames = [username.lower() for username in User.objects.values_list('username', flat=True)]
+        self.assertEqual(len(usernames), len(set(usernames)))
+        self.assertEqual(User.objects.get(pk=taken.pk).username, 'ANN_2')
+
+    def test_indexes_build_after_resolving(self):
+        User.objects.create(username='Bob', email='bob@example.com')
+        User.objects.create(username='BOB', email='BOB@example.com')
+        self.resolve('--apply')
+        self.check()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE UNIQUE INDEX quiz_app_user_username_ci ON auth_user (LOWER(username))')
+            cursor.execute("CREATE UNIQUE INDEX quiz_app_user_email_ci ON auth_user (LOWER(email)) WHERE email <> ''")
+
+
+class IdentityFormTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('Carol', email='carol@example.com')
+
+    def registration(self, **data):
+        return UserRegistrationForm(data={
+            'username': 'dave', 'email': 'dave@example.com', 'first_name': '', 'last_name': '',
+            'password': 'x-Password-1', 'password_confirm': 'x-Password-1', **data,
+        })
+
+    def test_registration_rejects_usernames_and_emails_differing_in_case(self):
+        form = self.registration(username='CAROL', email='Carol@Example.com')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['username'], ['This username is already taken.'])
+        self.assertEqual(form.errors['email'], ['This email is already registered.'])
+
+    def test_profile_may_change_the_case_of_its_own_username(self):
+        form = UserProfileForm(data={'username': 'CAROL', 'email': 'carol@example.com'}, instance=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_exact_username_clash_is_reported_once(self):
+        form = self.registration(username='Carol')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['username'], ['This username is already taken.'])
+
+    def test_registration_checks_uniqueness_in_one_query(self):
+        form = self.registration()
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid(), form.errors)
+
+
+class JobClaimTests(TransactionTestCase):
+    def test_job_taken_between_pick_and_claim_is_skipped(self):
+        first, second = enqueue('cleanup_sessions'), enqueue('cleanup_sessions')
+        now = timezone.now
+        calls = []
+
+        def other_worker_claims_first(*args, **kwargs):
+            # The second call comes after the oldest job was picked and
+            # before it is claimed
+            calls.append(None)
+            if len(calls) == 2:
+                Job.objects.filter(pk=first.pk).update(status='running')
+            return now(*args, **kwargs)
+
+        with mock.patch('django.utils.timezone.now', side_effect=other_worker_claims_first):
+            claimed = claim_next_job()
+        self.assertEqual(claimed.pk, second.pk)
+        self.assertEqual(Job.objects.get(pk=first.pk).attempts, 0)
+
+    @skipIf(connection.vendor == 'sqlite', 'SQLite test databases lock whole tables under concurrent writers')
+    def test_concurrent_workers_never_claim_the_same_job(self):
+        jobs = [enqueue('cleanup_sessions') for _ in range(6)]
+        claimed = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    job = claim_next_job()
+                    if job is None:
+                        return
+                    with lock:
+                        claimed.append(job.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed), sorted(job.pk for job in jobs))
+        self.assertEqual(Job.objects.filter(status='running', attempts=1).count(), len(jobs))
+
+
+@override_settings(JOB_LEASE_SECONDS=60)
+class StaleJobTests(TestCase):
+    def test_job_without_heartbeat_is_claimed_again(self):
+        job = enqueue('cleanup_sessions')
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertIsNone(claim_next_job())
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=61))
+        reclaimed = claim_next_job()
+        self.assertEqual(reclaimed.pk, job.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+
+    def test_recent_heartbeat_keeps_the_lease(self):
+        job = enqueue('cleanup_sessions')
+        claimed = claim_next_job()
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=61))
+        claimed.update_progress(progress=1)
+        self.assertIsNone(claim_next_job())
+
+    def test_job_that_keeps_losing_its_worker_fails(self):
+        job = enqueue('cleanup_sessions')
+        Job.objects.filter(pk=job.pk).update(
+            status='running', attempts=JOB_MAX_ATTEMPTS, heartbeat_at=timezone.now() - timedelta(seconds=61),
+        )
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'failed')
+
+    def test_keep_alive_refreshes_the_heartbeat_every_tenth_of_a_lease(self):
+        enqueue('cleanup_sessions')
+        job = claim_next_job()
+        beat = keep_alive(job)
+        with self.assertNumQueries(0):
+            beat()
+        job.heartbeat_at -= timedelta(seconds=7)
+        with self.assertNumQueries(1):
+            beat()
+        self.assertGreater(Job.objects.get(pk=job.pk).heartbeat_at, timezone.now() - timedelta(seconds=1))
+
+    def test_long_handlers_send_heartbeats(self):
+        quiz = make_quiz(User.objects.create_user('teacher'), 'adaptive')
+        UserQuizAttempt.objects.create(user=quiz.created_by, quiz=quiz, score=0, user_answers={}, correct_answers={})
+        heartbeat = mock.Mock()
+        adaptive.calibrate_quiz(quiz.pk, heartbeat=heartbeat)
+        self.assertTrue(heartbeat.called)
+        heartbeat.reset_mock()
+        find_duplicates(heartbeat=heartbeat)
+        self.assertTrue(heartbeat.called)
+
+
+class RosterJobTests(TestCase):
+    def test_uploaded_csv_is_dropped_when_the_import_fails(self):
+        job = enqueue('import_roster', {'csv': 'username,password\nann,secret\n', 'filename': 'class.csv'})
+        with mock.patch('quiz_site.quiz_app.roster.import_roster', side_effect=RuntimeError('boom')):
+            self.assertFalse(run_job(claim_next_job()))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.payload, {'filename': 'class.csv'})
+
+    def test_uploaded_csv_is_dropped_after_the_import(self):
+        job = enqueue('import_roster', {'csv': 'username,password\nann,secret\n', 'filename': 'class.csv'})
+        self.assertTrue(run_job(claim_next_job()))
+        job.refresh_from_db()
+        self.assertNotIn('csv', job.payload)
+        self.assertTrue(User.objects.get(username='ann').check_password('secret'))
+
+
+class DeleteUserTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def test_small_deletion_runs_inline(self):
+        user = User.objects.create_user('student')
+        self.client.post(reverse('admin_delete_user', args=[user.pk]))
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_large_deletion_is_queued_once(self):
+        user = User.objects.create_user('student')
+        quiz = Quiz.objects.create(name='Quiz', description='', total_questions=1, num_questions=1,
+                                   time_limit=0, created_by=self.admin)
+        UserQuizAttempt.objects.bulk_create([
+            UserQuizAttempt(user=user, quiz=quiz, score=50, user_answers={}, correct_answers={}, questions_data={})
+            for _ in range(600)
+        ])
+        self.client.post(reverse('admin_delete_user', args=[user.pk]))
+        self.client.post(reverse('admin_delete_user', args=[user.pk]))
+        self.assertFalse(User.objects.get(pk=user.pk).is_active)
+        self.assertEqual(Job.objects.filter(kind='delete_user', status='queued').count(), 1)
+
+
+class AdaptiveQuizTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('student')
+        self.quiz = make_quiz(User.objects.create_user('teacher'), 'adaptive')
+        self.client.force_login(self.student)
+        self.url = reverse('take_quiz', args=[self.quiz.pk])
+
+    def state(self):
+        return self.client.session[adaptive.session_key(self.quiz.pk)]
+
+    def test_deleted_current_question_is_replaced(self):
+        self.client.get(self.url)
+        current = self.state()['current']
+        Question.objects.filter(pk=current).delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.context['question']['id'], current)
+        self.assertNotIn(current, self.state()['served'])
+
+    def test_expired_attempt_is_finished_on_get(self):
+        self.quiz.time_limit = 1
+        self.quiz.save()
+        self.client.get(self.url)
+        session = self.client.session
+        state = session[adaptive.session_key(self.quiz.pk)]
+        state['started_at'] = (timezone.now() - timedelta(minutes=2)).isoformat()
+        session[adaptive.session_key(self.quiz.pk)] = state
+        session.save()
+
+        response = self.client.get(self.url)
+        attempt = UserQuizAttempt.objects.get(user=self.student, quiz=self.quiz)
+        self.assertRedirects(response, reverse('quiz_result', args=[attempt.pk]))
+        self.assertEqual(attempt.score, 0)
+
+    def test_item_bank_follows_the_quiz_row_not_the_cache(self):
+        bank = adaptive.get_item_bank(Quiz.objects.get(pk=self.quiz.pk))
+        question = Question.objects.filter(quiz=self.quiz).first()
+        question.text = 'Edited'
+        question.save()
+        # Another process's cache never saw the edit
+        cache.clear()
+        reloaded = adaptive.get_item_bank(Quiz.objects.get(pk=self.quiz.pk))
+        self.assertIsNot(reloaded, bank)
+        self.assertEqual(reloaded.items[question.pk]['text'], 'Edited')
+
+    def test_calibration_reloads_the_item_bank(self):
+        bank = adaptive.get_item_bank(Quiz.objects.get(pk=self.quiz.pk))
+        adaptive.calibrate_quiz(self.quiz.pk)
+        reloaded = adaptive.get_item_bank(Quiz.objects.get(pk=self.quiz.pk))
+        self.assertNotEqual(reloaded.version, bank.version)
+        self.assertEqual(set(reloaded.difficulties), {0.0})
+
+    def test_saving_a_stale_quiz_keeps_the_content_version(self):
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        Quiz.bump_content_version(quiz.pk)
+        quiz.name = 'Renamed'
+        quiz.save()
+        # The explicit bump and the one for the edit
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).content_version, quiz.content_version + 2)
+
+
+    def answer_all(self, option='A'):
+        self.client.get(self.url)
+        for _ in range(3):
+            current = self.state()['current']
+            response = self.client.post(self.url, {'question_id': current, 'answer': option})
+        return UserQuizAttempt.objects.get(user=self.student, quiz=self.quiz), response
+
+    def test_score_comes_from_the_final_ability(self):
+        attempt, response = self.answer_all()
+        self.assertRedirects(response, reverse('quiz_result', args=[attempt.pk]))
+        self.assertGreater(attempt.ability, 0)
+        self.assertEqual(attempt.score, adaptive.ability_score(attempt.ability, [-1, 0, 1]))
+        self.assertGreater(attempt.score, 50)
+        self.assertLess(attempt.score, 100)
+
+    def test_regrading_replays_the_ability(self):
+        attempt, _ = self.answer_all()
+        Question.objects.filter(quiz=self.quiz).update(correct_option='B')
+        regrade_quiz(self.quiz)
+        regraded = UserQuizAttempt.objects.get(pk=attempt.pk)
+        self.assertLess(regraded.ability, 0)
+        self.assertLess(regraded.score, 50)
+
+    def test_next_item_walks_outwards_from_the_ability(self):
+        bank = adaptive.ItemBank(0, [{'id': pk, 'difficulty': pk - 3} for pk in range(1, 6)])
+        with mock.patch.object(adaptive, 'EXPOSURE_CANDIDATES', 1):
+            self.assertEqual(bank.next_item(0.9), 4)
+            self.assertEqual(bank.next_item(0.9, {4}), 3)
+            self.assertEqual(bank.next_item(0.9, {3, 4}), 5)
+            self.assertEqual(bank.next_item(-10), 1)
+            self.assertEqual(bank.next_item(10, {5}), 4)
+            self.assertIsNone(bank.next_item(0, {1, 2, 3, 4, 5}))
+        with mock.patch('random.choice', side_effect=lambda candidates: candidates):
+            self.assertEqual(bank.next_item(0.9), [4, 3, 5])
+
+    def test_responses_move_the_ability(self):
+        prior = adaptive.prior_log_weights()
+        self.assertAlmostEqual(adaptive.expected_ability(prior), 0)
+        right = adaptive.expected_ability(adaptive.add_response(prior, 0, True))
+        wrong = adaptive.expected_ability(adaptive.add_response(prior, 0, False))
+        self.assertGreater(right, 0)
+        self.assertAlmostEqual(wrong, -right)
+        # A hard question answered right says more than an easy one
+        self.assertGreater(adaptive.expected_ability(adaptive.add_response(prior, 2, True)),
+                           adaptive.expected_ability(adaptive.add_response(prior, -2, True)))
+        twice = adaptive.expected_ability(adaptive.add_response(adaptive.add_response(prior, 0, True), 0, True))
+        self.assertGreater(twice, right)
+
+    def test_calibration_is_conditional_on_ability(self):
+        easy, _, hard = Question.objects.filter(quiz=self.quiz).order_by('difficulty')
+        # Adaptive selection: strong students only see the hard question,
+        # weak students the easy one, and each gets half of them right
+        for number in range(40):
+            question, ability = (hard, 2.0) if number % 2 else (easy, -2.0)
+            UserQuizAttempt.objects.create(
+                user=self.student, quiz=self.quiz, score=50, ability=ability,
+                user_answers={str(question.pk): 'A' if number % 4 < 2 else 'B'},
+                correct_answers={str(question.pk): 'A'},
+            )
+        adaptive.calibrate_quiz(self.quiz.pk)
+        difficulties = dict(Question.objects.filter(quiz=self.quiz).values_list('pk', 'difficulty'))
+        self.assertGreater(difficulties[hard.pk], 1.5)
+        self.assertLess(difficulties[easy.pk], -1.5)
+
+        # Recalibrating does not drift towards 0
+        adaptive.calibrate_quiz(self.quiz.pk)
+        self.assertEqual(dict(Question.objects.filter(quiz=self.quiz).values_list('pk', 'difficulty')), difficulties)
+
+    def test_calibration_estimates_abilities_of_fixed_attempts(self):
+        questions = list(Question.objects.filter(quiz=self.quiz).order_by('pk'))
+        key = {str(question.pk): 'A' for question in questions}
+        for number in range(30):
+            # Everyone answers every question; earlier ones are missed more often
+            answers = {str(question.pk): 'A' if number % (index + 2) else 'B' for index, question in enumerate(questions)}
+            UserQuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=0, user_answers=answers,
+                                           correct_answers=key)
+        adaptive.calibrate_quiz(self.quiz.pk)
+        difficulties = list(Question.objects.filter(quiz=self.quiz).order_by('pk').values_list('difficulty', flat=True))
+        self.assertEqual(difficulties, sorted(difficulties, reverse=True))
+        self.assertEqual(Question.objects.filter(quiz=self.quiz, difficulty_responses=30).count(), 3)
+
+class IdempotentSubmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('student')
+        self.teacher = User.objects.create_user('teacher')
+        self.client.force_login(self.student)
+
+    def test_repeated_classic_post_returns_the_same_attempt(self):
+        quiz = make_quiz(self.teacher, max_attempts=1)
+        url = reverse('take_quiz', args=[quiz.pk])
+        context = self.client.get(url, {'classic': '1'}).context
+        data = {'submission_token': context['submission_token'], 'question_ids': context['question_ids']}
+        data.update({f'question_{question.pk}': 'A' for question in context['questions']})
+
+        first = self.client.post(url, data)
+        # Another worker, or the cache entry expired
+        cache.clear()
+        second = self.client.post(url, data)
+
+        attempt = UserQuizAttempt.objects.get(user=self.student, quiz=quiz)
+        self.assertRedirects(first, reverse('quiz_result', args=[attempt.pk]))
+        self.assertRedirects(second, reverse('quiz_result', args=[attempt.pk]))
+
+    def test_repeated_json_submit_returns_the_same_attempt(self):
+        quiz = make_quiz(self.teacher)
+        context = self.client.get(reverse('take_quiz', args=[quiz.pk])).context
+        paper = json.loads(self.client.get(context['paper_url']).content)
+        body = json.dumps({
+            'token': context['submission_token'], 'paper': paper['paper'], 'answers': 'A' * len(paper['questions']),
+        })
+        url = reverse('submit_quiz', args=[quiz.pk])
+
+        first = self.client.post(url, body, content_type='application/json').json()
+        cache.clear()
+        second = self.client.post(url, body, content_type='application/json').json()
+        self.assertEqual(first, second)
+        self.assertEqual(UserQuizAttempt.objects.filter(user=self.student, quiz=quiz).count(), 1)
+
+    def test_repeated_final_adaptive_post_returns_the_same_attempt(self):
+        quiz = make_quiz(self.teacher, 'adaptive')
+        url = reverse('take_quiz', args=[quiz.pk])
+        self.client.get(url)
+        while True:
+            state = self.client.session[adaptive.session_key(quiz.pk)]
+            data = {'question_id': state['current'], 'answer': 'A', 'submission_token': state['token']}
+            response = self.client.post(url, data)
+            if adaptive.session_key(quiz.pk) not in self.client.session:
+                break
+
+        cache.clear()
+        repeat = self.client.post(url, data)
+        attempt = UserQuizAttempt.objects.get(user=self.student, quiz=quiz)
+        self.assertRedirects(response, reverse('quiz_result', args=[attempt.pk]))
+        self.assertRedirects(repeat, reverse('quiz_result', args=[attempt.pk]))
+        self.assertNotIn(adaptive.session_key(quiz.pk), self.client.session)
+
+
+class ProctorEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user('proctor', is_staff=True)
+        self.quiz = make_quiz(self.staff)
+        self.client.force_login(self.staff)
+        proctoring.publish(self.quiz.pk, 'started', User.objects.create_user('student'))
+
+    def events_url(self):
+        return self.client.get(reverse('admin_proctor', args=[self.quiz.pk])).context['events_url']
+
+    def test_polling_does_not_touch_the_database(self):
+        url = self.events_url()
+        # The first poll caches the proctor's user
+        self.client.get(url, HTTP_LAST_EVENT_ID='0')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_LAST_EVENT_ID='0')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'event: started', response.content)
+
+    def test_revoked_staff_cannot_reopen_the_stream(self):
+        url = self.events_url()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.staff.is_staff = False
+        self.staff.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_deactivated_staff_cannot_reopen_the_stream(self):
+        url = self.events_url()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.staff.is_active = False
+        self.staff.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_open_stream_ends_when_staff_is_revoked(self):
+        async def read_stream():
+            chunks = []
+            async for chunk in proctoring.live_events(self.quiz.pk, self.staff.pk):
+                chunks.append(chunk)
+                if chunk.startswith(': keepalive'):
+                    await sync_to_async(User.objects.filter(pk=self.staff.pk).update)(is_staff=False)
+                    await sync_to_async(cache.clear)()
+            return chunks
+
+        with mock.patch.object(proctoring, 'KEEPALIVE_SECONDS', 0.01):
+            chunks = async_to_sync(read_stream)()
+        self.assertIn('event: started', chunks[1])
+        self.assertEqual(chunks[-1], ': keepalive\n\n')
+
+    def test_token_is_required(self):
+        response = self.client.get(reverse('admin_proctor_events', args=[self.quiz.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_token_only_opens_its_own_quiz(self):
+        token = self.events_url().split('token=')[1]
+        other = make_quiz(self.staff)
+        response = self.client.get(reverse('admin_proctor_events', args=[other.pk]), {'token': token})
+        self.assertEqual(response.status_code, 403)
+
+
+class QuizPaperTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher')
+        self.student = User.objects.create_user('student')
+        self.quiz = make_quiz(self.teacher)
+
+    def current_paper(self):
+        return bundles.fixed_paper(Quiz.objects.get(pk=self.quiz.pk))
+
+    def start(self, quiz):
+        self.client.force_login(self.student)
+        context = self.client.get(reverse('take_quiz', args=[quiz.pk])).context
+        paper = json.loads(self.client.get(context['paper_url']).content)
+        return context['submission_token'], paper
+
+    def submit(self, quiz, token, paper):
+        body = json.dumps({'token': token, 'paper': paper['paper'], 'answers': 'A' * len(paper['questions'])})
+        return self.client.post(reverse('submit_quiz', args=[quiz.pk]), body, content_type='application/json')
+
+    def test_current_version_is_served_without_login(self):
+        version = self.current_paper()['version']
+        response = self.client.get(reverse('quiz_paper', args=[self.quiz.pk, version]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_unknown_version_is_not_found(self):
+        for version in ['anything', 'draw', '0' * 16]:
+            response = self.client.get(reverse('quiz_paper', args=[self.quiz.pk, version]))
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(SECRET_KEY='another secret')
+    def test_version_depends_on_the_secret_key(self):
+        version = self.current_paper()['version']
+        cache.clear()
+        with self.settings(SECRET_KEY='yet another secret'):
+            self.assertNotEqual(self.current_paper()['version'], version)
+
+    def test_edits_change_the_version_without_the_cache(self):
+        version = self.current_paper()['version']
+        question = self.quiz.questions.first()
+        question.text = 'Edited'
+        question.save()
+        # A process whose cache still holds the old paper
+        cache.set(bundles.paper_cache_key(self.quiz.pk, self.quiz.content_version), {'version': version})
+        self.assertNotEqual(self.current_paper()['version'], version)
+        response = self.client.get(reverse('quiz_paper', args=[self.quiz.pk, version]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_older_version_is_graded_after_an_edit(self):
+        token, paper = self.start(self.quiz)
+        Question.objects.filter(quiz=self.quiz).first().save()
+        cache.clear()
+        self.assertEqual(self.submit(self.quiz, token, paper).status_code, 200)
+        attempt = UserQuizAttempt.objects.get(user=self.student, quiz=self.quiz)
+        self.assertEqual(attempt.score, 100)
+
+    def test_drawn_paper_is_graded_by_another_process(self):
+        quiz = make_quiz(self.teacher, 'random')
+        token, paper = self.start(quiz)
+        cache.clear()
+        self.assertEqual(self.submit(quiz, token, paper).status_code, 200)
+        attempt = UserQuizAttempt.objects.get(user=self.student, quiz=quiz)
+        self.assertEqual(sorted(attempt.user_answers, key=int), [str(question[0]) for question in sorted(paper['questions'])])
+
+    def test_drawn_paper_is_tied_to_its_token(self):
+        quiz = make_quiz(self.teacher, 'random')
+        _, paper = self.start(quiz)
+        response = self.submit(quiz, new_submission_token(), paper)
+        self.assertEqual(response.status_code, 409)
+
+
+    def test_encoding_follows_q_values(self):
+        encoded = {'br': b'', 'gzip': b'', 'identity': b''}
+        cases = {
+            '': 'identity',
+            'gzip, deflate, br': 'br',
+            'gzip;q=1.0, br;q=0.5': 'gzip',
+            'br;q=0, gzip': 'gzip',
+            'gzip;q=0, br;q=0': 'identity',
+            'BR;Q=0.8, identity;q=0.9': 'identity',
+            'identity, gzip': 'gzip',
+            'x-gzip': 'gzip',
+            '*': 'br',
+            '*;q=0.5, br;q=0': 'gzip',
+            # No substring matching
+            'gzipped, brotli': 'identity',
+            'br;q=x, gzip;q=2': 'identity',
+        }
+        for header, expected in cases.items():
+            request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(bundles.pick_encoding(request, encoded), expected, header)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(bundles.pick_encoding(request, {'gzip': b'', 'identity': b''}), 'gzip')
+
+class AttemptQuotaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('student')
+        self.teacher = User.objects.create_user('teacher')
+        self.client.force_login(self.student)
+        self.quiz = make_quiz(self.teacher, max_attempts=1)
+        UserQuizAttempt.objects.create(
+            user=self.student, quiz=self.quiz, score=0, user_answers={}, correct_answers={},
+        )
+        cache.clear()
+
+    def submit(self):
+        url = reverse('take_quiz', args=[self.quiz.pk])
+        return self.client.post(url, {'submission_token': new_submission_token(), 'question_ids': ''})
+
+    def test_cold_cache_refuses_a_start(self):
+        response = self.client.get(reverse('take_quiz', args=[self.quiz.pk]))
+        self.assertRedirects(response, reverse('quiz_list'))
+
+    def test_stale_cache_does_not_allow_a_submission(self):
+        # Another worker counted the attempt; this one still has the old counter
+        cache.set(throttling.usage_key(self.student.pk, self.quiz.pk), (0, None))
+        self.assertRedirects(self.submit(), reverse('quiz_list'))
+        self.assertEqual(UserQuizAttempt.objects.filter(user=self.student, quiz=self.quiz).count(), 1)
+
+    def test_stale_cache_does_not_allow_a_json_submission(self):
+        cache.set(throttling.usage_key(self.student.pk, self.quiz.pk), (0, None))
+        body = json.dumps({'token': new_submission_token(), 'paper': 'draw', 'answers': ''})
+        response = self.client.post(reverse('submit_quiz', args=[self.quiz.pk]), body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(UserQuizAttempt.objects.filter(user=self.student, quiz=self.quiz).count(), 1)
+
+
+@override_settings(RATE_LIMITS={**settings.RATE_LIMITS, 'login': '2/m', 'login_ip': '5/m'})
+class LoginRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_rate.cache_clear()
+        self.addCleanup(throttling.get_rate.cache_clear)
+
+    def login(self, username):
+        return self.client.post(reverse('login'), {'username': username, 'password': 'wrong'})
+
+    def test_users_behind_one_address_have_their_own_limit(self):
+        self.login('ann')
+        self.login('ann')
+        self.assertEqual(self.login('ann').status_code, 429)
+        self.assertEqual(self.login('bob').status_code, 200)
+
+    def test_one_address_has_an_overall_limit(self):
+        for name in ['a', 'b', 'c', 'd', 'e']:
+            self.assertEqual(self.login(name).status_code, 200)
+        self.assertEqual(self.login('f').status_code, 429)
+
+
+@override_settings(RATE_LIMITS={**settings.RATE_LIMITS, 'register': '2/h', 'register_ip': '5/h'})
+class RegisterRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_rate.cache_clear()
+        self.addCleanup(throttling.get_rate.cache_clear)
+
+    def register(self, username):
+        # Mismatched passwords: nothing is created, only the limit is exercised
+        return self.client.post(reverse('register'), {
+            'username': username, 'email': '', 'password': 'x-Password-1', 'password_confirm': 'other',
+        })
+
+    def test_students_behind_one_address_register_separately(self):
+        self.register('ann')
+        self.register('ann')
+        self.assertEqual(self.register('ann').status_code, 429)
+        self.assertEqual(self.register('bob').status_code, 200)
+
+    def test_one_address_has_an_overall_limit(self):
+        for name in ['a', 'b', 'c', 'd', 'e']:
+            self.assertEqual(self.register(name).status_code, 200)
+        self.assertEqual(self.register('f').status_code, 429)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user('student')
+        self.quizzes = [make_quiz(self.student), make_quiz(self.student)]
+        self.now = timezone.now()
+
+    def attempt(self, score, quiz=0, days_ago=0):
+        return UserQuizAttempt.objects.create(
+            user=self.student, quiz=self.quizzes[quiz], score=score, user_answers={}, correct_answers={},
+            date_attempted=self.now - timedelta(days=days_ago),
+        )
+
+    def assertRollupsAreFresh(self):
+        def rows():
+            return {
+                (row.pop('quiz_id'), row.pop('day')): {field: round(value, 6) for field, value in row.items()}
+                for row in DailyQuizStats.objects.values('quiz_id', 'day', *rollups.STAT_FIELDS)
+            }
+        maintained = rows()
+        rollups.rebuild_rollups()
+        self.assertEqual(maintained, rows())
+
+    def test_added_attempts(self):
+        for score in [0, 33.3, 66.7, 100]:
+            self.attempt(score)
+        self.attempt(50, quiz=1)
+        self.attempt(75, days_ago=1)
+        self.assertRollupsAreFresh()
+
+    def test_edited_attempts(self):
+        moved = self.attempt(40)
+        regraded = self.attempt(60)
+        self.attempt(80)
+        moved.date_attempted -= timedelta(days=2)
+        moved.save()
+        regraded.score = 95
+        regraded.save(update_fields=['score'])
+        self.assertRollupsAreFresh()
+
+    def test_deleted_attempts(self):
+        attempts = [self.attempt(score) for score in [10, 20, 30, 40, 50]]
+        attempts[2].delete()  # between the lowest and highest score
+        attempts[0].delete()  # the lowest score
+        attempts[4].delete()  # the highest score
+        self.assertRollupsAreFresh()
+        for attempt in attempts[1:4:2]:
+            attempt.delete()
+        self.assertFalse(DailyQuizStats.objects.exists())
+
+    def test_deleting_a_middle_score_is_one_update(self):
+        attempts = [self.attempt(score) for score in [10, 20, 30]]
+        with self.assertNumQueries(1):
+            rollups.remove_attempt(attempts[1])
+
+    def test_cascaded_deletes(self):
+        for score in [10, 20, 30, 40]:
+            self.attempt(score)
+            self.attempt(score, quiz=1, days_ago=3)
+        self.quizzes[1].delete()
+        self.assertRollupsAreFresh()
+        self.student.delete()
+        self.assertFalse(DailyQuizStats.objects.exists())
+
+
+class TrendFormTests(TestCase):
+    def test_default_start_is_clamped_to_the_first_date(self):
+        form = TrendForm({'end': '0001-01-05'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['start'], date.min)
+
+    def test_api_handles_the_first_dates(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('admin_trends_api'), {'end': '0001-01-05', 'period': 'week'})
+        self.assertEqual(response.status_code, 200)
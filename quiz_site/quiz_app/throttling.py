@@ -0,0 +1,198 @@
+"""Rate limits and attempt quotas that never query the database on the hot path.
+
+Rate limits are token buckets kept in the shared cache, one per
+(scope, client). Each bucket is stored as a single timestamp with the
+generic cell rate algorithm: the bucket holds ``limit`` tokens and refills
+at ``limit`` per ``period``. Reads and writes are not atomic, so a burst of
+concurrent requests may get a few extra tokens, which is fine for shedding
+abuse. When the shared cache is unreachable, buckets fall back to process
+memory instead of failing open or locking everyone out.
+
+Attempt quotas (``Quiz.max_attempts`` and ``Quiz.cooldown_minutes``) are
+checked against a per-(user, quiz) usage counter in the cache, loaded from
+the attempts table and kept current as attempts are created. Without a
+shared cache each worker has its own counter that the others do not update,
+so the counter only turns away starts early; the check that lets an attempt
+be created (``fresh=True``) always counts the attempts table.
+"""
+import functools
+import logging
+import math
+import re
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from .models import UserQuizAttempt
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+RATE_PATTERN = re.compile(r'(\d+)/(\d*)([smhd])')
+QUOTA_CACHE_TIMEOUT = 5 * 60
+
+Rate = namedtuple('Rate', ['limit', 'period'])
+
+_local_buckets = LocMemCache('quiz-rate-limits', {'MAX_ENTRIES': 10000})
+
+
+def parse_rate(value):
+    """Rate from '<requests>/<period>', e.g. '10/m' or '30/10m'"""
+    match = RATE_PATTERN.fullmatch(value.replace(' ', ''))
+    if match is None:
+        raise ValueError(f'Invalid rate {value!r}; expected e.g. "10/m" or "30/10m"')
+    limit, multiplier, unit = match.groups()
+    return Rate(int(limit), int(multiplier or 1) * PERIODS[unit])
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate(scope):
+    return parse_rate(settings.RATE_LIMITS[scope])
+
+
+def bucket_key(scope, ident):
+    return f'rate_limit:{scope}:{ident}'
+
+
+def _take(store, key, rate, now):
+    interval = rate.period / rate.limit
+    # The time at which the bucket would be full again
+    full_at = max(store.get(key) or now, now)
+    allowed_at = full_at - rate.period + interval
+    if now < allowed_at:
+        return allowed_at - now
+    full_at += interval
+    store.set(key, full_at, math.ceil(full_at - now) + 1)
+    return 0
+
+
+def take_token(scope, ident):
+    """Take one token from the (scope, ident) bucket.
+
+    Returns 0 when the request may proceed, otherwise the seconds until a
+    token is available.
+    """
+    rate = get_rate(scope)
+    if rate.limit <= 0:
+        return 0
+    key = bucket_key(scope, ident)
+    now = time.time()
+    try:
+        return _take(cache, key, rate, now)
+    except Exception:
+        logger.warning('Rate limit cache unavailable; using process memory for %s', scope, exc_info=True)
+        return _take(_local_buckets, key, rate, now)
+
+
+def client_ip(request):
+    """The client address, looking past RATE_LIMIT_PROXY_COUNT trusted proxies"""
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    if proxies:
+        forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def login_idents(request):
+    """Rate limit buckets of a login attempt: (IP and username, IP)
+
+    Clients behind one NAT or proxy share an IP, so the tight limit is per
+    username from that IP and the per-IP one only sheds password spraying.
+    """
+    ip = client_ip(request)
+    username = (request.POST.get('username') or '').strip().lower()
+    return [('login', f'{ip}:{username}'), ('login_ip', ip)]
+
+
+def register_idents(request):
+    """Rate limit buckets of a registration: (IP and username, IP), as for logins"""
+    ip = client_ip(request)
+    username = (request.POST.get('username') or '').strip().lower()
+    return [('register', f'{ip}:{username}'), ('register_ip', ip)]
+
+
+def too_many_requests(request, retry_after, template_name=None, context=None):
+    """429 response: the given page with an error message, or JSON"""
+    message = f'Too many requests. Please try again in {math.ceil(retry_after)} seconds.'
+    if template_name is None:
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        messages.error(request, message)
+        response = render(request, template_name, context, status=429)
+    response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+def rate_limit(scope, key='user', methods=('GET', 'POST')):
+    """Limit a JSON view with the RATE_LIMITS[scope] bucket of the client's user or IP"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                ident = client_ip(request) if key == 'ip' else request.user.pk
+                retry_after = take_token(scope, ident)
+                if retry_after:
+                    return too_many_requests(request, retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def usage_key(user_id, quiz_id):
+    return f'attempt_usage:{user_id}:{quiz_id}'
+
+
+def attempt_usage(user, quiz, fresh=False):
+    """(attempts submitted, timestamp of the latest one or None) of a user for a quiz
+
+    ``fresh`` reads the attempts table instead of the cached counter (and
+    refreshes the counter).
+    """
+    key = usage_key(user.pk, quiz.pk)
+    usage = None if fresh else cache.get(key)
+    if usage is None:
+        stats = UserQuizAttempt.objects.filter(user=user, quiz=quiz).aggregate(
+            count=Count('pk'), latest=Max('date_attempted'),
+        )
+        latest = stats['latest'].timestamp() if stats['latest'] else None
+        usage = (stats['count'], latest)
+        cache.set(key, usage, QUOTA_CACHE_TIMEOUT)
+    return usage
+
+
+def record_attempt(attempt):
+    """Count a newly created attempt in its user's cached usage"""
+    key = usage_key(attempt.user_id, attempt.quiz_id)
+    usage = cache.get(key)
+    if usage is not None:
+        cache.set(key, (usage[0] + 1, attempt.date_attempted.timestamp()), QUOTA_CACHE_TIMEOUT)
+
+
+def forget_usage(user_id, quiz_id):
+    cache.delete(usage_key(user_id, quiz_id))
+
+
+def quota_error(user, quiz, fresh=False):
+    """Why the user may not take the quiz now, or None
+
+    Pass ``fresh=True`` where the answer lets an attempt be created, so that a
+    stale cached counter cannot let a student past the quota.
+    """
+    if not (quiz.max_attempts or quiz.cooldown_minutes) or user.is_staff:
+        return None
+    count, latest = attempt_usage(user, quiz, fresh)
+    if quiz.max_attempts and count >= quiz.max_attempts:
+        return f'You have used all {quiz.max_attempts} attempts for this quiz.'
+    if quiz.cooldown_minutes and latest is not None:
+        wait = latest + quiz.cooldown_minutes * 60 - time.time()
+        if wait > 0:
+            return f'You can take this quiz again in {math.ceil(wait / 60)} minutes.'
+    return None
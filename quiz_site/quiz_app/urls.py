@@ -9,15 +9,28 @@ urlpatterns = [
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('quizzes/', views.quiz_list, name='quiz_list'),
     path('quizzes/<int:quiz_id>/start/', views.take_quiz, name='take_quiz'),
+    path('quizzes/<int:quiz_id>/paper/<str:version>.json', views.quiz_paper, name='quiz_paper'),
+    path('quizzes/<int:quiz_id>/draw/', views.quiz_draw, name='quiz_draw'),
+    path('quizzes/<int:quiz_id>/submit/', views.submit_quiz, name='submit_quiz'),
     path('results/', views.results_history, name='results_history'),
     path('result/<int:attempt_id>/', views.quiz_result, name='quiz_result'),
     
     path('admin-panel/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-panel/users/', views.admin_users, name='admin_users'),
     path('admin-panel/users/<int:user_id>/delete/', views.admin_delete_user, name='admin_delete_user'),
+    path('admin-panel/users/import/', views.admin_import_roster, name='admin_import_roster'),
     path('admin-panel/quizzes/', views.admin_quiz_list, name='admin_quiz_list'),
+    path('admin-panel/search/', views.admin_search, name='admin_search'),
+    path('admin-panel/questions/duplicates/', views.admin_duplicates, name='admin_duplicates'),
     path('admin-panel/quizzes/create/', views.admin_create_quiz, name='admin_create_quiz'),
     path('admin-panel/quizzes/<int:quiz_id>/edit/', views.admin_edit_quiz, name='admin_edit_quiz'),
+    path('admin-panel/quizzes/<int:quiz_id>/calibrate/', views.admin_calibrate_quiz, name='admin_calibrate_quiz'),
+    path('admin-panel/quizzes/<int:quiz_id>/live/', views.admin_proctor, name='admin_proctor'),
+    path('admin-panel/quizzes/<int:quiz_id>/live/events/', views.admin_proctor_events, name='admin_proctor_events'),
     path('admin-panel/results/', views.admin_results, name='admin_results'),
+    path('admin-panel/results/export/', views.admin_export_results, name='admin_export_results'),
     path('admin-panel/results/<int:attempt_id>/view/', views.admin_view_result, name='admin_view_result'),
+    path('admin-panel/trends/', views.admin_trends, name='admin_trends'),
+    path('admin-panel/trends/api/', views.admin_trends_api, name='admin_trends_api'),
+    path('admin-panel/jobs/', views.admin_jobs, name='admin_jobs'),
 ]
@@ -1,14 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db import transaction
+from django.utils.crypto import constant_time_compare
+from django.db import transaction, IntegrityError
 from django.db import models
-from .models import Quiz, Question, UserQuizAttempt, UserProfile
-from .forms import UserRegistrationForm, UserProfileForm, QuizForm, QuestionFormSet, get_question_formset
+from .models import Quiz, Question, UserQuizAttempt, UserProfile, Job, SearchDocument
+from .forms import UserRegistrationForm, UserProfileForm, QuizForm, QuestionFormSet, RosterUploadForm, DuplicateScanForm, TrendForm
+from .routers import use_replica, pin_to_primary
+from .exports import EXPORT_FORMATS, stream_export
+from .jobs import DELETE_CHUNK_SIZE, enqueue, user_deletion_size
+from .grading import grade
+from .authentication import hashing_slot, invalidate_cached_user
+from .rollups import score_trend
+from .search import search
+from . import adaptive, bundles, proctoring
+from .submissions import clean_submission_token, create_attempt_once, find_submission, new_submission_token
+from .throttling import login_idents, quota_error, rate_limit, register_idents, take_token, too_many_requests
 import json
 
 def home(request):
@@ -21,28 +36,53 @@ def register_view(request):
         return redirect('home')
     
     if request.method == 'POST':
+        retry_after = max(take_token(scope, ident) for scope, ident in register_idents(request))
+        if retry_after:
+            form = UserRegistrationForm(initial={'username': request.POST.get('username'), 'email': request.POST.get('email')})
+            return too_many_requests(request, retry_after, 'quiz_app/register.html', {'form': form})
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
             user = form.save(commit=False)
-            user.set_password(form.cleaned_data['password'])
-            user.save()
-            UserProfile.objects.create(user=user)
-            messages.success(request, 'Registration successful! Please log in.')
-            return redirect('login')
+            with hashing_slot() as acquired:
+                if not acquired:
+                    return login_busy(request, 'quiz_app/register.html', {'form': form})
+                user.set_password(form.cleaned_data['password'])
+            try:
+                with transaction.atomic():
+                    user.save()
+                    UserProfile.objects.create(user=user)
+            except IntegrityError:
+                form.add_error(None, 'That username or email was just registered. Please choose another.')
+            else:
+                messages.success(request, 'Registration successful! Please log in.')
+                return redirect('login')
     else:
         form = UserRegistrationForm()
     
     return render(request, 'quiz_app/register.html', {'form': form})
 
+def login_busy(request, template_name, context=None):
+    """Ask the client to retry when every password hashing slot is taken"""
+    messages.error(request, 'Lots of people are signing in right now. Please try again in a few seconds.')
+    response = render(request, template_name, context, status=503)
+    response['Retry-After'] = '5'
+    return response
+
 def login_view(request):
     """User login view"""
     if request.user.is_authenticated:
         return redirect('home')
     
     if request.method == 'POST':
+        retry_after = max(take_token(scope, ident) for scope, ident in login_idents(request))
+        if retry_after:
+            return too_many_requests(request, retry_after, 'quiz_app/login.html')
         username = request.POST.get('username')
         password = request.POST.get('password')
-        user = authenticate(request, username=username, password=password)
+        with hashing_slot() as acquired:
+            if not acquired:
+                return login_busy(request, 'quiz_app/login.html')
+            user = authenticate(request, username=username, password=password)
         
         if user is not None:
             login(request, user)
@@ -68,9 +108,15 @@ def edit_profile(request):
     if request.method == 'POST':
         form = UserProfileForm(request.POST, instance=request.user)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Your profile has been updated successfully!')
-            return redirect('edit_profile')
+            try:
+                with transaction.atomic():
+                    form.save()
+            except IntegrityError:
+                form.add_error(None, 'That username or email was just taken. Please choose another.')
+            else:
+                pin_to_primary(request)
+                messages.success(request, 'Your profile has been updated successfully!')
+                return redirect('edit_profile')
     else:
         form = UserProfileForm(instance=request.user)
     
@@ -82,65 +128,264 @@ def edit_profile(request):
 
 @login_required
 def quiz_list(request):
-    """Display all available quizzes"""
-    quizzes = Quiz.objects.filter(is_active=True).order_by('-created_at')
-    return render(request, 'quiz_app/quiz_list.html', {'quizzes': quizzes})
+    """Display available quizzes, optionally filtered by a search query"""
+    query = request.GET.get('q', '').strip()
+    if query:
+        quizzes = search(query, active_only=True, group_by_quiz=True)
+    else:
+        quizzes = Quiz.objects.filter(is_active=True).order_by('-created_at')
+    page = Paginator(quizzes, 12).get_page(request.GET.get('page'))
+    
+    context = {
+        'quizzes': page,
+        'page_obj': page,
+        'query': query,
+    }
+    return render(request, 'quiz_app/quiz_list.html', context)
 
 @login_required
 def take_quiz(request, quiz_id):
     """Take a quiz"""
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
     
+    if quiz.quiz_type == 'adaptive':
+        return take_adaptive_quiz(request, quiz)
+    
     if request.method == 'POST':
-        user_answers = {}
-        correct_answers = {}
-        questions_data = {}
+        token = clean_submission_token(request.POST.get('submission_token'))
+        attempt_id = find_submission(request.user, token)
+        if attempt_id:
+            return redirect('quiz_result', attempt_id=attempt_id)
+        retry_after = take_token('quiz_submit', request.user.pk)
+        if retry_after:
+            return too_many_requests(request, retry_after, 'quiz_app/rate_limited.html')
+        error = quota_error(request.user, quiz, fresh=True)
+        if error:
+            messages.error(request, error)
+            return redirect('quiz_list')
         
         question_ids_str = request.POST.get('question_ids', '')
         question_ids = [int(qid) for qid in question_ids_str.split(',') if qid]
         questions = Question.objects.filter(id__in=question_ids, quiz=quiz)
+        answers = {str(question.id): request.POST.get(f'question_{question.id}') for question in questions}
+        user_answers, correct_answers, questions_data = snapshot_answers(questions, answers)
         
-        for question in questions:
-            qid = str(question.id)
-            user_answer = request.POST.get(f'question_{qid}')
-            user_answers[qid] = user_answer
-            correct_answers[qid] = question.correct_option
-            
-            questions_data[qid] = {
-                'text': question.text,
-                'option_a': question.option_a,
-                'option_b': question.option_b,
-                'option_c': question.option_c,
-                'option_d': question.option_d,
-                'correct_option': question.correct_option,
-                'explanation': question.explanation,
-                'user_answer': user_answer,
-            }
+        _, _, score = grade(user_answers, correct_answers)
         
-        correct_count = sum(1 for qid, answer in user_answers.items() 
-                           if answer == correct_answers.get(qid))
-        total_questions = len(user_answers)
-        score = (correct_count / total_questions * 100) if total_questions > 0 else 0
-        
-        attempt = UserQuizAttempt.objects.create(
-            user=request.user,
+        attempt_id, _ = create_attempt_once(
+            request.user,
+            token,
             quiz=quiz,
-            score=round(score, 2),
+            score=score,
             user_answers=user_answers,
             correct_answers=correct_answers,
             questions_data=questions_data,
         )
+        pin_to_primary(request)
+        
+        return redirect('quiz_result', attempt_id=attempt_id)
+    
+    refused = refuse_start(request, quiz)
+    if refused:
+        return refused
+    proctoring.publish(quiz.id, 'started', request.user)
+    token = new_submission_token()
+    if request.GET.get('classic'):
+        # Server-rendered paper for browsers without JavaScript
+        questions = quiz.get_questions()
+        context = {
+            'quiz': quiz,
+            'questions': questions,
+            'question_ids': ','.join(str(q.id) for q in questions),
+            'submission_token': token,
+        }
+        return render(request, 'quiz_app/take_quiz.html', context)
+    
+    if quiz.quiz_type == 'fixed':
+        paper_url = reverse('quiz_paper', args=[quiz.id, bundles.fixed_paper(quiz)['version']])
+    else:
+        paper_url = f"{reverse('quiz_draw', args=[quiz.id])}?token={token}"
+    context = {
+        'quiz': quiz,
+        'paper_url': paper_url,
+        'submission_token': token,
+    }
+    return render(request, 'quiz_app/take_quiz_player.html', context)
+
+def refuse_start(request, quiz, fresh=False):
+    """A response turning away a new attempt (rate limit or attempt quota), or None"""
+    retry_after = take_token('quiz_start', request.user.pk)
+    if retry_after:
+        return too_many_requests(request, retry_after, 'quiz_app/rate_limited.html')
+    error = quota_error(request.user, quiz, fresh)
+    if error:
+        messages.error(request, error)
+        return redirect('quiz_list')
+    return None
+
+def snapshot_answers(questions, answers):
+    """(user_answers, correct_answers, questions_data) of a submission; answers maps question id to option"""
+    user_answers = {}
+    correct_answers = {}
+    questions_data = {}
+    for question in questions:
+        qid = str(question.id)
+        user_answer = answers.get(qid)
+        user_answers[qid] = user_answer
+        correct_answers[qid] = question.correct_option
         
-        return redirect('quiz_result', attempt_id=attempt.id)
+        questions_data[qid] = {
+            'text': question.text,
+            'option_a': question.option_a,
+            'option_b': question.option_b,
+            'option_c': question.option_c,
+            'option_d': question.option_d,
+            'correct_option': question.correct_option,
+            'explanation': question.explanation,
+            'user_answer': user_answer,
+        }
+    return user_answers, correct_answers, questions_data
+
+def paper_response(request, encoded, cache_control):
+    """A compressed quiz paper in the best encoding the client accepts"""
+    encoding = bundles.pick_encoding(request, encoded)
+    response = HttpResponse(encoded[encoding], content_type='application/json')
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = cache_control
+    return response
+
+def quiz_paper(request, quiz_id, version):
+    """The paper of a fixed quiz, addressed by content version"""
+    # No login and no session access, so that the CDN can share the paper
+    # between students: the version is keyed with SECRET_KEY and only the
+    # start page hands it out, so an unknown or outdated one is a 404
+    quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True, quiz_type='fixed')
+    paper = bundles.fixed_paper(quiz)
+    if not constant_time_compare(version, paper['version']):
+        raise Http404('No such quiz paper')
+    response = paper_response(request, paper['encoded'], 'public, max-age=31536000, immutable')
+    response['ETag'] = f'"{version}"'
+    return response
+
+@login_required
+@rate_limit('quiz_draw')
+def quiz_draw(request, quiz_id):
+    """A freshly drawn paper of a random quiz for one submission token"""
+    quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
+    if quiz.quiz_type == 'fixed':
+        return redirect('quiz_paper', quiz_id=quiz.id, version=bundles.fixed_paper(quiz)['version'])
+    token = clean_submission_token(request.GET.get('token'))
+    if quiz.quiz_type != 'random' or token is None:
+        return JsonResponse({'error': 'invalid request'}, status=400)
+    encoded = bundles.draw_paper(quiz, request.user, token)
+    return paper_response(request, encoded, 'private, no-store')
+
+@login_required
+@rate_limit('quiz_submit', methods=('POST',))
+def submit_quiz(request, quiz_id):
+    """Grade a paper answered in the quiz player: one option letter per question"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
+    try:
+        data = json.loads(request.body)
+        token = clean_submission_token(data.get('token'))
+        paper = str(data.get('paper', ''))
+        answer_string = str(data.get('answers', ''))
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'invalid JSON'}, status=400)
+    if token is None:
+        return JsonResponse({'error': 'invalid submission token'}, status=400)
+    
+    attempt_id = find_submission(request.user, token)
+    if attempt_id:
+        return JsonResponse({'redirect': reverse('quiz_result', args=[attempt_id])})
+    
+    error = quota_error(request.user, quiz, fresh=True)
+    if error:
+        return JsonResponse({'error': error}, status=403)
+    
+    question_ids = bundles.paper_question_ids(quiz, request.user, paper, token)
+    if question_ids is None:
+        return JsonResponse({'error': 'This quiz paper has expired. Please start the quiz again.'}, status=409)
+    if len(answer_string) != len(question_ids):
+        return JsonResponse({'error': 'expected one answer per question'}, status=400)
+    
+    options = dict(Question.OPTION_CHOICES)
+    answers = {
+        str(question_id): answer if answer in options else None
+        for question_id, answer in zip(question_ids, answer_string)
+    }
+    questions = Question.objects.filter(id__in=question_ids, quiz=quiz)
+    user_answers, correct_answers, questions_data = snapshot_answers(questions, answers)
+    _, _, score = grade(user_answers, correct_answers)
+    
+    attempt_id, _ = create_attempt_once(
+        request.user,
+        token,
+        quiz=quiz,
+        score=score,
+        user_answers=user_answers,
+        correct_answers=correct_answers,
+        questions_data=questions_data,
+    )
+    pin_to_primary(request)
+    return JsonResponse({'redirect': reverse('quiz_result', args=[attempt_id])})
+
+def take_adaptive_quiz(request, quiz):
+    """Serve an adaptive quiz one question per request"""
+    if request.method == 'POST':
+        # The final answer was already submitted and the session state cleared
+        attempt_id = find_submission(request.user, clean_submission_token(request.POST.get('submission_token')))
+        if attempt_id:
+            return redirect('quiz_result', attempt_id=attempt_id)
+    
+    starting = adaptive.session_key(quiz.id) not in request.session
+    if starting:
+        # The final answer is not checked again, so the start is the last check
+        refused = refuse_start(request, quiz, fresh=True)
+        if refused:
+            return refused
+    bank = adaptive.get_item_bank(quiz)
+    state = adaptive.get_state(request.session, quiz, bank)
+    if adaptive.replace_missing_item(quiz, state, bank):
+        adaptive.save_state(request.session, quiz, state)
+    if starting and state['current'] is not None:
+        proctoring.publish(quiz.id, 'started', request.user)
+    
+    if request.method == 'POST':
+        # A stale form (back button, double submit) must not answer the wrong question
+        if request.POST.get('question_id') == str(state['current']):
+            answer = request.POST.get('answer')
+            adaptive.record_answer(quiz, state, bank, answer if answer in dict(Question.OPTION_CHOICES) else None)
+            adaptive.save_state(request.session, quiz, state)
+        if state['current'] is None or adaptive.seconds_left(quiz, state) == 0:
+            attempt_id = adaptive.finish(request.session, request.user, quiz, state, bank)
+            pin_to_primary(request)
+            return redirect('quiz_result', attempt_id=attempt_id)
+        return redirect('take_quiz', quiz_id=quiz.id)
+    
+    if not state['served']:
+        request.session.pop(adaptive.session_key(quiz.id), None)
+        messages.error(request, 'This quiz has no questions yet.')
+        return redirect('quiz_list')
+    if state['current'] is None or adaptive.seconds_left(quiz, state) == 0:
+        # Out of time or out of questions: grade what was answered
+        attempt_id = adaptive.finish(request.session, request.user, quiz, state, bank)
+        pin_to_primary(request)
+        return redirect('quiz_result', attempt_id=attempt_id)
     
-    questions = quiz.get_questions()
-    question_ids = [str(q.id) for q in questions]
     context = {
         'quiz': quiz,
-        'questions': questions,
-        'question_ids': ','.join(question_ids),
+        'question': bank.items[state['current']],
+        'question_number': len(state['served']),
+        'total_questions': adaptive.question_limit(quiz, bank),
+        'seconds_left': adaptive.seconds_left(quiz, state),
+        'submission_token': state.get('token', ''),
     }
-    return render(request, 'quiz_app/take_quiz.html', context)
+    return render(request, 'quiz_app/take_adaptive_quiz.html', context)
 
 @login_required
 def quiz_result(request, attempt_id):
@@ -148,9 +393,10 @@ def quiz_result(request, attempt_id):
     attempt = get_object_or_404(UserQuizAttempt, id=attempt_id, user=request.user)
     
     questions_review = []
-    for qid, question_data in attempt.questions_data.items():
+    for qid, question_data in attempt.get_questions_data().items():
         user_answer = question_data.get('user_answer')
-        correct_answer = question_data.get('correct_option')
+        # correct_answers is kept current by re-grading; the snapshot may be stale
+        correct_answer = attempt.correct_answers.get(qid, question_data.get('correct_option'))
         is_correct = user_answer == correct_answer
         
         questions_review.append({
@@ -174,21 +420,23 @@ def quiz_result(request, attempt_id):
     return render(request, 'quiz_app/quiz_result.html', context)
 
 @login_required
+@use_replica
 def results_history(request):
     """Display user's quiz history"""
-    attempts = UserQuizAttempt.objects.filter(user=request.user)
+    attempts = UserQuizAttempt.objects.filter(user=request.user).defer('questions_data')
     return render(request, 'quiz_app/results_history.html', {'attempts': attempts})
 
 def is_staff_user(user):
     return user.is_staff or user.is_superuser
 
 @user_passes_test(is_staff_user)
+@use_replica
 def admin_dashboard(request):
     """Admin dashboard"""
     total_users = User.objects.count()
     total_quizzes = Quiz.objects.count()
     total_attempts = UserQuizAttempt.objects.count()
-    recent_attempts = UserQuizAttempt.objects.all()[:10]
+    recent_attempts = UserQuizAttempt.objects.defer('questions_data')[:10]
     
     context = {
         'total_users': total_users,
@@ -199,6 +447,7 @@ def admin_dashboard(request):
     return render(request, 'quiz_app/admin/dashboard.html', context)
 
 @user_passes_test(is_staff_user)
+@use_replica
 def admin_users(request):
     """Admin user management"""
     users = User.objects.all().order_by('-date_joined')
@@ -214,12 +463,118 @@ def admin_users(request):
     
     return render(request, 'quiz_app/admin/users.html', {'user_stats': user_stats})
 
+@user_passes_test(is_staff_user)
+def admin_import_roster(request):
+    """Admin bulk student import from a CSV roster"""
+    if request.method == 'POST':
+        form = RosterUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            filename = form.cleaned_data['roster'].name
+            enqueue('import_roster', {'csv': form.roster_text, 'filename': filename}, user=request.user)
+            pin_to_primary(request)
+            messages.success(request, f'Roster "{filename}" has been queued for import.')
+            return redirect('admin_jobs')
+    else:
+        form = RosterUploadForm()
+    
+    return render(request, 'quiz_app/admin/import_roster.html', {'form': form})
+
 @user_passes_test(is_staff_user)
 def admin_quiz_list(request):
     """Admin quiz management list"""
     quizzes = Quiz.objects.all().order_by('-created_at')
     return render(request, 'quiz_app/admin/quiz_list.html', {'quizzes': quizzes})
 
+@user_passes_test(is_staff_user)
+def admin_search(request):
+    """Admin ranked search over quizzes and questions"""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', '')
+    kinds = [kind] if kind in dict(SearchDocument.KIND_CHOICES) else None
+    page = Paginator(search(query, kinds=kinds), 25).get_page(request.GET.get('page'))
+    
+    context = {
+        'query': query,
+        'kind': kind,
+        'page_obj': page,
+    }
+    return render(request, 'quiz_app/admin/search.html', context)
+
+@user_passes_test(is_staff_user)
+def admin_duplicates(request):
+    """Admin near-duplicate question report"""
+    if request.method == 'POST':
+        form = DuplicateScanForm(request.POST)
+        if form.is_valid():
+            quiz = form.cleaned_data['quiz']
+            payload = {'threshold': form.cleaned_data['threshold'], 'quiz_id': quiz.id if quiz else None}
+            enqueue('find_duplicate_questions', payload, user=request.user)
+            pin_to_primary(request)
+            messages.success(request, 'A duplicate scan has been queued. Refresh this page when it finishes.')
+            return redirect('admin_duplicates')
+    else:
+        form = DuplicateScanForm()
+    
+    job = Job.objects.filter(kind='find_duplicate_questions').first()
+    last_scan = Job.objects.filter(kind='find_duplicate_questions', status='done').first()
+    groups = []
+    if last_scan:
+        group_ids = last_scan.payload.get('groups', [])
+        questions = Question.objects.select_related('quiz').in_bulk(
+            [question_id for group in group_ids for question_id, _ in group]
+        )
+        for group in group_ids:
+            members = [(questions[question_id], score) for question_id, score in group if question_id in questions]
+            if len(members) > 1:
+                groups.append(members)
+    
+    context = {
+        'form': form,
+        'job': job,
+        'last_scan': last_scan,
+        'groups': groups,
+    }
+    return render(request, 'quiz_app/admin/duplicates.html', context)
+
+@user_passes_test(is_staff_user)
+def admin_calibrate_quiz(request, quiz_id):
+    """Admin re-estimate question difficulties of an adaptive quiz"""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    
+    if request.method == 'POST':
+        enqueue('calibrate_quiz', {'quiz_id': quiz.id}, user=request.user)
+        pin_to_primary(request)
+        messages.success(request, f'Question difficulties of "{quiz.name}" are being recalibrated in the background.')
+    return redirect('admin_quiz_list')
+
+@user_passes_test(is_staff_user)
+def admin_proctor(request, quiz_id):
+    """Admin live view of who is taking a quiz and how they score"""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    events_url = f"{reverse('admin_proctor_events', args=[quiz.id])}?token={proctoring.proctor_token(request.user, quiz.id)}"
+    return render(request, 'quiz_app/admin/proctor.html', {'quiz': quiz, 'events_url': events_url})
+
+async def admin_proctor_events(request, quiz_id):
+    """Server-Sent Events feed of quiz starts and submissions, served from the cache"""
+    # Authorized by the token from admin_proctor and the cached user rather
+    # than the session, so a WSGI reconnect does not read the database
+    user_id = await sync_to_async(proctoring.check_proctor_token)(request.GET.get('token', ''), quiz_id)
+    if user_id is None:
+        return HttpResponse('This live view has expired. Reload the page.', status=403, content_type='text/plain')
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after', '')
+    after = int(after) if after.isdigit() else 0
+    
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(proctoring.live_events(quiz_id, user_id, after), content_type='text/event-stream')
+    else:
+        # WSGI workers cannot hold a stream open: send what is new and let
+        # EventSource reconnect
+        body = await sync_to_async(proctoring.recent_events)(quiz_id, after)
+        response = HttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @user_passes_test(is_staff_user)
 def admin_create_quiz(request):
     """Admin create quiz"""
@@ -239,6 +594,7 @@ def admin_create_quiz(request):
                         question.quiz = quiz
                         question.save()
                 
+                pin_to_primary(request)
                 messages.success(request, f'Quiz "{quiz.name}" created successfully!')
                 return redirect('admin_quiz_list')
     else:
@@ -261,10 +617,19 @@ def admin_edit_quiz(request, quiz_id):
         formset = QuestionFormSet(request.POST, instance=quiz)
         
         if form.is_valid() and formset.is_valid():
+            key_changed = any(
+                question_form.instance.pk and 'correct_option' in question_form.changed_data
+                for question_form in formset.forms
+                if question_form not in formset.deleted_forms
+            )
             with transaction.atomic():
                 form.save()
                 formset.save()
+                pin_to_primary(request)
                 messages.success(request, f'Quiz "{quiz.name}" updated successfully!')
+                if key_changed and quiz.attempts.exists():
+                    enqueue('regrade_quiz', {'quiz_id': quiz.id}, user=request.user)
+                    messages.info(request, 'The answer key changed, so past attempts are being re-graded in the background.')
                 return redirect('admin_quiz_list')
     else:
         form = QuizForm(instance=quiz)
@@ -277,11 +642,8 @@ def admin_edit_quiz(request, quiz_id):
     }
     return render(request, 'quiz_app/admin/edit_quiz.html', context)
 
-@user_passes_test(is_staff_user)
-def admin_results(request):
-    """Admin view all results"""
-    attempts = UserQuizAttempt.objects.all()
-    
+def filter_attempts(request, attempts):
+    """Apply the admin results user/quiz filters from the query string"""
     user_filter = request.GET.get('user')
     quiz_filter = request.GET.get('quiz')
     
@@ -289,6 +651,13 @@ def admin_results(request):
         attempts = attempts.filter(user_id=user_filter)
     if quiz_filter:
         attempts = attempts.filter(quiz_id=quiz_filter)
+    return attempts
+
+@user_passes_test(is_staff_user)
+@use_replica
+def admin_results(request):
+    """Admin view all results"""
+    attempts = filter_attempts(request, UserQuizAttempt.objects.defer('questions_data'))
     
     users = User.objects.all()
     quizzes = Quiz.objects.all()
@@ -300,15 +669,92 @@ def admin_results(request):
     }
     return render(request, 'quiz_app/admin/results.html', context)
 
+@user_passes_test(is_staff_user)
+@use_replica
+def admin_export_results(request):
+    """Stream filtered results as CSV or JSONL, optionally gzipped"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        fmt = 'csv'
+    include_answers = request.GET.get('answers') == '1'
+    compress = request.GET.get('gzip') == '1'
+    
+    attempts = filter_attempts(request, UserQuizAttempt.objects.all())
+    # Bind the alias now: the body is streamed after the view has returned
+    attempts = attempts.using(attempts.db)
+    
+    filename = f"quiz-results-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    
+    response = StreamingHttpResponse(
+        stream_export(attempts, fmt=fmt, include_answers=include_answers, compress=compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def trend_series(form):
+    """Series of a valid TrendForm, each with its quiz name"""
+    quiz = form.cleaned_data['quiz']
+    series = score_trend(
+        form.cleaned_data['start'],
+        form.cleaned_data['end'],
+        period=form.cleaned_data['period'],
+        quiz_ids=[quiz.id] if quiz else None,
+        by_quiz=form.cleaned_data['by_quiz'],
+    )
+    names = dict(Quiz.objects.filter(pk__in=[item['quiz_id'] for item in series]).values_list('pk', 'name'))
+    for item in series:
+        item['quiz'] = names.get(item['quiz_id'], quiz.name if quiz else 'All quizzes')
+    return series
+
+@user_passes_test(is_staff_user)
+@use_replica
+def admin_trends(request):
+    """Admin score trends from the daily rollups"""
+    form = TrendForm(request.GET)
+    series = []
+    if form.is_valid():
+        series = trend_series(form)
+        for item in series:
+            for point in item['points']:
+                tallest = max(point['histogram']) or 1
+                point['bars'] = [round(count * 100 / tallest) for count in point['histogram']]
+    
+    context = {
+        'form': form,
+        'series': series,
+        'query': request.GET.urlencode(),
+    }
+    return render(request, 'quiz_app/admin/trends.html', context)
+
+@user_passes_test(is_staff_user)
+@use_replica
+def admin_trends_api(request):
+    """Score trends from the daily rollups as JSON"""
+    form = TrendForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({
+        'start': form.cleaned_data['start'].isoformat(),
+        'end': form.cleaned_data['end'].isoformat(),
+        'period': form.cleaned_data['period'],
+        'series': trend_series(form),
+    })
+
 @user_passes_test(is_staff_user)
 def admin_view_result(request, attempt_id):
     """Admin view detailed result"""
     attempt = get_object_or_404(UserQuizAttempt, id=attempt_id)
     
     questions_review = []
-    for qid, question_data in attempt.questions_data.items():
+    for qid, question_data in attempt.get_questions_data().items():
         user_answer = question_data.get('user_answer')
-        correct_answer = question_data.get('correct_option')
+        # correct_answers is kept current by re-grading; the snapshot may be stale
+        correct_answer = attempt.correct_answers.get(qid, question_data.get('correct_option'))
         is_correct = user_answer == correct_answer
         
         questions_review.append({
@@ -342,8 +788,29 @@ def admin_delete_user(request, user_id):
     
     if request.method == 'POST':
         username = user.username
-        user.delete()
-        messages.success(request, f'User "{username}" has been deleted successfully!')
+        pending = Job.objects.filter(
+            kind='delete_user', payload__user_id=user.id, status__in=['queued', 'running'],
+        ).exists()
+        if not pending and user_deletion_size(user.id) <= DELETE_CHUNK_SIZE:
+            # Small enough to delete within the request, without a worker
+            with transaction.atomic():
+                user.delete()
+            pin_to_primary(request)
+            messages.success(request, f'User "{username}" has been deleted.')
+            return redirect('admin_users')
+        if not pending:
+            # Lock the account out right away; the cascade runs in the background
+            User.objects.filter(pk=user.id).update(is_active=False)
+            invalidate_cached_user(user.id)
+            enqueue('delete_user', {'user_id': user.id, 'username': username}, user=request.user)
+            pin_to_primary(request)
+        messages.success(request, f'User "{username}" has been scheduled for deletion; the background job worker finishes it.')
         return redirect('admin_users')
     
     return redirect('admin_users')
+
+@user_passes_test(is_staff_user)
+def admin_jobs(request):
+    """Admin background job progress"""
+    jobs = Job.objects.select_related('created_by')[:50]
+    return render(request, 'quiz_app/admin/jobs.html', {'jobs': jobs})
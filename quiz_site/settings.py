@@ -99,6 +99,126 @@ else:
         }
     }
 
+# SQLite profile for single-node deployments: set SQLITE_PROFILE=tuned to opt
+# in ("default" keeps Django's settings). WAL lets pages keep reading while a
+# submission writes, and the busy timeout makes writers queue instead of
+# failing with "database is locked". BEGIN IMMEDIATE takes the write lock when
+# a transaction starts, so two transactions can never deadlock upgrading from
+# a read lock. Run `manage.py sqlite_maintenance` periodically. It is off by
+# default because journal_mode=WAL is written into the database file, which
+# would modify the db.sqlite3 tracked in git on the first connection.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+SQLITE_PRAGMAS = [
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    'cache_size=-20000',  # 20 MB page cache per connection
+    'mmap_size=268435456',  # 256 MB
+    'temp_store=MEMORY',
+    'journal_size_limit=67108864',  # truncate the WAL to 64 MB after checkpoints
+]
+
+if SQLITE_PROFILE == 'tuned':
+    for database in DATABASES.values():
+        if database['ENGINE'] == 'django.db.backends.sqlite3':
+            database.setdefault('OPTIONS', {}).update({
+                'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+            })
+
+# Optional read replica for reporting views; reads fall back to 'default' when unset
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.config(
+        env='DATABASE_REPLICA_URL',
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['quiz_site.quiz_app.routers.PrimaryReplicaRouter']
+
+# Seconds a session keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '30'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Shared Redis cache when REDIS_URL is set (needs the `redis` package),
+# otherwise a per-process in-memory cache
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Background jobs: seconds without a heartbeat (progress report) after which
+# a running job is considered abandoned by its worker and queued again
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '600'))
+
+# Performance profile
+# PERFORMANCE_PROFILE=production serves sessions from the cache (written
+# through to the database) and resolves request.user from the cache, so
+# ordinary page views skip the django_session and auth_user reads. It only
+# takes effect with a shared cache (REDIS_URL): with per-process caches a
+# logout, deactivation or revoked staff flag would not reach other workers
+# until their cached copies expired.
+PERFORMANCE_PROFILE = os.environ.get('PERFORMANCE_PROFILE', 'default')
+
+if PERFORMANCE_PROFILE == 'production' and os.environ.get('REDIS_URL'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    MIDDLEWARE[MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware')] = (
+        'quiz_site.quiz_app.middleware.CachedAuthenticationMiddleware'
+    )
+
+# Seconds an authenticated user object stays cached
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', '300'))
+
+# Password hashes computed at once per process, and how long a login waits
+# for a free slot before the user is asked to retry
+LOGIN_HASHING_CONCURRENCY = int(os.environ.get('LOGIN_HASHING_CONCURRENCY', '4'))
+LOGIN_QUEUE_TIMEOUT = float(os.environ.get('LOGIN_QUEUE_TIMEOUT', '10'))
+
+# Seconds a submitted quiz token maps to its attempt in the cache, so repeated
+# submissions are answered without touching the database
+SUBMISSION_CACHE_TIMEOUT = int(os.environ.get('SUBMISSION_CACHE_TIMEOUT', '900'))
+
+# Live proctoring: how long quiz events stay in the cache, and how often each
+# process checks the cache for events published by other processes
+PROCTOR_EVENT_TIMEOUT = int(os.environ.get('PROCTOR_EVENT_TIMEOUT', str(12 * 60 * 60)))
+PROCTOR_POLL_SECONDS = float(os.environ.get('PROCTOR_POLL_SECONDS', '1'))
+# Seconds a proctor page may follow its event stream before it must be
+# reloaded (the stream is authorized by a signed token, not the session)
+PROCTOR_TOKEN_MAX_AGE = int(os.environ.get('PROCTOR_TOKEN_MAX_AGE', str(12 * 60 * 60)))
+
+# Token-bucket rate limits, "<requests>/<period>" with a period in s, m, h or d
+# (e.g. "30/10m"); "0/m" turns a limit off. Logins are limited per username and
+# client IP, and more loosely per client IP alone, since a school behind one NAT
+# shares an IP. Registration is limited per client IP, quiz starts, random draws
+# and submissions per user.
+RATE_LIMITS = {
+    'login': os.environ.get('RATE_LIMIT_LOGIN', '20/m'),
+    'login_ip': os.environ.get('RATE_LIMIT_LOGIN_IP', '300/m'),
+    'register': os.environ.get('RATE_LIMIT_REGISTER', '10/h'),
+    'register_ip': os.environ.get('RATE_LIMIT_REGISTER_IP', '600/h'),
+    'quiz_start': os.environ.get('RATE_LIMIT_QUIZ_START', '10/m'),
+    'quiz_draw': os.environ.get('RATE_LIMIT_QUIZ_DRAW', '10/m'),
+    'quiz_submit': os.environ.get('RATE_LIMIT_QUIZ_SUBMIT', '10/m'),
+}
+
+# Reverse proxies in front of the app that append the client address to
+# X-Forwarded-For; 0 uses REMOTE_ADDR
+RATE_LIMIT_PROXY_COUNT = int(os.environ.get('RATE_LIMIT_PROXY_COUNT', '0'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,9 +268,34 @@ LOGOUT_REDIRECT_URL = 'home'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'quiz_site' / 'quiz_app' / 'static']
 
-# WhiteNoise configuration for serving static files in production
+# WhiteNoise configuration for serving static files in production. The
+# storage also builds ASSET_BUNDLES; hashed files are served as immutable.
 STORAGES = {
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        "BACKEND": "quiz_site.quiz_app.assets.BundledStaticFilesStorage",
     },
 }
+
+# Minified bundles built by collectstatic: bundle path -> source static files
+# (kept in the same directory so relative url()s still resolve). base.html
+# links one of each, so every page needs two asset requests. Bootstrap 5.3.3
+# is vendored from its dist/ files (source map comments removed).
+ASSET_BUNDLES = {
+    'css/app.bundle.css': ['css/bootstrap.min.css', 'css/style.css'],
+    'js/app.bundle.js': ['js/bootstrap.bundle.min.js', 'js/quiz_player.js'],
+}
+
+# Page-weight budget per template, checked by `manage.py check_page_weight`
+# during the build: compressed kilobytes (markup + local assets) and requests
+PAGE_BUDGETS = {
+    'default': {'kilobytes': 50, 'requests': 3},
+}
+
+# Compressed bytes of third-party assets (URL -> bytes) linked from templates,
+# so that check_page_weight can weigh them; an unlisted one fails the check
+EXTERNAL_ASSET_BYTES = {}
+
+# Archive storage for old quiz attempts (see the archive_attempts command).
+# Must be a persistent, writable directory; archiving is refused while unset.
+QUIZ_ARCHIVE_DIR = Path(os.environ['QUIZ_ARCHIVE_DIR']) if os.environ.get('QUIZ_ARCHIVE_DIR') else None
+QUIZ_ARCHIVE_AFTER_DAYS = int(os.environ.get('QUIZ_ARCHIVE_AFTER_DAYS', '365'))
@@ -0,0 +1,197 @@
+// Client-side quiz player.
+//
+// Fetches the quiz paper as compact JSON ({paper, questions: [[id, text, a, b, c, d], ...]}),
+// renders one question at a time and submits the answers as a single string with one
+// option letter per question ('-' for unanswered), in paper order.
+(function () {
+    const player = document.getElementById('quiz-player');
+    if (!player) {
+        return;
+    }
+
+    const OPTIONS = ['A', 'B', 'C', 'D'];
+    const UNANSWERED = '-';
+    const token = player.dataset.token;
+    const timeLimit = parseInt(player.dataset.timeLimit, 10) || 0;
+    const csrfToken = player.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    const storageKey = `quiz-answers:${token}`;
+
+    const status = document.getElementById('player-status');
+    const body = document.getElementById('player-body');
+    const prevBtn = document.getElementById('prev-btn');
+    const nextBtn = document.getElementById('next-btn');
+    const submitBtn = document.getElementById('submit-btn');
+
+    let paper = null;
+    let answers = [];
+    let currentIndex = 0;
+    let submitting = false;
+
+    function saveAnswers() {
+        try {
+            sessionStorage.setItem(storageKey, answers.join(''));
+        } catch (e) {
+            // Private browsing or a full storage quota; answers stay in memory
+        }
+    }
+
+    function restoreAnswers(count) {
+        let saved = '';
+        try {
+            saved = sessionStorage.getItem(storageKey) || '';
+        } catch (e) {
+            saved = '';
+        }
+        answers = saved.length === count ? saved.split('') : new Array(count).fill(UNANSWERED);
+    }
+
+    function showError(message) {
+        status.className = 'alert alert-danger';
+        status.textContent = message;
+        status.style.display = 'block';
+    }
+
+    function renderQuestion() {
+        const [questionId, text, ...options] = paper.questions[currentIndex];
+        const total = paper.questions.length;
+
+        document.getElementById('current-question').textContent = currentIndex + 1;
+        document.getElementById('question-number').textContent = currentIndex + 1;
+        document.getElementById('question-text').textContent = text;
+
+        const container = document.getElementById('question-options');
+        container.replaceChildren(...options.map((option, index) => {
+            const letter = OPTIONS[index];
+            const inputId = `q${questionId}_${letter.toLowerCase()}`;
+            const wrapper = document.createElement('div');
+            wrapper.className = 'form-check mb-3 p-3 border rounded bg-white';
+
+            const input = document.createElement('input');
+            input.className = 'form-check-input';
+            input.type = 'radio';
+            input.name = `question_${questionId}`;
+            input.id = inputId;
+            input.value = letter;
+            input.checked = answers[currentIndex] === letter;
+            input.addEventListener('change', () => {
+                answers[currentIndex] = letter;
+                saveAnswers();
+            });
+
+            const label = document.createElement('label');
+            label.className = 'form-check-label w-100';
+            label.htmlFor = inputId;
+            const strong = document.createElement('strong');
+            strong.textContent = `${letter}.`;
+            label.append(strong, ` ${option}`);
+
+            wrapper.append(input, label);
+            return wrapper;
+        }));
+
+        const progress = ((currentIndex + 1) / total) * 100;
+        document.getElementById('progress-bar').style.width = progress + '%';
+        document.getElementById('progress-percentage').textContent = Math.round(progress) + '%';
+
+        prevBtn.style.display = currentIndex === 0 ? 'none' : 'block';
+        const last = currentIndex === total - 1;
+        nextBtn.style.display = last ? 'none' : 'block';
+        submitBtn.style.display = last ? 'block' : 'none';
+
+        window.scrollTo({ top: 0, behavior: 'smooth' });
+    }
+
+    async function submit() {
+        if (submitting) {
+            return;
+        }
+        submitting = true;
+        submitBtn.disabled = true;
+        try {
+            const response = await fetch(player.dataset.submitUrl, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+                body: JSON.stringify({ token: token, paper: paper.paper, answers: answers.join('') }),
+            });
+            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.error || 'Could not submit the quiz.');
+            }
+            try {
+                sessionStorage.removeItem(storageKey);
+            } catch (e) {
+                // Nothing to clean up
+            }
+            window.location.href = result.redirect;
+        } catch (error) {
+            // The submission token makes retries safe
+            submitting = false;
+            submitBtn.disabled = false;
+            alert(`${error.message}\n\nYour answers are kept; please try submitting again.`);
+        }
+    }
+
+    function startTimer() {
+        if (timeLimit <= 0) {
+            return;
+        }
+        const display = document.getElementById('time-display');
+        const deadline = Date.now() + timeLimit * 60 * 1000;
+
+        function tick() {
+            const remaining = Math.max(0, Math.round((deadline - Date.now()) / 1000));
+            display.textContent = `${Math.floor(remaining / 60)}:${(remaining % 60).toString().padStart(2, '0')}`;
+            if (remaining <= 0) {
+                alert('Time is up! Submitting your quiz automatically.');
+                submit();
+            } else {
+                setTimeout(tick, 1000);
+            }
+        }
+        tick();
+    }
+
+    prevBtn.addEventListener('click', () => {
+        if (currentIndex > 0) {
+            currentIndex--;
+            renderQuestion();
+        }
+    });
+
+    nextBtn.addEventListener('click', () => {
+        if (currentIndex < paper.questions.length - 1) {
+            currentIndex++;
+            renderQuestion();
+        }
+    });
+
+    submitBtn.addEventListener('click', () => {
+        if (answers.includes(UNANSWERED)) {
+            alert('Please answer all questions before submitting!\n\nYou can use the Previous button to go back and answer any missed questions.');
+        } else if (confirm('Are you sure you want to submit your quiz? You cannot change your answers after submission.')) {
+            submit();
+        }
+    });
+
+    fetch(player.dataset.paperUrl, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Could not load the quiz. Please reload the page.');
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!data.questions.length) {
+                throw new Error('This quiz has no questions yet.');
+            }
+            paper = data;
+            document.getElementById('total-questions').textContent = paper.questions.length;
+            restoreAnswers(paper.questions.length);
+            status.style.display = 'none';
+            body.style.display = 'block';
+            renderQuestion();
+            startTimer();
+        })
+        .catch(error => showError(error.message));
+})();